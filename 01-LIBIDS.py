@@ -10,51 +10,28 @@ import shutil
 import numpy as np
 import pandas as pd
 from pathlib import Path
-from datetime import datetime
-from functions.milgrau_function import readfiles_libids
+from functions.milgrau_function import readfiles_libids, headercatalog
 
 rootdir_name = os.getcwd()
 files_dir_stand = '01-data'
 bad_files_dir = '00-bad_files_dir'
 files_dir_organized = '02-data_raw_organized'
+header_catalog = '00-header_catalog.sqlite'
 datadir_name = os.path.join(rootdir_name, files_dir_stand)
 fileinfo = readfiles_libids(datadir_name)
 
-start_time_obj_list = []
-stop_time_obj_list = []
-diff_time_list = []
-nshots_list = []
-          
-'''Reading binary data and its head'''            
-for i in range(len(fileinfo[0])):
-    f = open(fileinfo[0][i],"rb")
-    dic = f.readline().decode('utf-8')
-    aux = []
-    '''14 is the line number in the header of licel binary data - here it is needed only the 1st and 2nd lines'''
-    for j in range(2):
-        aux.append(f.readline().decode('utf-8'))    
-    
-    '''Reading binary data heads (2nd line) to select number of shots, start and stop time of measurements'''
-    n_shots = int(aux[1][16:21])
-    start_time = aux[0][10:29]
-    stop_time = aux[0][30:49]
-    start_time_obj = datetime.strptime(start_time, '%d/%m/%Y %H:%M:%S')
-    stop_time_obj = datetime.strptime(stop_time, '%d/%m/%Y %H:%M:%S')
-    diff_time = (stop_time_obj - start_time_obj).total_seconds()
-    diff_time_list.append(diff_time)
-    start_time_obj_list.append(start_time_obj) 
-    stop_time_obj_list.append(stop_time_obj)
-    nshots_list.append(n_shots)
-   
+'''Reading only the header of new or modified binary data (cached in the header catalog) to select number of shots, start and stop time of measurements'''
+df_index = headercatalog(fileinfo[0], os.path.join(rootdir_name, header_catalog))
+
 '''Setting up Dataframe with key variables to select data'''
 df_head = pd.DataFrame()
 df_head['filepath'] = fileinfo[0]
 df_head['flag_period'] = fileinfo[1]
 df_head['meas_type'] = fileinfo[2]
-df_head['start_time'] = start_time_obj_list
-df_head['stop_time'] = stop_time_obj_list
-df_head['nshots'] = nshots_list
-df_head['gap_nshots'] = diff_time_list
+df_head['start_time'] = df_index['start_time']
+df_head['stop_time'] = df_index['stop_time']
+df_head['nshots'] = df_index['nshots']
+df_head['gap_nshots'] = (df_index['stop_time'] - df_index['start_time']).dt.total_seconds()
 
 '''Condition to select bad files from original dataframe'''
 bad_file_cond = ((df_head['nshots'] == 0) | (df_head['nshots'] < 2998) | (df_head['nshots'] > 3008) )
@@ -6,6 +6,8 @@ This script was addapted from the Atmospheric lidar packages created by Ioannis
 More informations can be found in
 https://gitlab.com/ioannis_binietoglou/atmospheric-lidar
 https://pypi.org/project/atmospheric-lidar/
+The measurement days are converted in parallel (--workers) and a day is only converted again when its binary
+files (or the netcdf parameters) are newer than its netcdf file (--force converts all of them).
 Created on Wed Dec 17 06:38:50 2020
 @author: Fábio J. S. Lopes, Alexandre C. Yoshida and Alexandre Cacheffo, Marcia Marques
 """
@@ -17,57 +19,95 @@ from atmospheric_lidar_parameters import msp_netcdf_parameters_system484
 
 import os
 import glob
+import time
+import argparse
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 rootdir_name = os.getcwd()
 stand_files_dir = '02-data_raw_organized'
 scc_files_dir = '03-netcdf_data'
+file_workers = 4 # number of threads reading the binary files of a measurement
 
-'''Reading folder with binary data'''   
-for path in glob.glob(f'{os.path.join(rootdir_name,stand_files_dir)}/*/*/'):    
-    meas_name = Path(os.path.relpath(path,os.sep.join([rootdir_name,stand_files_dir]))).parts[1][:8]
-    meas_period = Path(os.path.relpath(path,os.sep.join([rootdir_name,stand_files_dir]))).parts[1][8:]
-    save_id = (''.join([meas_name,'sa',meas_period]))
+'''Set up of netcdf data parameters for day and nigth measurements - important for SCC internal configuration'''
+'''Use msp_netcdf_parameters_system565.py for daytime measurements'''
+'''Use msp_netcdf_parameters.py for nighttime measurements'''
+class mspDayLidarMeasurement(LicelLidarMeasurement):
+    extra_netcdf_parameters = msp_netcdf_parameters_system565
+
+class mspNightLidarMeasurement(LicelLidarMeasurement):
+    extra_netcdf_parameters = msp_netcdf_parameters_system484
+
+def measurement_days(datadir_name):
+    '''List of the measurement days (folder, save id and measurement class) found in the raw organized folder'''
+    days = []
+    for path in sorted(glob.glob(f'{datadir_name}/*/*/')):
+        meas_name = Path(os.path.relpath(path,datadir_name)).parts[1][:8]
+        meas_period = Path(os.path.relpath(path,datadir_name)).parts[1][8:]
+        save_id = (''.join([meas_name,'sa',meas_period]))
+        if (meas_period == 'am') or (meas_period == 'pm'):
+            days.append((path, save_id, mspDayLidarMeasurement))
+        else:
+            days.append((path, save_id, mspNightLidarMeasurement))
+    return days
+
+def day_files(path):
+    '''Measurement and dark current files of a measurement day'''
     files_meas = []
     files_meas_dc = []
-
-    '''Set up of netcdf data parameters for day and nigth measurements - important for SCC internal configuration'''
-    '''Use msp_netcdf_parameters_system565.py for daytime measurements'''
-    '''Use msp_netcdf_parameters.py for nighttime measurements'''              
-    if (meas_period == 'am') or (meas_period == 'pm'):
-        print('Day time ' + meas_period.upper() + ' period --> Using msp_netcdf_parameters_system565')
-        class mspLidarMeasurement(LicelLidarMeasurement):
-            extra_netcdf_parameters = msp_netcdf_parameters_system565
-    else:
-        print('Nigth time period --> Using msp_netcdf_parameters_system484')
-        class mspLidarMeasurement(LicelLidarMeasurement):
-            extra_netcdf_parameters = msp_netcdf_parameters_system484
-    
-    '''Selection of measurement and dar current measurements'''
     for dir_meas in os.listdir(path):
-        
         for files in os.listdir(os.path.join(path,dir_meas)):
-            
             if dir_meas == 'measurements':
                 files_meas.append(os.path.join(path,dir_meas,files))
             else:
                 files_meas_dc.append(os.path.join(path,dir_meas,files))
-           
-    '''Reading file measurements'''
-    my_measurement = mspLidarMeasurement(files_meas)
-    
-    '''Reading dark current measurements'''
-    my_dark_measurement = mspLidarMeasurement(files_meas_dc)
-    
-    '''Link between measurement and dark measurement'''
-    my_measurement.dark_measurement = my_dark_measurement
-    
-    '''File ID name for SCC intenrl usage. Temperature and Pressure from Lidar site at surface level'''
-    my_measurement.info["Measurement_ID"] = save_id
-    my_measurement.info["Temperature"] = "25"
-    my_measurement.info["Pressure"] = "940"
-    
-    '''saving as netcdf data'''
+    return files_meas, files_meas_dc
+
+def is_up_to_date(path, measurement_class, scc_file):
+    '''True if the netcdf file is newer than the binary files of the day and its netcdf parameters'''
+    if not os.path.isfile(scc_file):
+        return False
+    files_meas, files_meas_dc = day_files(path)
+    inputs = files_meas + files_meas_dc + [measurement_class.extra_netcdf_parameters.__file__]
+    return max(os.path.getmtime(f) for f in inputs) <= os.path.getmtime(scc_file)
+
+def convert_day(path, save_id, measurement_class, save_files_path):
+    '''Convert one measurement day to the SCC netcdf file. Return the save id, the wall time and the error message (None if converted)'''
+    t0 = time.perf_counter()
+    try:
+        files_meas, files_meas_dc = day_files(path)
+
+        '''Reading file measurements, only the channels in the SCC parameters are read'''
+        scc_channels = list(measurement_class.extra_netcdf_parameters.channel_parameters)
+        my_measurement = measurement_class(files_meas, channels = scc_channels, workers = file_workers)
+
+        '''Reading dark current measurements'''
+        my_dark_measurement = measurement_class(files_meas_dc, channels = scc_channels, workers = file_workers)
+
+        '''Link between measurement and dark measurement'''
+        my_measurement.dark_measurement = my_dark_measurement
+
+        '''File ID name for SCC intenrl usage. Temperature and Pressure from Lidar site at surface level'''
+        my_measurement.info["Measurement_ID"] = save_id
+        my_measurement.info["Temperature"] = "25"
+        my_measurement.info["Pressure"] = "940"
+
+        '''saving as netcdf data, written aside and renamed so an interrupted conversion leaves no up-to-date looking file'''
+        scc_file = os.path.join(save_files_path,''.join([save_id,'.nc']))
+        my_measurement.save_as_SCC_netcdf(scc_file + '.tmp')
+        os.replace(scc_file + '.tmp', scc_file)
+    except Exception as error:
+        if os.path.isfile(os.path.join(save_files_path,''.join([save_id,'.nc.tmp']))):
+            os.remove(os.path.join(save_files_path,''.join([save_id,'.nc.tmp'])))
+        return save_id, time.perf_counter() - t0, '%s: %s' % (type(error).__name__, error)
+    return save_id, time.perf_counter() - t0, None
+
+def main():
+    parser = argparse.ArgumentParser(description='LIBIDS - conversion of the Licel binary data to SCC netcdf files')
+    parser.add_argument('--workers', type=int, default=1, help='number of measurement days converted in parallel (default: 1)')
+    parser.add_argument('--force', action='store_true', help='convert also the days with an up-to-date netcdf file')
+    args = parser.parse_args()
+
     save_files_path = os.path.join(rootdir_name,scc_files_dir)
     if not os.path.exists(save_files_path):
         try:
@@ -76,5 +116,41 @@ for path in glob.glob(f'{os.path.join(rootdir_name,stand_files_dir)}/*/*/'):
             print ('Creation of the bad files directory % s failed' % save_files_path)
         else:
             print ('Successfully created the bad files directory % s' % save_files_path)
-    my_measurement.save_as_SCC_netcdf(os.path.join(save_files_path,''.join([save_id,'.nc'])))
-    print('Successfully created the SCC netcdf data % s' % save_id)
+
+    '''Reading folder with binary data, the days with an up-to-date netcdf file are skipped'''
+    t0 = time.perf_counter()
+    to_convert = []
+    skipped = []
+    for path, save_id, measurement_class in measurement_days(os.path.join(rootdir_name,stand_files_dir)):
+        if not args.force and is_up_to_date(path, measurement_class, os.path.join(save_files_path,''.join([save_id,'.nc']))):
+            print('Up-to-date SCC netcdf data % s --> skipped' % save_id)
+            skipped.append(save_id)
+        else:
+            print('%s --> Using %s' % (save_id, measurement_class.extra_netcdf_parameters.__name__.split('.')[-1]))
+            to_convert.append((path, save_id, measurement_class, save_files_path))
+
+    converted = []
+    failed = []
+    def report(save_id, walltime, error):
+        if error is None:
+            print('Successfully created the SCC netcdf data %s in %.1f s' % (save_id, walltime))
+            converted.append(save_id)
+        else:
+            print('Failed to create the SCC netcdf data %s --> %s' % (save_id, error))
+            failed.append(save_id)
+
+    if args.workers > 1:
+        with ProcessPoolExecutor(max_workers=args.workers) as executor:
+            futures = [executor.submit(convert_day, *day) for day in to_convert]
+            for future in as_completed(futures):
+                report(*future.result())
+    else:
+        for day in to_convert:
+            report(*convert_day(*day))
+
+    print('%d measurement days converted, %d skipped and %d failed in %.1f s' % (len(converted), len(skipped), len(failed), time.perf_counter() - t0))
+    if failed:
+        print('Failed: ' + ', '.join(sorted(failed)))
+
+if __name__ == '__main__':
+    main()
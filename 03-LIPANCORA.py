@@ -15,12 +15,16 @@ Created on Sun Jun 27 22:12:49 2021
 """
 
 import os
+import time
+import argparse
 import numpy as np  # noqa: F401
 import pandas as pd
 from pathlib import Path
 from datetime import datetime
 from datetime import timedelta
 from functions import milgrau_function as mf
+from functions import product_function as pf
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 rootdir_name = os.getcwd()
 files_dir_stand = '02-data_raw_organized'
@@ -28,11 +32,8 @@ files_dir_level0 = '04-data_level0'
 files_dir_level1 = '05-data_level1'
 preprocessed_level1_dir = '02-preprocessed_corrected' 
 rcsignal_dir = '03-rcsignal'
+product_format = 'csv'   # level 0 and level 1 product format: 'csv' (one file per profile) or 'netcdf' (one cube per day)
 datadir_name = os.path.join(rootdir_name, files_dir_stand)
-        
-'''Reading all measurements directory'''
-
-fileinfo, subfolderinfo = mf.readfiles_meastype(datadir_name)
 
 '''Reading dark-current and atmospheric measurements files'''
 binshiftcorr = [1, -1, 6, -3, 7, -2, 8, -2, 8, -2, 8, -2]
@@ -49,7 +50,9 @@ def datetime2matlabdn(dt):
    frac_microseconds = dt.microsecond / (24.0 * 60.0 * 60.0 * 1000000.0)
    return mdn.toordinal() + frac_seconds + frac_microseconds
 
-for i in range(len(fileinfo)):
+def process_day(daydir, subfolderinfo):
+    '''Level 0 and level 1 processing of one measurement day directory. Return the day name and its wall time'''
+    t0 = time.perf_counter()
     rawdata=[]
     rcsignal=[]
     dtrawdata=[]
@@ -58,21 +61,16 @@ for i in range(len(fileinfo)):
     meandcfiles=[]
     rawdatafiles=[]
     rawdatabgcorrected=[]
-    signal532AN=[]
-    signal532ANarray = []
-    bgarray = []
-    timearray=[]
-    altarray=[]
-    rcsignal1=[]
+    headers=[]
 
     for j in range(len(subfolderinfo)):
-        rawdata.append(mf.readfiles_generic(os.path.join(fileinfo[i], subfolderinfo[j])))
+        rawdata.append(mf.readfiles_generic(os.path.join(daydir, subfolderinfo[j])))
         if subfolderinfo[j] == 'dark_current': 
-            meandcfiles = mf.rebind(rawdata[j], deadtime, rootdir_name, datadir_name, files_dir_level0, files_dir_level1)
+            meandcfiles = mf.rebind(rawdata[j], deadtime, rootdir_name, datadir_name, files_dir_level0, files_dir_level1, product_format)
         else:
-            rawdatafiles, dictsetup, filenameaux, csv_files_path = mf.rebind(rawdata[j], deadtime, rootdir_name, datadir_name, files_dir_level0, files_dir_level1)
+            rawdatafiles, dictsetup, filenameaux, csv_files_path = mf.rebind(rawdata[j], deadtime, rootdir_name, datadir_name, files_dir_level0, files_dir_level1, product_format)
             
-    alt = pd.DataFrame(list(range(len(rawdatafiles[i].index)))).mul(dictsetup['vert_res'][0])+dictsetup['vert_res'][0]
+    alt = pd.DataFrame(list(range(len(rawdatafiles[0].index)))).mul(dictsetup['vert_res'][0])+dictsetup['vert_res'][0]
     alt.columns=['altitude']
     alt['rangesqrt']=alt['altitude'].pow(2)
     
@@ -94,22 +92,59 @@ for i in range(len(fileinfo)):
         rawdatabgcorrected.append(bsrawdata[k].sub(background))
         
         rcsignal.append(rawdatabgcorrected[k].mul(alt['rangesqrt'],axis = 0))
-        rawdatabgcorrected[k].to_csv(os.path.join(csv_files_dir_corrected,filenameaux_corr[k]), index=False, float_format="%.4f")
-        rcsignal[k].to_csv(os.path.join(csv_files_dir_rcsignal,filenameaux_rcsignal[k]), index=False, float_format="%.4f")  
         
-        '''writing down the header for Corrected and Pre-processed and Range Corrected files '''
-        line1 = ' '.join(['station ' + dictsetup['site'] + '\n'])
-        line2 = ' '.join(['altitude ' + dictsetup['altitude'] + '\n'])
-        line3 = ' '.join(['lat ' + dictsetup['lat'] + '\n'])
-        line4 = ' '.join(['long ' + dictsetup['long'] + '\n'])
-        line5 = ' '.join(['starttime ' + dictsetup['start_time'][k] + '\n'])
-        line6 = ' '.join(['stoptime ' + dictsetup['stop_time'][k] + '\n'])
-        line7 = ' '.join(['bins ' + str(dictsetup['nbins'][0]) + '\n'])
-        line8 = ' '.join(['vert_res ' + str(dictsetup['vert_res'][0]) + '\n'])
-        line9 = ' '.join(['shotnumber ' + str(dictsetup['nshots'][0]) + '\n'])
-        line10 = ' '.join(['laser_freq ' + dictsetup['laser_freq'] + '\n'])
-        mf.writedown_header(os.path.join(csv_files_dir_corrected,filenameaux_corr[k]), line1, line2, line3, line4, line5, line6, line7, line8, line9, line10)
-        mf.writedown_header(os.path.join(csv_files_dir_rcsignal,filenameaux_rcsignal[k]), line1, line2, line3, line4, line5, line6, line7, line8, line9, line10)
+        '''header for Corrected and Pre-processed and Range Corrected files '''
+        headers.append({'station': dictsetup['site'],
+                        'altitude': dictsetup['altitude'],
+                        'lat': dictsetup['lat'],
+                        'long': dictsetup['long'],
+                        'starttime': dictsetup['start_time'][k],
+                        'stoptime': dictsetup['stop_time'][k],
+                        'bins': dictsetup['nbins'][0],
+                        'vert_res': dictsetup['vert_res'][0],
+                        'shotnumber': dictsetup['nshots'][0],
+                        'laser_freq': dictsetup['laser_freq']})
+
+    pf.write_day(product_format, csv_files_dir_corrected, datedir, filenameaux_corr, rawdatabgcorrected, headers)
+    pf.write_day(product_format, csv_files_dir_rcsignal, datedir, filenameaux_rcsignal, rcsignal, headers)
+
+    return datedir, time.perf_counter() - t0
+
+def main():
+    parser = argparse.ArgumentParser(description='LIPANCORA - level 0 and level 1 lidar data processing')
+    parser.add_argument('--workers', type=int, default=1, help='number of measurement days processed in parallel (default: 1)')
+    args = parser.parse_args()
+
+    '''Reading all measurements directory'''
+    fileinfo, subfolderinfo = mf.readfiles_meastype(datadir_name)
+
+    t0 = time.perf_counter()
+    failed = []
+    def report(daydir, process):
+        # A failing day is reported and the other days are still processed
+        dayname = Path(daydir).name
+        try:
+            datedir, walltime = process()
+        except Exception as error:
+            print('Failed to process the measurement day %s --> %s: %s' % (dayname, type(error).__name__, error))
+            failed.append(dayname)
+        else:
+            print('Measurement day %s processed in %.1f s' % (datedir, walltime))
+
+    if args.workers > 1:
+        with ProcessPoolExecutor(max_workers=args.workers) as executor:
+            futures = {executor.submit(process_day, daydir, subfolderinfo): daydir for daydir in fileinfo}
+            for future in as_completed(futures):
+                report(futures[future], future.result)
+    else:
+        for daydir in fileinfo:
+            report(daydir, lambda: process_day(daydir, subfolderinfo))
+    print('%d measurement days processed and %d failed in %.1f s' % (len(fileinfo) - len(failed), len(failed), time.perf_counter() - t0))
+    if failed:
+        print('Failed: ' + ', '.join(sorted(failed)))
+
+if __name__ == '__main__':
+    main()
 
 #np.savetxt("signal532.dat", signal532ANarray)
 #np.savetxt("bg.dat", bgarray)
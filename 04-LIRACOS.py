@@ -6,15 +6,24 @@ Created on Fri Jul 16 08:05:10 2021
 @author: Fábio J. S. Lopes, Alexandre C. Yoshida and Alexandre Cacheffo
 """
 
+import argparse
 import os
-from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
+import matplotlib
+import numpy as np
 import pandas as pd
 
-from functions import liracos_function as lrc
-from functions import milgrau_function as mf
-from functions import qlhtml_function_amanda as qlf
+# The figures are only saved, also by the rendering worker processes. The backend
+# is set before the imports below, as liracos_function imports pyplot.
+matplotlib.use("Agg")
+
+from functions import liracos_function as lrc  # noqa: E402
+from functions import milgrau_function as mf  # noqa: E402
+from functions import product_function as pf  # noqa: E402
+from functions import qlhtml_function_amanda as qlf  # noqa: E402
+from lidar_retrievals import glue  # noqa: E402
 
 rootdir_name = os.getcwd()
 files_dir_level1 = "05-data_level1"
@@ -29,178 +38,245 @@ rcsmean_dirname = os.path.join(rootdir_name, rcsscale, "01-meanrcs")
 rcsmin_dirname = os.path.join(rootdir_name, rcsscale, "01-minrcs")
 version = "level1"
 
-"""Reading all measurements directory"""
-fileinfo, subfolderinfo = mf.readfiles_meastype(datadir_name)
-
 lamb = [355, 532, 1064]
 maxscale_alt = 15000  # max scale altitude for mean RCS graphics
 maxscale_altql = 15000  # max scale altitude for quicklook RCS graphics
-channelmode = "AN"
-dfmaxrcstotal = pd.DataFrame()
-dfmeanrcstotal = pd.DataFrame()
-dfminrcstotal = pd.DataFrame()
-
-# for i in trange(len(fileinfo),file=sys.stdout, desc='outer loop'):
-# for i in trange(2,file=sys.stdout, desc='outer loop'):
-for i in range(len(fileinfo)):
-    alt = []
-    rcsignal = []
-    datafiles = []
-    filenameheader = []
-    rcstime = []
-    maxrcs = []
-    meanrcs = []
-    minrcs = []
-    dfmaxrcs = pd.DataFrame()
-    dfmeanrcs = pd.DataFrame()
-    dfminrcs = pd.DataFrame()
-
-    for j in range(len(subfolderinfo)):
-        datafiles.append(
-            mf.readfiles_generic(os.path.join(fileinfo[i], subfolderinfo[j]))
-        )
-        if subfolderinfo[j] == files_dir_to_read:
-            for filename in datafiles[j]:
-                rcsignal.append(pd.read_csv(filename, sep=",", skiprows=range(0, 10)))
-                filenameheader.append(mf.readdown_header(filename))
-                dfdict = pd.DataFrame(filenameheader)
-
-    for k in range(len(rcsignal)):
-        alt = pd.DataFrame(list(range(len(rcsignal[k].index)))).mul(
-            float(dfdict["vert_res"][k])
-        ) + float(dfdict["vert_res"][k])
-        alt.columns = ["altitude"]
-        rcsignalmean = pd.concat(rcsignal).groupby(level=0).mean()
-        rcstotal = pd.concat(rcsignal, axis=1)
-        rcstime.append(
-            datetime.strptime(dfdict["starttime"][k], "%d/%m/%Y-%H:%M:%S").strftime(
-                "%Y-%m-%d %H:%M:%S"
-            )
-        )
+channelmode = "AN"  # 'AN', 'PC' or 'GL' (AN and PC glued profile by profile)
+"""time-resolved gluing setup, used for channelmode 'GL'"""
+gluing_window_length = 50
+gluing_correlation_threshold = 0.95
+gluing_intercept_threshold = 0.5
+gluing_gaussian_threshold = 0.1
+gluing_minmax_threshold = 0.5
+gluing_min_idx = 200  # 200 * 7.5 = 1500 m
+gluing_max_idx = 2000  # 2000 * 7.5 = 15000 m
+
+
+def render(executor, jobs, figurepath, datafiles, skip_uptodate, function, *args):
+    """Render one figure, in the worker pool if there is one.
+
+    The figure is skipped if skip_uptodate is set and its PNG is newer than the data files.
+    """
+    if skip_uptodate and lrc.figure_uptodate(figurepath, datafiles):
+        print("Skipping up-to-date figure %s" % os.path.basename(figurepath))
+    elif executor is None:
+        function(*args)
+    else:
+        jobs.append(executor.submit(function, *args))
+
 
-    yeardir = Path(os.path.relpath(filename, datadir_name)).parts[-4]
-    datedir = Path(os.path.relpath(filename, datadir_name)).parts[-3]
-    rcsmeangraphics_dir = os.path.join(
-        rootdir_name, files_dir_level1, yeardir, datedir, file_dir_meanrcs
+def main():
+    parser = argparse.ArgumentParser(
+        description="LIRACOS - range corrected signal quicklook graphics"
     )
-    mf.folder_creation(rcsmeangraphics_dir)
-    quicklook_graphics_dir = os.path.join(
-        rootdir_name, files_dir_level1, yeardir, datedir, file_dir_quicklooks
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="number of processes rendering the figures (default: 1)",
     )
-    mf.folder_creation(quicklook_graphics_dir)
+    parser.add_argument(
+        "--skip-uptodate",
+        action="store_true",
+        help="skip figures whose PNG file is newer than their input data",
+    )
+    args = parser.parse_args()
 
-    for ii in range(len(lamb)):
+    """Reading all measurements directory"""
+    fileinfo, subfolderinfo = mf.readfiles_meastype(datadir_name)
 
-        if lamb[ii] == 1064:
-            qlchannelmode = "AN"
-        else:
-            qlchannelmode = channelmode
+    if args.workers > 1:
+        executor = ProcessPoolExecutor(max_workers=args.workers)
+    else:
+        executor = None
+    jobs = []
 
-        rcslambda = rcstotal[str(lamb[ii]) + qlchannelmode].set_index(
-            [pd.Index(alt["altitude"])]
-        )
-        rcslambda.columns = rcstime
-        rcsheatmap = rcslambda.T.reset_index().rename(columns={"index": "Time_UTC"})
-        rcsheatmap["Time_UTC"] = pd.to_datetime(
-            rcsheatmap["Time_UTC"], format="%Y-%m-%d %H:%M:%S"
-        )
-        time_values = pd.DataFrame(columns=[rcslambda.index])
-        time_values_list = []
-        for ix in range(0, len(rcsheatmap["Time_UTC"]) - 1):
-            dif = divmod(
-                (
-                    rcsheatmap["Time_UTC"][ix + 1] - rcsheatmap["Time_UTC"][ix]
-                ).total_seconds(),
-                1,
+    dfmaxrcstotal = pd.DataFrame()
+    dfmeanrcstotal = pd.DataFrame()
+
+    # for i in trange(len(fileinfo),file=sys.stdout, desc='outer loop'):
+    # for i in trange(2,file=sys.stdout, desc='outer loop'):
+    for i in range(len(fileinfo)):
+        rcsignal = []
+        datafiles = []
+        maxrcs = []
+        meanrcs = []
+        minrcs = []
+        dfmaxrcs = pd.DataFrame()
+        dfmeanrcs = pd.DataFrame()
+        dfminrcs = pd.DataFrame()
+
+        for j in range(len(subfolderinfo)):
+            datafiles.append(
+                mf.readfiles_generic(os.path.join(fileinfo[i], subfolderinfo[j]))
             )
-            if dif[0] > float(61.0):
-                nfactor = int(
-                    dif[0]
-                    // int(
-                        (float(dfdict["shotnumber"][ix]) - 1)
-                        / float(dfdict["laser_freq"][ix])
-                    )
+            if subfolderinfo[j] == files_dir_to_read:
+                inputfiles = datafiles[j]
+                datafiles[j], rcsignal, channels, dfdict = pf.load_day(
+                    os.path.join(fileinfo[i], subfolderinfo[j])
                 )
-                for jx in range(1, nfactor):
-                    time_values_list.append(
-                        rcsheatmap["Time_UTC"][ix] + jx * timedelta(seconds=60)
-                    )
+                filename = datafiles[j][-1]
 
-        missing_time_values = pd.concat(
-            [time_values.T, pd.DataFrame(columns=time_values_list)], ignore_index=True
-        )
+        if channelmode == "GL":
+            for wavelength in lamb:
+                if wavelength == 1064:  # quicklooks use the 1064 nm AN channel
+                    continue
+                glued_signal = glue.glue_signals_time_resolved(
+                    pf.day_channel_matrix(rcsignal, channels, str(wavelength) + "AN").T,
+                    pf.day_channel_matrix(rcsignal, channels, str(wavelength) + "PC").T,
+                    gluing_window_length,
+                    gluing_correlation_threshold,
+                    gluing_intercept_threshold,
+                    gluing_gaussian_threshold,
+                    gluing_minmax_threshold,
+                    gluing_min_idx,
+                    gluing_max_idx,
+                )[0]
+                rcsignal = np.concatenate(
+                    [rcsignal, glued_signal[:, :, np.newaxis]], axis=2
+                )
+                channels = channels + [str(wavelength) + "GL"]
 
-        new_rcslambda = rcslambda.join(missing_time_values).fillna(0.0)
+        alt = pf.day_altitude(dfdict, rcsignal.shape[1])
+        rcsignalmean = pf.day_mean_profile(rcsignal, channels)
+        rcstime = (
+            pd.to_datetime(dfdict["starttime"], format="%d/%m/%Y-%H:%M:%S")
+            .dt.strftime("%Y-%m-%d %H:%M:%S")
+            .tolist()
+        )
 
-        new_rcslambda = new_rcslambda.T.reset_index()
-        new_rcslambda.insert(loc=1, column="0", value=0)
-        new_rcslambda["index"] = pd.to_datetime(
-            new_rcslambda["index"], format="%Y-%m-%d %H:%M:%S"
+        yeardir = Path(os.path.relpath(filename, datadir_name)).parts[-4]
+        datedir = Path(os.path.relpath(filename, datadir_name)).parts[-3]
+        rcsmeangraphics_dir = os.path.join(
+            rootdir_name, files_dir_level1, yeardir, datedir, file_dir_meanrcs
         )
-        new_rcslambda = new_rcslambda.sort_values(by="index").set_index("index")
-        new_index_rcslambda = new_rcslambda.index.to_series().transform(
-            lambda x: x.strftime("%H:%M")
+        mf.folder_creation(rcsmeangraphics_dir)
+        quicklook_graphics_dir = os.path.join(
+            rootdir_name, files_dir_level1, yeardir, datedir, file_dir_quicklooks
         )
-        new_rcslambda = new_rcslambda.set_index(new_index_rcslambda).T
-        maxrcs.append(max(new_rcslambda.max()))
-        meanrcs.append(new_rcslambda.mean().mean())
-        minrcs.append(min(new_rcslambda.min()))
-        dfmaxrcs[str(lamb[ii])] = [max(new_rcslambda.max())]
-        dfmeanrcs[str(lamb[ii])] = [new_rcslambda.mean().mean()]
-        dfminrcs[str(lamb[ii])] = [min(new_rcslambda.min())]
-
-        lrc.ql(
-            new_rcslambda,
+        mf.folder_creation(quicklook_graphics_dir)
+
+        for ii in range(len(lamb)):
+
+            if lamb[ii] == 1064:
+                qlchannelmode = "AN"
+            else:
+                qlchannelmode = channelmode
+
+            rcslambda = pd.DataFrame(
+                pf.day_channel_matrix(
+                    rcsignal, channels, str(lamb[ii]) + qlchannelmode
+                ),
+                index=pd.Index(alt["altitude"]),
+                columns=rcstime,
+            )
+            # The gaps and the missing values of the measured profiles are set to 0
+            new_rcslambda = lrc.fill_time_gaps(
+                rcslambda, dfdict["shotnumber"], dfdict["laser_freq"]
+            ).fillna(0.0)
+            firstprofile_time = new_rcslambda.columns[0]
+
+            # Zero altitude row on top of the profiles and HH:MM time labels
+            new_rcslambda = pd.concat(
+                [
+                    pd.DataFrame(0.0, index=["0"], columns=new_rcslambda.columns),
+                    new_rcslambda,
+                ]
+            )
+            new_rcslambda.columns = new_rcslambda.columns.strftime("%H:%M")
+            maxrcs.append(max(new_rcslambda.max()))
+            meanrcs.append(new_rcslambda.mean().mean())
+            minrcs.append(min(new_rcslambda.min()))
+            dfmaxrcs[str(lamb[ii])] = [max(new_rcslambda.max())]
+            dfmeanrcs[str(lamb[ii])] = [new_rcslambda.mean().mean()]
+            dfminrcs[str(lamb[ii])] = [min(new_rcslambda.min())]
+
+            render(
+                executor,
+                jobs,
+                os.path.join(
+                    quicklook_graphics_dir,
+                    lrc.ql_figname(
+                        dfdict,
+                        fileinfo[i],
+                        rootdir_name,
+                        lamb[ii],
+                        qlchannelmode,
+                        maxscale_altql,
+                        version,
+                    ),
+                ),
+                inputfiles,
+                args.skip_uptodate,
+                lrc.ql,
+                new_rcslambda,
+                alt,
+                rcstime,
+                lamb[ii],
+                qlchannelmode,
+                dfdict,
+                maxscale_altql,
+                fileinfo[i],
+                rootdir_name,
+                version,
+                quicklook_graphics_dir,
+            )
+        dfmaxrcs["data"] = pd.to_datetime(
+            firstprofile_time, format="%Y-%m-%d"
+        ).strftime("%Y-%m-%d")
+        dfmaxrcstotal = pd.concat([dfmaxrcstotal, dfmaxrcs], ignore_index=True)
+        dfmeanrcs["data"] = pd.to_datetime(
+            firstprofile_time, format="%Y-%m-%d"
+        ).strftime("%Y-%m-%d")
+        dfmeanrcstotal = pd.concat([dfmeanrcstotal, dfmeanrcs], ignore_index=True)
+        dfminrcs["data"] = pd.to_datetime(
+            firstprofile_time, format="%Y-%m-%d"
+        ).strftime("%Y-%m-%d")
+        meanrcsfigurename, measperiod = lrc.meanrcs_figname(
+            dfdict, fileinfo[i], rootdir_name, channelmode, maxscale_alt, version
+        )
+        render(
+            executor,
+            jobs,
+            os.path.join(rcsmeangraphics_dir, meanrcsfigurename),
+            inputfiles,
+            args.skip_uptodate,
+            lrc.meanrcs,
+            rcsignalmean,
             alt,
-            rcstime,
-            lamb[ii],
-            qlchannelmode,
+            lamb,
+            channelmode,
             dfdict,
-            maxscale_altql,
+            maxscale_alt,
             fileinfo[i],
             rootdir_name,
             version,
-            quicklook_graphics_dir,
+            rcsmeangraphics_dir,
         )
-    dfmaxrcs["data"] = pd.to_datetime(
-        rcsheatmap["Time_UTC"][0], format="%Y-%m-%d"
-    ).strftime("%Y-%m-%d")
-    dfmaxrcstotal = pd.concat([dfmaxrcstotal, dfmaxrcs], ignore_index=True)
-    dfmeanrcs["data"] = pd.to_datetime(
-        rcsheatmap["Time_UTC"][0], format="%Y-%m-%d"
-    ).strftime("%Y-%m-%d")
-    dfmeanrcstotal = pd.concat([dfmeanrcstotal, dfmeanrcs], ignore_index=True)
-    dfminrcs["data"] = pd.to_datetime(
-        rcsheatmap["Time_UTC"][0], format="%Y-%m-%d"
-    ).strftime("%Y-%m-%d")
-    meanrcsfigurename, measperiod = lrc.meanrcs(
-        rcsignalmean,
-        alt,
-        lamb,
-        channelmode,
-        dfdict,
-        maxscale_alt,
-        fileinfo[i],
-        rootdir_name,
-        version,
-        rcsmeangraphics_dir,
-    )
-    qlf.qlhtml(
-        dfdict,
-        fileinfo[i],
-        rootdir_name,
-        html_dir,
-        version,
-        meanrcsfigurename,
-        measperiod,
-        channelmode,
-        lamb,
-    )
+        qlf.qlhtml(
+            dfdict,
+            fileinfo[i],
+            rootdir_name,
+            html_dir,
+            version,
+            meanrcsfigurename,
+            measperiod,
+            channelmode,
+            lamb,
+        )
+
+    for job in jobs:
+        job.result()
+    if executor is not None:
+        executor.shutdown()
+
+    # dfmaxrcstotal.to_csv(rcsmax_dirname, index=False, float_format="%.4f")
+    # dfmeanrcstotal.to_csv(rcsmean_dirname, index=False, float_format="%.4f")
+    # dfminrcstotal.to_csv(rcsmin_dirname, index=False, float_format="%.4f")
 
 
-# dfmaxrcstotal.to_csv(rcsmax_dirname, index=False, float_format="%.4f")
-# dfmeanrcstotal.to_csv(rcsmean_dirname, index=False, float_format="%.4f")
-# dfminrcstotal.to_csv(rcsmin_dirname, index=False, float_format="%.4f")
+if __name__ == "__main__":
+    main()
 
 
 # del i, ii, j, k, datedir, yeardir, lamb
@@ -13,6 +13,7 @@ import pandas as pd
 from scipy.signal import savgol_filter
 
 from functions import milgrau_function as mf
+from functions import product_function as pf
 from lidar_retrievals import glue, kfs, retrieval_plots
 from molecular import lidarmolfit as lmfit
 
@@ -21,12 +22,14 @@ rootdir_name = os.getcwd()
 files_dir_level1 = "05-data_level1"
 files_dir_to_read = "02-preprocessed_corrected"
 rawinsonde_folder = "07-rawinsonde"
+molecular_cache_folder = None  # folder to keep the molecular profiles between runs, None: only in memory
 datadir_name = os.path.join(rootdir_name, files_dir_level1)
 
 
 """flag to calculate molecular profile """
 
 atmospheric_flag = "us_std"  # 'radiosounding' for rawinsonde data or 'us_std' for US-standard atmosphere
+lmfit.set_molecular_cache(molecular_cache_folder)
 
 """Input data from user"""
 lamb = 532  # elastic wavelength to be analyzed (1064, 532 and 355 nm)
@@ -38,6 +41,13 @@ optical_prop_scale = 1e6  # optical properties graphics unit in Mega-meter
 altitude_scale = 1000  # altitude scale in km (a.g.l.)
 altitude_min = 0.0  # minimum altitude range for bacckscatter and extinction graphics
 altitude_max = 30  # minimum altitude range for bacckscatter and extinction graphics
+aod_photometer = None  # sun-photometer AOD at lamb to fit the lidar ratio, None: table
+lidar_ratio_candidates = np.arange(10, 121, 1)  # lidar ratios swept for the AOD fit
+klett_curtain = "no"  # 'yes' to also invert the time-resolved profiles (curtain)
+curtain_channelmode = "AN"  # channel mode of the time-resolved inversion
+curtain_average = 1  # number of consecutive profiles averaged for the curtain
+curtain_product_format = "netcdf"  # curtain product format, 'csv' or 'netcdf'
+curtain_dir = "05-kfs_curtain"  # curtain folder, inside the measurement day folder
 
 
 lraerosol_month = {
@@ -73,27 +83,20 @@ fileinfo, subfolderinfo = mf.readfiles_meastype(datadir_name)
 for i in range(len(fileinfo)):
     preprocessedsignal = []
     datafiles = []
-    filenameheader = []
-    preprocessedtime = []
 
     for j in range(len(subfolderinfo)):
         datafiles.append(
             mf.readfiles_generic(os.path.join(fileinfo[i], subfolderinfo[j]))
         )
         if subfolderinfo[j] == files_dir_to_read:
-            for filename in datafiles[j]:
-                preprocessedsignal.append(
-                    pd.read_csv(filename, sep=",", skiprows=range(0, 10))
-                )
-                filenameheader.append(mf.readdown_header(filename))
-                dfdict = pd.DataFrame(filenameheader)
+            datafiles[j], preprocessedsignal, channels, dfdict = pf.load_day(
+                os.path.join(fileinfo[i], subfolderinfo[j])
+            )
+            filenameheader = dfdict.to_dict("records")
+            preprocessedfiles = datafiles[j]
 
-    for k in range(len(preprocessedsignal)):
-        alt = pd.DataFrame(list(range(len(preprocessedsignal[k].index)))).mul(
-            float(dfdict["vert_res"][k])
-        ) + float(dfdict["vert_res"][k])
-        alt.columns = ["altitude"]
-        preprocessedsignalmean = pd.concat(preprocessedsignal).groupby(level=0).mean()
+    alt = pf.day_altitude(dfdict, preprocessedsignal.shape[1])
+    preprocessedsignalmean = pf.day_mean_profile(preprocessedsignal, channels)
 
 
 """ Calling the glue function to gluing Analogic and Photocounting channels - glue.py file in lidar_retrievals folder"""
@@ -181,6 +184,31 @@ bin_length = float(dfdict["vert_res"][0])
 lidar_ratio_molecular = 8.37758041
 # rcs = np.multiply(preprocessedsignalmean[str(lamb)+channelmode].values.tolist(),np.power(alt['altitude'],2))
 
+if aod_photometer is not None:
+    lraerosol_aod = kfs.klett_lidar_ratio_aod(
+        rcs,
+        aod_photometer,
+        lidar_ratio_candidates,
+        beta_molecular,
+        index_reference,
+        reference_range,
+        beta_aerosol_reference,
+        bin_length,
+        lidar_ratio_molecular,
+    )
+    if np.isnan(lraerosol_aod):
+        print(
+            "No lidar ratio in %s-%s sr matches the AOD %s, using %s sr"
+            % (
+                lidar_ratio_candidates[0],
+                lidar_ratio_candidates[-1],
+                aod_photometer,
+                lraerosol,
+            )
+        )
+    else:
+        lraerosol = lraerosol_aod
+
 aerosol_backscatter = kfs.klett_backscatter_aerosol(
     rcs,
     lraerosol,
@@ -191,6 +219,61 @@ aerosol_backscatter = kfs.klett_backscatter_aerosol(
     bin_length,
     lidar_ratio_molecular,
 )
+
+if klett_curtain == "yes":
+    rcs_curtain = pf.day_time_average(
+        pf.day_channel_matrix(
+            preprocessedsignal, channels, str(lamb) + curtain_channelmode
+        ).T,
+        curtain_average,
+    ) * np.power(alt["altitude"].to_numpy(), 2)
+    aerosol_backscatter_curtain = kfs.klett_backscatter_aerosol(
+        rcs_curtain,
+        lraerosol,
+        np.asarray(beta_molecular),
+        index_reference,
+        reference_range,
+        beta_aerosol_reference,
+        bin_length,
+        lidar_ratio_molecular,
+    )
+    aerosol_extinction_curtain = aerosol_backscatter_curtain * lraerosol
+
+    """Saving the curtain, one profile per group of curtain_average profiles, in Mm-1 sr-1 and Mm-1"""
+    curtain_starts = np.arange(0, len(filenameheader), curtain_average)
+    curtain_stops = np.append(curtain_starts[1:], len(filenameheader)) - 1
+    curtain_filenames = [
+        os.path.basename(preprocessedfiles[start]).replace(
+            "level1_preprocessed", "level1_kfs_curtain"
+        )
+        for start in curtain_starts
+    ]
+    curtain_headers = [
+        dict(filenameheader[start], stoptime=filenameheader[stop]["stoptime"])
+        for start, stop in zip(curtain_starts, curtain_stops)
+    ]
+    curtain_profiles = [
+        pd.DataFrame(
+            {
+                str(lamb) + "backscatter": backscatter * optical_prop_scale,
+                str(lamb) + "extinction": extinction * optical_prop_scale,
+            }
+        )
+        for backscatter, extinction in zip(
+            aerosol_backscatter_curtain, aerosol_extinction_curtain
+        )
+    ]
+    curtain_dirpath = os.path.join(fileinfo[i], curtain_dir)
+    mf.folder_creation(curtain_dirpath)
+    pf.write_day(
+        curtain_product_format,
+        curtain_dirpath,
+        os.path.basename(fileinfo[i]),
+        curtain_filenames,
+        curtain_profiles,
+        curtain_headers,
+    )
+
 aerosol_backscatter_smooth = savgol_filter(aerosol_backscatter.values.tolist(), 15, 3)
 aerosol_extinction_smooth = savgol_filter(
     np.multiply(aerosol_backscatter.values.tolist(), lraerosol), 15, 3
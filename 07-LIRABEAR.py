@@ -9,9 +9,9 @@ Created on Sat Feb  5 07:51:19 2022
 
 import os
 import numpy as np
-import pandas as pd
 from scipy.signal import savgol_filter
 from functions import milgrau_function as mf
+from functions import product_function as pf
 from molecular import lidarmolfit as lmfit
 from lidar_retrievals import kfs
 from lidar_retrievals import glue
@@ -23,12 +23,14 @@ rootdir_name = os.getcwd()
 files_dir_level1 = '05-data_level1'
 files_dir_to_read = '02-preprocessed_corrected'
 rawinsonde_folder = '06-rawinsonde'
+molecular_cache_folder = None     # folder to keep the molecular profiles between runs, None: only in memory
 datadir_name = os.path.join(rootdir_name,files_dir_level1)
 
 
 '''flag to calculate molecular profile '''
 
 atmospheric_flag = 'radiosounding'    # 'radiosounding' for rawinsonde data or 'us_std' for US-standard atmosphere
+lmfit.set_molecular_cache(molecular_cache_folder)
 
 '''Input data from user'''
 lamb = [532, 530]                   # elastic wavelength to be analyzed (1064, 532 and 355 nm)    
@@ -50,21 +52,15 @@ fileinfo, subfolderinfo = mf.readfiles_meastype(datadir_name)
 for i in range(len(fileinfo)):
     preprocessedsignal=[]
     datafiles=[]
-    filenameheader=[]
-    preprocessedtime=[]
 
     for j in range(len(subfolderinfo)):
         datafiles.append(mf.readfiles_generic(os.path.join(fileinfo[i], subfolderinfo[j])))
         if subfolderinfo[j] == files_dir_to_read:
-            for filename in datafiles[j]:
-                preprocessedsignal.append(pd.read_csv(filename, sep = ',', skiprows=range(0, 10)))
-                filenameheader.append(mf.readdown_header(filename))
-                dfdict = pd.DataFrame(filenameheader)
-                
-    for k in range(len(preprocessedsignal)):
-        alt = pd.DataFrame(list(range(len(preprocessedsignal[k].index)))).mul(float(dfdict['vert_res'][k]))+float(dfdict['vert_res'][k])
-        alt.columns=['altitude']
-        preprocessedsignalmean=pd.concat(preprocessedsignal).groupby(level=0).mean()
+            datafiles[j], preprocessedsignal, channels, dfdict = pf.load_day(os.path.join(fileinfo[i], subfolderinfo[j]))
+            filenameheader = dfdict.to_dict('records')
+
+    alt = pf.day_altitude(dfdict, preprocessedsignal.shape[1])
+    preprocessedsignalmean = pf.day_mean_profile(preprocessedsignal, channels)
 
 
 ''' Calling the glue function to gluing Analogic and Photocounting channels - glue.py file in lidar_retrievals folder'''
@@ -3,6 +3,8 @@ import logging
 from operator import itemgetter
 import itertools
 import collections
+import collections.abc
+from concurrent.futures import ThreadPoolExecutor
 
 import matplotlib as mpl
 import netCDF4 as netcdf
@@ -20,7 +22,7 @@ class BaseLidarMeasurement(object):
     This class represents a general measurement object, independent of the input files.
     
     Each subclass should implement the following:
-    * the _import_file method;
+    * the _import_file method (and optionally _read_file and _add_file, to import files in parallel);
     * set the "extra_netcdf_parameters" variable to a dictionary that includes the appropriate parameters;
     
     You can override the set_PT method to define a custom procedure to get ground temperature and pressure.   
@@ -29,7 +31,7 @@ class BaseLidarMeasurement(object):
     """
     #extra_netcdf_parameters = None
 
-    def __init__(self, file_list=None):
+    def __init__(self, file_list=None, dtype=np.float64, workers=1):
         """
         This is run when creating a new object.
         
@@ -37,6 +39,11 @@ class BaseLidarMeasurement(object):
         ----------
         file_list : list or str
            A list of the full paths to the input file(s).
+        dtype : numpy dtype
+           Data type of the channel matrices (e.g. np.float32 to halve the memory of long measurements).
+        workers : int
+           Number of threads reading the files. With more than one, the files are read in parallel
+           and added to the channels in the order of the file list.
         """
         self.info = {}
         self.dimensions = {}
@@ -45,6 +52,9 @@ class BaseLidarMeasurement(object):
         self.attributes = {}
         self.files = []
         self.dark_measurement = None
+        self.dtype = dtype
+        self.workers = workers
+        self.profiles_to_import = 0  # Number of profiles the channel matrices are preallocated for
 
         if file_list:
             self._import_files(file_list)
@@ -52,14 +62,34 @@ class BaseLidarMeasurement(object):
     def _import_files(self, file_list):
         """
         Imports a list of files, and updates the object parameters.
+
+        The files are counted first, so that the channels created while importing preallocate
+        their matrices for all the profiles and fill them in place. Files already imported are skipped.
         
         Parameters
         ----------
         file_list : list
            A list of the full paths to the input file. 
         """
-        for f in file_list:
-            self._import_file(f)
+        imported = set(self.files)
+        new_files = []
+        for filename in file_list:
+            if filename in imported:
+                logger.warning("File has been imported already: %s" % filename)
+            else:
+                imported.add(filename)
+                new_files.append(filename)
+
+        self.profiles_to_import = len(new_files)
+
+        if self.workers > 1:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                # map returns the files in the input order
+                for current_file in executor.map(self._read_file, new_files):
+                    self._add_file(current_file)
+        else:
+            for f in new_files:
+                self._import_file(f)
         self.update()
 
     def _import_file(self, filename):
@@ -75,6 +105,36 @@ class BaseLidarMeasurement(object):
         """
         raise NotImplementedError('Importing files should be defined in the instrument-specific subclass.')
 
+    def _read_file(self, filename):
+        """
+        Reads a single lidar file, without changing the measurement object.
+
+        It is run in the worker threads when importing files in parallel, and should be
+        overwritten together with _add_file.
+
+        Parameters
+        ----------
+        filename : str
+           Path to the lidar file.
+
+        Returns
+        -------
+        file : object
+           The file object passed to _add_file.
+        """
+        raise NotImplementedError('Parallel import is not defined for this subclass.')
+
+    def _add_file(self, current_file):
+        """
+        Adds a file read by _read_file to the channels of the measurement.
+
+        Parameters
+        ----------
+        current_file : object
+           The file object returned by _read_file.
+        """
+        raise NotImplementedError('Parallel import is not defined for this subclass.')
+
     def update(self):
         """
         Update the info dictionary, variables, and dimensions of the measurement object
@@ -338,15 +398,29 @@ class BaseLidarMeasurement(object):
 
         self.info['Measurement_ID'] = measurement_id
 
-    def save_as_SCC_netcdf(self, filename=None):
+    def save_as_SCC_netcdf(self, filename=None, chunksizes=None, complevel=4, shuffle=True, data_type='d'):
         """Saves the measurement in the netCDF format as required by the SCC.
         
         If no filename is provided <measurement_id>.nc will be used. 
+
+        The storage of the signals (Raw_Lidar_Data and Background_Profile) can be tuned with the
+        last arguments. The defaults give the same file as before.
         
         Parameters
         ----------
         filename : str
            Output file name. If None, <measurement_id>.nc will be used. 
+        chunksizes : tuple or None
+           Chunk shape (time, channels, points) of the signals, a None element meaning the whole
+           dimension, e.g. (1, 1, None) for one chunk per profile. If None, the netCDF library default.
+        complevel : int
+           zlib compression level, 0 for no compression.
+        shuffle : bool
+           If True, the shuffle filter is applied before compression.
+        data_type : str
+           'd' (float64, as required by the SCC), 'f' (float32) or 'i' (int32 packed with the
+           scale_factor and add_offset attributes). The last two are for readers that accept
+           them; the packed values are rounded to (max - min) / 2 ** 32 of each variable.
         """
         parameters = self.extra_netcdf_parameters
 
@@ -522,12 +596,11 @@ class BaseLidarMeasurement(object):
                     pass  # Laser shots already in variables, so all good.
 
             # Raw lidar data
-            temp_v = f.createVariable('Raw_Lidar_Data', 'd', ('time', 'channels', 'points'), zlib=True)
-            for (channel, n) in zip(channel_names, list(range(len(channel_names)))):
-                c = self.channels[channel]
-                temp_v[:len(c.time), n, :c.points] = c.matrix
+            self._write_signals(f, 'Raw_Lidar_Data', ('time', 'channels', 'points'),
+                                [self.channels[channel] for channel in channel_names],
+                                chunksizes, complevel, shuffle, data_type)
 
-            self.add_dark_measurements_to_netcdf(f, channel_names)
+            self.add_dark_measurements_to_netcdf(f, channel_names, chunksizes, complevel, shuffle, data_type)
 
             # Pressure at lidar station
             temp_v = f.createVariable('Pressure_at_Lidar_Station', 'd')
@@ -577,7 +650,8 @@ class BaseLidarMeasurement(object):
 
         return provided_variables
 
-    def add_dark_measurements_to_netcdf(self, f, channels):
+    def add_dark_measurements_to_netcdf(self, f, channels, chunksizes=None, complevel=4, shuffle=True,
+                                        data_type='d'):
         """
         Adds dark measurement variables and properties to an open netCDF file.
         
@@ -587,6 +661,8 @@ class BaseLidarMeasurement(object):
            A netCDF Dataset, open for writing.
         channels : list
            A list of channels names to consider when adding dark measurements.
+        chunksizes, complevel, shuffle, data_type :
+           Storage of the Background_Profile variable, as in save_as_SCC_netcdf.
         """
         # Get dark measurements. If it is not given in self.dark_measurement
         # try to get it using the get_dark_measurements method. If none is found
@@ -607,10 +683,9 @@ class BaseLidarMeasurement(object):
         f.createDimension('time_bck', max_number_of_profiles)
 
         # Save the dark measurement data
-        temp_v = f.createVariable('Background_Profile', 'd', ('time_bck', 'channels', 'points'), zlib=True)
-        for (channel, n) in zip(channels, list(range(len(channels)))):
-            c = dark_measurement.channels[channel]
-            temp_v[:len(c.time), n, :c.points] = c.matrix
+        self._write_signals(f, 'Background_Profile', ('time_bck', 'channels', 'points'),
+                            [dark_measurement.channels[channel] for channel in channels],
+                            chunksizes, complevel, shuffle, data_type)
 
         # Dark profile start/stop time
         temp_raw_start = f.createVariable('Raw_Bck_Start_Time', 'i', ('time_bck', 'nb_of_time_scales'))
@@ -626,6 +701,53 @@ class BaseLidarMeasurement(object):
         f.RawBck_Start_Time_UT = dark_measurement.info['start_time'].strftime('%H%M%S')
         f.RawBck_Stop_Time_UT = dark_measurement.info['stop_time'].strftime('%H%M%S')
 
+    @staticmethod
+    def _write_signals(f, name, dimensions, channels, chunksizes, complevel, shuffle, data_type):
+        """
+        Writes the matrices of the channels as a (time, channels, points) variable, in one assignment.
+
+        Channels with less profiles or points than the dimensions are padded with the fill value.
+
+        Parameters
+        ----------
+        f : netcdf Dataset
+           A netCDF Dataset, open for writing.
+        name : str
+           Variable name.
+        dimensions : tuple
+           Dimension names of the variable.
+        channels : list
+           The channel objects, in the order of the channels dimension.
+        chunksizes, complevel, shuffle, data_type :
+           Storage of the variable, as in save_as_SCC_netcdf.
+        """
+        shape = (max(len(c.time) for c in channels), len(channels), f.dimensions[dimensions[2]].size)
+
+        if all(c.matrix.shape == (shape[0], shape[2]) for c in channels):
+            values = np.stack([c.matrix for c in channels], axis=1)
+        else:
+            values = np.ma.masked_all(shape)
+            for n, c in enumerate(channels):
+                values[:len(c.time), n, :c.points] = c.matrix
+
+        if chunksizes is not None:
+            chunksizes = [size if size else length for size, length in zip(chunksizes, shape)]
+
+        if data_type == 'i':
+            temp_v = f.createVariable(name, 'i4', dimensions, zlib=complevel > 0, complevel=complevel,
+                                      shuffle=shuffle, chunksizes=chunksizes)
+            # Pack the values range in the int32 range, without the fill value
+            v_min, v_max = np.min(values), np.max(values)
+            temp_v.add_offset = (v_max + v_min) / 2.
+            temp_v.scale_factor = (v_max - v_min) / (2. ** 32 - 4) if v_max > v_min else 1.
+        elif data_type in ('d', 'f'):
+            temp_v = f.createVariable(name, data_type, dimensions, zlib=complevel > 0, complevel=complevel,
+                                      shuffle=shuffle, chunksizes=chunksizes)
+        else:
+            raise ValueError('Unknown data type %s, use "d", "f" or "i".' % data_type)
+
+        temp_v[:shape[0]] = values
+
     def save_netcdf_extra(self, f):
         """ Save extra netCDF parameters to an open netCDF file. 
         
@@ -659,6 +781,92 @@ class BaseLidarMeasurement(object):
         return []
 
 
+class ProfileData(collections.abc.MutableMapping):
+    """
+    The profiles of a channel, stored as the rows of a contiguous (time x bins) matrix.
+
+    The matrix is preallocated for the expected number of profiles and filled in place as the files
+    are imported (it grows if more profiles arrive). The dict interface (time: profile) of the old
+    channel data is kept for compatibility: the profiles are views of the matrix rows, and assigning
+    a profile writes it in its row.
+    """
+
+    def __init__(self, n_profiles=0, dtype=np.float64):
+        """
+        Parameters
+        ----------
+        n_profiles : int
+           Expected number of profiles.
+        dtype : numpy dtype
+           Data type of the matrix.
+        """
+        self.n_profiles = n_profiles
+        self.dtype = dtype
+        self._matrix = None
+        self._rows = {}  # time: row index
+        self._sorted = True  # Rows in time order
+        self._latest = None  # Latest time
+
+    @classmethod
+    def from_matrix(cls, time, matrix):
+        """ Profile data using a (time x bins) matrix with the profiles of the given times (no copy). """
+        data = cls(len(time), matrix.dtype)
+        data._matrix = matrix
+        data._rows = dict((t, n) for n, t in enumerate(time))
+        data._sorted = all(t1 < t2 for t1, t2 in zip(time[:-1], time[1:]))
+        data._latest = max(time) if len(time) else None
+        return data
+
+    def __getitem__(self, time):
+        return self._matrix[self._rows[time]]
+
+    def __setitem__(self, time, profile):
+        if time not in self._rows:
+            count = len(self._rows)
+            if self._matrix is None:
+                self._matrix = np.empty((max(self.n_profiles, 1), len(profile)), dtype=self.dtype)
+            elif count == len(self._matrix):
+                self._matrix = np.resize(self._matrix, (2 * count, self._matrix.shape[1]))
+            if self._latest is not None and time < self._latest:
+                self._sorted = False
+            else:
+                self._latest = time
+            self._rows[time] = count
+        self._matrix[self._rows[time]] = profile
+
+    def __delitem__(self, time):
+        row = self._rows.pop(time)
+        count = len(self._rows)
+        self._matrix[row:count] = self._matrix[row + 1:count + 1]
+        for t, n in self._rows.items():
+            if n > row:
+                self._rows[t] = n - 1
+
+    def __iter__(self):
+        return iter(self._rows)
+
+    def __len__(self):
+        return len(self._rows)
+
+    def _sort(self):
+        """ Put the rows in time order, in place. """
+        time = sorted(self._rows)
+        order = [self._rows[t] for t in time]
+        self._matrix[:len(order)] = self._matrix[order]
+        self._rows = dict((t, n) for n, t in enumerate(time))
+        self._sorted = True
+
+    def time(self):
+        """ Sorted profile times. """
+        return tuple(sorted(self._rows))
+
+    def matrix(self):
+        """ The (time x bins) matrix of the profiles in time order, a view of the stored data. """
+        if not self._sorted:
+            self._sort()
+        return self._matrix[:len(self._rows)]
+
+
 class LidarChannel(object):
     """ 
     This class represents a general measurement channel, independent of the input files.
@@ -683,7 +891,7 @@ class LidarChannel(object):
         self.wavelength = channel_parameters['name']
         self.name = str(self.wavelength)
         self.binwidth = float(channel_parameters['binwidth'])  # in microseconds
-        self.data = {}
+        self.data = ProfileData()
         self.resolution = self.binwidth * c / 2
         self.z = np.arange(
             len(channel_parameters['data'])) * self.resolution + self.resolution / 2.0  # Change: add half bin in the z
@@ -763,11 +971,16 @@ class LidarChannel(object):
         """
         Update the time parameters and data according to the raw input data. 
         """
-        self.start_time = min(self.data.keys())
-        self.stop_time = max(self.data.keys()) + datetime.timedelta(seconds=self.duration[-1])
-        self.time = tuple(sorted(self.data.keys()))
-        sorted_data = sorted(iter(self.data.items()), key=itemgetter(0))
-        self.matrix = np.array(list(map(itemgetter(1), sorted_data)))
+        if isinstance(self.data, ProfileData):
+            # The matrix is already stored, only (in the rare case of unordered files) sorted in place
+            self.time = self.data.time()
+            self.matrix = self.data.matrix()
+        else:
+            self.time = tuple(sorted(self.data.keys()))
+            sorted_data = sorted(iter(self.data.items()), key=itemgetter(0))
+            self.matrix = np.array(list(map(itemgetter(1), sorted_data)))
+        self.start_time = self.time[0]
+        self.stop_time = self.time[-1] + datetime.timedelta(seconds=self.duration[-1])
 
     def _nearest_datetime(self, input_time):
         """
@@ -823,7 +1036,7 @@ class LidarChannel(object):
         condition = (time_array >= start_time) & (time_array <= stop_time)
 
         subset_time = time_array[condition]
-        subset_data = dict([(c_time, self.data[c_time]) for c_time in subset_time])
+        subset_data = ProfileData.from_matrix(tuple(subset_time), self.matrix[condition])
 
         # Create a list with the values needed by channel's __init__()
         parameter_values = {'name': self.wavelength,
@@ -860,10 +1073,7 @@ class LidarChannel(object):
            A new channel object
         """
 
-        subset_data = {}
-
-        for ctime, cdata in self.data.items():
-            subset_data[ctime] = cdata[b_min:b_max]
+        subset_data = ProfileData.from_matrix(self.time, self.matrix[:, b_min:b_max].copy())
 
         # Create a list with the values needed by channel's __init__()
         parameters_values = {'name': self.wavelength,
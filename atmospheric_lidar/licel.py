@@ -7,8 +7,9 @@ import collections
 import numpy as np
 import pytz
 
-from generic import BaseLidarMeasurement, LidarChannel
+from generic import BaseLidarMeasurement, LidarChannel, ProfileData
 from diva import DivaConverterMixin
+import licel_mmap
 
 logger = logging.getLogger(__name__)
 
@@ -41,6 +42,8 @@ class LicelChannelData:
         self.duration = duration
         self.use_id_as_name = use_id_as_name
         self.channel_name_input = channel_name
+        self._data = None
+        self._z = None
         self._assign_properties()
 
     def _assign_properties(self):
@@ -55,6 +58,7 @@ class LicelChannelData:
         self.laser_used = int(self.raw_info['laser_used'])
         self.number_of_shots = int(self.raw_info['number_of_shots'])
         self.wavelength_str = self.raw_info['wavelength']
+        self.dz = self.bin_width
 
         self.address = int(self.id[-1:], base=16)
 
@@ -132,6 +136,8 @@ class LicelChannelData:
         * In case of photon counting signals, data are stored as number of photons.
 
         In addition, some ancillary variables are also calculated (z, dz, number_of_bins).
+
+        This is done on the first access to data or z.
         """
 
         norm = self.raw_data / float(self.number_of_shots)
@@ -153,10 +159,32 @@ class LicelChannelData:
             channel_data = norm * self.number_of_shots
 
         # Calculate Z
-        self.z = np.array([dz * bin_number + dz / 2.0 for bin_number in range(self.data_points)])
+        self.z = np.arange(self.data_points) * dz + dz / 2.0
         self.dz = dz
         self.data = channel_data
 
+    @property
+    def data(self):
+        """ Physical data, calculated on first access. """
+        if self._data is None:
+            self.calculate_physical()
+        return self._data
+
+    @data.setter
+    def data(self, value):
+        self._data = value
+
+    @property
+    def z(self):
+        """ Bin center distances, calculated on first access. """
+        if self._z is None:
+            self.calculate_physical()
+        return self._z
+
+    @z.setter
+    def z(self, value):
+        self._z = value
+
     @property
     def is_analog(self):
         return self.analog_photon == '0'
@@ -181,7 +209,8 @@ class LicelFile(object):
     # If True, it corrects the old Raymetrics convention of zenith angle definition (zenith = -90 degrees)
     fix_zenith_angle = False
 
-    def __init__(self, file_path, use_id_as_name=False, get_name_by_order=False, licel_timezone="UTC", import_now=True):
+    def __init__(self, file_path, use_id_as_name=False, get_name_by_order=False, licel_timezone="UTC", import_now=True,
+                 channels=None):
         """
         This is run when creating a new object.
 
@@ -202,6 +231,9 @@ class LicelFile(object):
            If True, the header and data are read immediately. If not, the user has to call the
            corresponding methods directly. This is used to speed up reading files when only
            header information are required.
+        channels : list or None
+           Names of the channels (and photodiodes) to import, as given by the naming options above.
+           The records of the other channels are not read. If None, all channels are imported.
         """
         self.file_path = file_path
         self.file_name = os.path.basename(file_path)
@@ -211,6 +243,7 @@ class LicelFile(object):
         self.start_time = None
         self.stop_time = None
         self.licel_timezone = licel_timezone
+        self.channels_to_import = channels
 
         self.header_lines = []  # Store raw header lines, to be used in save_as_txt
 
@@ -221,35 +254,38 @@ class LicelFile(object):
 
     def import_file(self):
         """ Read the header info and data of the Licel file.
+
+        Only the records of the selected channels are read, and their physical values are
+        calculated when first accessed.
         """
         channels = collections.OrderedDict()
         photodiodes = collections.OrderedDict()
 
-        with open(self.file_path, 'rb') as f:
-
+        # The file is mapped once, and only the records of the imported channels are copied out of it
+        with licel_mmap.map_file(self.file_path) as f:
             self.read_header(f)
 
             # Check the complete header is read
             f.readline()
 
-            # Import the data
-            for channel_no, current_channel_info in enumerate(self.channel_info):
-                raw_data = np.fromfile(f, 'i4', int(current_channel_info['number_of_datapoints']))
-                a = np.fromfile(f, 'b', 1)
-                b = np.fromfile(f, 'b', 1)
-
-                if (a[0] != 13) | (b[0] != 10):
-                    logger.warning("No end of line found after record. File could be corrupt: %s" % self.file_path)
-                    logger.warning('a: {0}, b: {1}.'.format(a, b))
+            n_points = [int(current_channel_info['number_of_datapoints']) for current_channel_info in self.channel_info]
+            offsets = licel_mmap.record_offsets(f.tell(), n_points)
+            selected = []
 
+            for channel_no, current_channel_info in enumerate(self.channel_info):
                 if self.get_name_by_order:
                     channel_name = channel_no
                 else:
                     channel_name = None
 
-                channel = self.channel_data_class(current_channel_info, raw_data, self.duration(),
+                # The raw data are assigned below, once the imported channels are known
+                channel = self.channel_data_class(current_channel_info, None, self.duration(),
                                                   use_id_as_name=self.use_id_as_name, channel_name=channel_name)
 
+                if (self.channels_to_import is not None) and (channel.channel_name not in self.channels_to_import):
+                    continue
+                selected.append((channel_no, channel))
+
                 # Assign the channel either as normal channel or photodiode
                 if channel.is_photodiode:
                     if channel.channel_name in photodiodes.keys():
@@ -262,11 +298,28 @@ class LicelFile(object):
                         raise IOError('Trying to import two channels with the same name')
                     channels[channel.channel_name] = channel
 
+            # Import the data
+            selected_no = [channel_no for channel_no, _ in selected]
+            selected_offsets = offsets[selected_no]
+            selected_points = np.asarray(n_points)[selected_no]
+            raw_records = licel_mmap.records(f, selected_offsets, selected_points)
+            for (_, channel), raw_data in zip(selected, raw_records):
+                channel.raw_data = raw_data
+
+            separators = licel_mmap.separators(f, selected_offsets, selected_points)
+
+        for channel_no in np.flatnonzero(~licel_mmap.valid_separators(separators)):
+            logger.warning("No end of line found after record. File could be corrupt: %s" % self.file_path)
+            logger.warning('a: {0}, b: {1}.'.format(*separators[channel_no]))
+
+        if self.channels_to_import is not None:
+            missing = set(self.channels_to_import) - set(channels) - set(photodiodes)
+            if missing:
+                logger.warning("Channels not found in file %s: %s" % (self.file_path, ', '.join(map(str, missing))))
+
         self.channels = channels
         self.photodiodes = photodiodes
 
-        self._calculate_physical()
-
     def read_header(self, f):
         """ Read the header of an open Licel file.
 
@@ -497,7 +550,15 @@ class LicelFile(object):
 
 class LicelChannel(LidarChannel):
 
-    def __init__(self):
+    def __init__(self, n_profiles=0, dtype=np.float64):
+        """
+        Parameters
+        ----------
+        n_profiles : int
+           Expected number of profiles, used to preallocate the channel matrix.
+        dtype : numpy dtype
+           Data type of the channel matrix.
+        """
         self.name = None
         self.resolution = None
         self.points = None
@@ -510,7 +571,7 @@ class LicelChannel(LidarChannel):
         self.duration = []
         self.discriminator = []
         self.hv = []
-        self.data = {}
+        self.data = ProfileData(n_profiles, dtype)
 
     def append_file(self, current_file, file_channel):
         """ Append file to the current object """
@@ -572,6 +633,10 @@ class LicelChannel(LidarChannel):
 
 class PhotodiodeChannel(LicelChannel):
 
+    def __init__(self, n_profiles=0, dtype=np.float64):
+        super(PhotodiodeChannel, self).__init__(n_profiles, dtype)
+        self.data = {}  # The number of points is not constant, so the profiles are kept separately
+
     def _assign_properties(self, current_channel, file_channel):
         """ In contrast with normal channels, don't check for constant points."""
         self._assign_unique_property('name', file_channel.channel_name)
@@ -589,7 +654,22 @@ class LicelLidarMeasurement(BaseLidarMeasurement):
     channel_class = LicelChannel
     photodiode_class = PhotodiodeChannel
 
-    def __init__(self, file_list=None, use_id_as_name=False, get_name_by_order=False, licel_timezone='UTC'):
+    def __init__(self, file_list=None, use_id_as_name=False, get_name_by_order=False, licel_timezone='UTC',
+                 dtype=np.float64, channels=None, workers=1):
+        """
+        Parameters
+        ----------
+        file_list : list or str
+           A list of the full paths to the input file(s).
+        use_id_as_name, get_name_by_order, licel_timezone :
+           Channel naming and timezone options, as in LicelFile.
+        dtype : numpy dtype
+           Data type of the channel matrices.
+        channels : list or None
+           Names of the channels to import. If None, all channels are imported.
+        workers : int
+           Number of threads reading the files.
+        """
         self.raw_info = {}  # Keep the raw info from the files
         self.durations = {}  # Keep the duration of the files
         self.laser_shots = []
@@ -597,39 +677,42 @@ class LicelLidarMeasurement(BaseLidarMeasurement):
         self.use_id_as_name = use_id_as_name
         self.get_name_by_order = get_name_by_order
         self.licel_timezone = licel_timezone
+        self.channels_to_import = channels
         self.photodiodes = collections.OrderedDict()
 
-        super(LicelLidarMeasurement, self).__init__(file_list)
+        super(LicelLidarMeasurement, self).__init__(file_list, dtype, workers)
 
     def _import_file(self, filename):
+        self._add_file(self._read_file(filename))
 
-        if filename in self.files:
-            logger.warning("File has been imported already: %s" % filename)
-        else:
-            logger.debug('Importing file {0}'.format(filename))
-            current_file = self.file_class(filename, use_id_as_name=self.use_id_as_name,
-                                           get_name_by_order=self.get_name_by_order,
-                                           licel_timezone=self.licel_timezone)
-            self.raw_info[current_file.file_path] = current_file.raw_info
-            self.durations[current_file.file_path] = current_file.duration()
+    def _read_file(self, filename):
+        logger.debug('Importing file {0}'.format(filename))
+        current_file = self.file_class(filename, use_id_as_name=self.use_id_as_name,
+                                       get_name_by_order=self.get_name_by_order,
+                                       licel_timezone=self.licel_timezone, channels=self.channels_to_import)
+        return current_file
+
+    def _add_file(self, current_file):
+        self.raw_info[current_file.file_path] = current_file.raw_info
+        self.durations[current_file.file_path] = current_file.duration()
 
-            file_laser_shots = []
+        file_laser_shots = []
 
-            self._create_or_append_channel(current_file)
+        self._create_or_append_channel(current_file)
 
-            self.laser_shots.append(file_laser_shots)
-            self.files.append(current_file.file_path)
+        self.laser_shots.append(file_laser_shots)
+        self.files.append(current_file.file_path)
 
     def _create_or_append_channel(self, current_file):
 
         for channel_name, channel in current_file.channels.items():
             if channel_name not in self.channels:
-                self.channels[channel_name] = self.channel_class()
+                self.channels[channel_name] = self.channel_class(self.profiles_to_import, self.dtype)
             self.channels[channel_name].append_file(current_file, channel)
 
         for photodiode_name, photodiode in current_file.photodiodes.items():
             if photodiode_name not in self.photodiodes:
-                self.photodiodes[photodiode_name] = self.photodiode_class()
+                self.photodiodes[photodiode_name] = self.photodiode_class(self.profiles_to_import, self.dtype)
             self.photodiodes[photodiode_name].append_file(current_file, photodiode)
 
     def append(self, other):
@@ -0,0 +1,118 @@
+"""
+Memory-mapped reading of Licel binary files.
+
+The file is mapped once and the header lines are read from the map. The data records are then
+copied out of the map as int32 arrays at their computed offsets, and the CR/LF separators after
+the records are checked all at once, so no read call is needed per record. The returned arrays
+do not refer to the map, so it can be closed as soon as the needed records are read.
+
+Copying each record is the intended trade-off. A record is a single contiguous copy of a few
+thousand int32 values, small next to the conversion to physical units that follows, while views
+into the map would keep it open for as long as the raw channel data is alive: an mmap cannot be
+closed while arrays still export its buffer (BufferError). With copies the map is closed before
+the data is used, in LicelFile.import_file and in rebind (functions/milgrau_function.py).
+"""
+
+import mmap
+
+import numpy as np
+
+END_OF_RECORD = (13, 10)  # CR/LF after each data record
+
+
+def map_file(file_path):
+    """Read-only memory map of a Licel file.
+
+    The header lines are read with the readline method of the map, and its tell method gives the
+    offset of the first data record once the header is read. The map should be closed by the
+    caller, e.g. using it in a with statement.
+
+    Parameters
+    ----------
+    file_path : str
+       The path to the Licel file.
+
+    Returns
+    -------
+    buffer : mmap.mmap
+       The memory map of the file. It stays valid after the file is closed.
+    """
+    with open(file_path, "rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def record_offsets(data_offset, n_points):
+    """Byte offsets of consecutive data records.
+
+    Parameters
+    ----------
+    data_offset : int
+       Offset of the first record, i.e. the end of the header.
+    n_points : list of int
+       Number of int32 values of each record.
+
+    Returns
+    -------
+    offsets : ndarray
+       Offset of each record.
+    """
+    record_size = 4 * np.asarray(n_points, dtype=np.int64) + len(END_OF_RECORD)
+    return data_offset + np.concatenate(([0], np.cumsum(record_size)[:-1]))
+
+
+def records(buffer, offsets, n_points):
+    """The data records, as int32 arrays.
+
+    Parameters
+    ----------
+    buffer : mmap.mmap
+       The memory map of the file.
+    offsets : array_like
+       Byte offset of each record.
+    n_points : list of int
+       Number of int32 values of each record.
+
+    Returns
+    -------
+    records : list of ndarray
+       One array per record, copied out of the map so it stays valid after the map is closed.
+    """
+    if len(offsets) and offsets[-1] + 4 * n_points[-1] > len(buffer):
+        raise IOError("File shorter than the records described in its header.")
+    return [
+        np.frombuffer(buffer, "i4", int(n), int(offset)).copy()
+        for offset, n in zip(offsets, n_points)
+    ]
+
+
+def separators(buffer, offsets, n_points):
+    """The two bytes after each data record, that should be CR/LF.
+
+    Parameters
+    ----------
+    buffer : mmap.mmap
+       The memory map of the file.
+    offsets : array_like
+       Byte offset of each record.
+    n_points : list of int
+       Number of int32 values of each record.
+
+    Returns
+    -------
+    separators : ndarray
+       Array of shape (records, 2) with the bytes after each record (-1 past the end of the file).
+    """
+    file_bytes = np.frombuffer(buffer, np.uint8)
+    ends = np.asarray(offsets, dtype=np.int64) + 4 * np.asarray(
+        n_points, dtype=np.int64
+    )
+    positions = ends[:, np.newaxis] + np.arange(len(END_OF_RECORD))
+    in_file = positions < len(file_bytes)
+    return np.where(
+        in_file, file_bytes[np.where(in_file, positions, 0)].astype(int), -1
+    )
+
+
+def valid_separators(separator_bytes):
+    """True for the records followed by CR/LF."""
+    return np.all(separator_bytes == END_OF_RECORD, axis=1)
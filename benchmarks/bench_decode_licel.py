@@ -0,0 +1,126 @@
+"""
+Benchmark of the Licel AN/PC decoding and dead-time correction of rebind
+(functions/milgrau_function.py).
+
+Compares, for the 6 AN/PC pairs x 4000 bins of a measurement file, the per-sample loop
+and Series.apply dead-time correction rebind used before with decode_licel_pair and
+deadtime_correction, and checks that both give the same values.
+
+Run from the repository root:
+    python benchmarks/bench_decode_licel.py
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from functions import milgrau_function as mf  # noqa: E402
+
+n_pairs = 6
+n_bins = 4000
+n_files = 20
+repeats = 3
+n_bit = [12, 16] * n_pairs
+norm = [500, 20] * n_pairs
+n_shots = [3001] * (2 * n_pairs)
+deadtime = [0.0, 0.004] * n_pairs
+
+
+def synthetic_file(seed):
+    """The int32 AN/PC blocks of one file, 2 * n_bins + 1 values per pair."""
+    rng = np.random.default_rng(seed)
+    return [
+        rng.integers(0, 2**24, 2 * n_bins + 1).astype(np.int32) for _ in range(n_pairs)
+    ]
+
+
+def decode_loop(blocks):
+    """The per-sample decoding and Series.apply dead-time correction of the old rebind."""
+    df = pd.DataFrame()
+    dfdeadtime = pd.DataFrame()
+    for ii, binarydata in enumerate(blocks):
+        an = []
+        for m in range(n_bins):
+            an.append(
+                (binarydata[m] / 2 ** n_bit[2 * ii]) * (norm[2 * ii] / n_shots[2 * ii])
+            )
+
+        pc = []
+        for m in range(n_bins, 2 * n_bins):
+            pc.append(
+                round(binarydata[m] / 2 ** n_bit[2 * ii + 1])
+                * (norm[2 * ii + 1] / n_shots[2 * ii + 1])
+            )
+
+        df[str(ii) + "AN"] = an
+        df[str(ii) + "PC"] = pc
+        dfdeadtime[str(ii) + "AN"] = df[str(ii) + "AN"].apply(
+            lambda x: x / (1 - x * deadtime[2 * ii])
+        )
+        dfdeadtime[str(ii) + "PC"] = df[str(ii) + "PC"].apply(
+            lambda x: x / (1 - x * deadtime[2 * ii + 1])
+        )
+    return df, dfdeadtime
+
+
+def decode_arrays(blocks):
+    """decode_licel_pair and deadtime_correction, as rebind uses them now."""
+    signal = {}
+    signaldeadtime = {}
+    for ii, binarydata in enumerate(blocks):
+        an, pc = mf.decode_licel_pair(
+            binarydata,
+            n_bins,
+            n_bit[2 * ii : 2 * ii + 2],
+            norm[2 * ii : 2 * ii + 2],
+            n_shots[2 * ii : 2 * ii + 2],
+        )
+        signal[str(ii) + "AN"] = an
+        signal[str(ii) + "PC"] = pc
+        signaldeadtime[str(ii) + "AN"] = mf.deadtime_correction(an, deadtime[2 * ii])
+        signaldeadtime[str(ii) + "PC"] = mf.deadtime_correction(
+            pc, deadtime[2 * ii + 1]
+        )
+    return pd.DataFrame(signal), pd.DataFrame(signaldeadtime)
+
+
+def best_time(function, files):
+    times = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        output = [function(blocks) for blocks in files]
+        times.append(time.perf_counter() - t0)
+    return min(times), output
+
+
+def main():
+    files = [synthetic_file(seed) for seed in range(n_files)]
+    print(
+        "%d files of %d AN/PC pairs x %d bins, best of %d runs"
+        % (n_files, n_pairs, n_bins, repeats)
+    )
+
+    t_old, old = best_time(decode_loop, files)
+    t_new, new = best_time(decode_arrays, files)
+    for (df_old, dfdeadtime_old), (df_new, dfdeadtime_new) in zip(old, new):
+        pd.testing.assert_frame_equal(df_old, df_new, check_exact=True)
+        pd.testing.assert_frame_equal(dfdeadtime_old, dfdeadtime_new, check_exact=True)
+
+    print(
+        "  per-sample loop  %8.1f files/s  (%8.1f ms/file)"
+        % (n_files / t_old, 1e3 * t_old / n_files)
+    )
+    print(
+        "  array decoding   %8.1f files/s  (%8.1f ms/file)"
+        % (n_files / t_new, 1e3 * t_new / n_files)
+    )
+    print("  speed-up         %8.1fx, identical values" % (t_old / t_new))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Benchmark of the sliding gluing checks (lidar_retrievals/fit_checks.py and glue.py).
+
+Compares, for window_length 50-150 over the 1800 bins between min_idx and max_idx used by LEBEAR and
+LIRABEAR, the per-window path (one linregress, corrcoef or Shapiro-Wilk call per window position, as
+before the cumulative-sum checks) with the current sliding checks, and the end-to-end glue_signals_1d
+with both normality tests.
+
+Run from the repository root:
+    python benchmarks/bench_sliding_gluing.py
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lidar_retrievals import fit_checks, glue  # noqa: E402
+
+n_bins = 2000
+min_idx = 200
+max_idx = 2000
+window_lengths = [50, 100, 150]
+repeats = 3
+
+
+def synthetic_pair(n_bins, seed=0):
+    """Analog and photon counting (with dead time) signals of the same profile."""
+    rng = np.random.default_rng(seed)
+    altitude = (np.arange(n_bins) + 1) * 7.5
+    profile = 5e9 * np.exp(-altitude / 8000.0) / altitude**2
+    analog = profile + 0.05 * rng.standard_normal(n_bins)
+    counts = 20 * profile
+    photon = counts / (1 + counts * 1e-5) + 0.5 * rng.standard_normal(n_bins)
+    return analog, photon
+
+
+def best_time(function, *args):
+    times = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        output = function(*args)
+        times.append(time.perf_counter() - t0)
+    return min(times), output
+
+
+def per_window_intercept_and_correlation(first_signal, second_signal, window_length):
+    values = fit_checks._apply_sliding_check(
+        fit_checks.check_linear_fit_intercept_and_correlation,
+        first_signal,
+        second_signal,
+        window_length,
+    )
+    return values[:, 0], values[:, 1]
+
+
+def per_window_correlation(first_signal, second_signal, window_length):
+    return fit_checks._apply_sliding_check(
+        fit_checks.check_correlation, first_signal, second_signal, window_length
+    )
+
+
+def per_window_shapiro(first_signal, second_signal, window_length):
+    return fit_checks._apply_sliding_check(
+        fit_checks.check_residuals_not_gaussian,
+        first_signal,
+        second_signal,
+        window_length,
+    )
+
+
+def vectorized_jarque_bera(first_signal, second_signal, window_length):
+    return fit_checks.sliding_check_residuals_not_gaussian_jarque_bera(
+        first_signal, second_signal, window_length
+    )
+
+
+def glue_1d(analog, photon, window_length, normality_test):
+    try:
+        return glue.glue_signals_1d(
+            analog,
+            photon,
+            window_length,
+            0.95,
+            0.5,
+            0.1,
+            0.5,
+            min_idx,
+            max_idx,
+            normality_test=normality_test,
+        )[1]
+    except RuntimeError:
+        return None
+
+
+def main():
+    analog, photon = synthetic_pair(n_bins)
+    lower, upper = analog[min_idx:max_idx], photon[min_idx:max_idx]
+    print("%d bins, best of %d runs, times in ms" % (len(lower), repeats))
+    for window_length in window_lengths:
+        # the sliding checks use an even window length, the per-window path is given the same one
+        window = window_length + window_length % 2
+        print("window_length %d" % window_length)
+
+        t_old, (intercept_old, correlation_old) = best_time(
+            per_window_intercept_and_correlation, lower, upper, window
+        )
+        t_new, (intercept_new, correlation_new) = best_time(
+            fit_checks.sliding_check_linear_fit_intercept_and_correlation,
+            lower,
+            upper,
+            window_length,
+        )
+        valid = slice(window // 2, window // 2 + len(correlation_old))
+        print(
+            "  intercept+correlation %8.1f -> %6.1f   max diff: correlation %.1e, intercept %% %.1e"
+            % (
+                1e3 * t_old,
+                1e3 * t_new,
+                np.max(np.abs(correlation_new[valid] - correlation_old)),
+                np.max(np.abs(intercept_new[valid] - intercept_old)),
+            )
+        )
+
+        t_old, _ = best_time(per_window_correlation, lower, upper, window)
+        t_new, _ = best_time(
+            fit_checks.sliding_check_correlation, lower, upper, window_length
+        )
+        print("  sliding correlation   %8.1f -> %6.1f" % (1e3 * t_old, 1e3 * t_new))
+
+        t_old, _ = best_time(per_window_shapiro, lower, upper, window)
+        t_new, _ = best_time(vectorized_jarque_bera, lower, upper, window_length)
+        print(
+            "  normality test        %8.1f -> %6.1f   (Shapiro-Wilk per window -> Jarque-Bera)"
+            % (1e3 * t_old, 1e3 * t_new)
+        )
+
+        t_old, idx_old = best_time(glue_1d, analog, photon, window_length, "shapiro")
+        t_new, idx_new = best_time(
+            glue_1d, analog, photon, window_length, "jarque_bera"
+        )
+        print(
+            "  glue_signals_1d       %8.1f -> %6.1f   gluing index %s -> %s"
+            % (1e3 * t_old, 1e3 * t_new, idx_old, idx_new)
+        )
+
+
+if __name__ == "__main__":
+    main()
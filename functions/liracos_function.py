@@ -13,14 +13,120 @@ from pathlib import Path
 import matplotlib as mpl
 import matplotlib.pyplot as plt
 import numpy as np
+import pandas as pd
 import seaborn as sns
-from matplotlib.ticker import MultipleLocator
+from matplotlib.ticker import FuncFormatter, MultipleLocator
 
 from .python_colormap import labview_colormap
 
 locale.setlocale(locale.LC_ALL, "en_US.UTF-8")
 
 
+def fill_time_gaps(rcslambda, shotnumber, laser_freq, step=60, fill_value=np.nan):
+    """Insert empty profiles in the measurement gaps of a RCS matrix (altitudes x times).
+
+    The columns of rcslambda are the profile start times. Where two consecutive profiles
+    are more than step + 1 seconds apart, the gap is filled with profiles every step
+    seconds, as many as the integration time (shotnumber - 1) / laser_freq of the profile
+    before the gap fits in it. shotnumber and laser_freq hold one value per profile.
+    Return the matrix reindexed in one step on the sorted time grid (DatetimeIndex
+    columns), the inserted profiles set to fill_value.
+    """
+    times = pd.to_datetime(rcslambda.columns, format="%Y-%m-%d %H:%M:%S")
+    integration = (
+        (np.asarray(shotnumber, dtype=float) - 1) / np.asarray(laser_freq, dtype=float)
+    ).astype(int)[:-1]
+    gap = np.floor(np.diff(times.asi8) / 1e9)
+    nfactor = np.where(gap > step + 1, gap // np.maximum(integration, 1), 0)
+    nmissing = np.maximum(nfactor - 1, 0).astype(int)
+
+    # Slot number of each missing profile inside its own gap: 1, 2, ..., nmissing
+    slot = np.arange(nmissing.sum()) - np.repeat(
+        np.cumsum(nmissing) - nmissing, nmissing
+    )
+    missing = np.repeat(times.asi8[:-1], nmissing) + (slot + 1) * step * 10**9
+
+    grid = np.concatenate([times.asi8, missing])
+    order = np.argsort(grid, kind="stable")
+    position = np.empty_like(order)
+    position[order] = np.arange(len(grid))
+    values = np.full((len(rcslambda.index), len(grid)), fill_value, dtype=float)
+    values[:, position[: len(times)]] = rcslambda.to_numpy(dtype=float)
+
+    return pd.DataFrame(
+        values, index=rcslambda.index, columns=pd.DatetimeIndex(grid[order])
+    )
+
+
+def meanrcs_figname(dfdict, fileinfo, rootdir_name, channelmode, maxscale_alt, version):
+    """Return the mean RCS figure name and the measurement period (nt/dt) of a day."""
+    measperiod = Path(os.path.relpath(fileinfo, rootdir_name)).parts[-1][-2:]
+    dateinname = datetime.strptime(
+        dfdict["starttime"][0], "%d/%m/%Y-%H:%M:%S"
+    ).strftime("%Y%m%d%H%M")
+    dateendname = datetime.strptime(
+        dfdict["starttime"].iloc[-1], "%d/%m/%Y-%H:%M:%S"
+    ).strftime("%Y%m%d%H%M")
+    meanrcsfigurename = "".join(
+        [
+            dateinname,
+            "_",
+            dateendname,
+            "_",
+            measperiod,
+            "_",
+            str(int(maxscale_alt / 1000)).zfill(2),
+            "km_",
+            dfdict["station"][0],
+            "_meanrcsfigure_",
+            channelmode,
+            "_",
+            version,
+            ".png",
+        ]
+    )
+
+    return meanrcsfigurename, measperiod
+
+
+def ql_figname(
+    dfdict, fileinfo, rootdir_name, lamb, qlchannelmode, maxscale_altql, version
+):
+    """Return the quicklook figure name of one wavelength and channel mode of a day."""
+    measperiod = Path(os.path.relpath(fileinfo, rootdir_name)).parts[-1][-2:]
+    dateinname = datetime.strptime(
+        dfdict["starttime"][0], "%d/%m/%Y-%H:%M:%S"
+    ).strftime("%Y_%m_%d_")
+    quicklook_figname = "".join(
+        [
+            dateinname,
+            measperiod,
+            "_",
+            str(int(maxscale_altql / 1000)).zfill(2),
+            "km_",
+            str(lamb),
+            "nm",
+            qlchannelmode,
+            "_",
+            dfdict["station"][0],
+            "_QL_",
+            version,
+            ".png",
+        ]
+    )
+
+    return quicklook_figname
+
+
+def figure_uptodate(figurepath, datafiles):
+    """Return True if the figure exists and is newer than all of its input data files."""
+    if not os.path.exists(figurepath):
+        return False
+    return os.path.getmtime(figurepath) > max(
+        os.path.getmtime(datafile) for datafile in datafiles
+    )
+
+
 def meanrcs(
     rcsignalmean,
     alt,
@@ -50,30 +156,8 @@ def meanrcs(
         + " UTC \n SPU Lidar Station - São Paulo"
     )
 
-    measperiod = Path(os.path.relpath(fileinfo, rootdir_name)).parts[-1][-2:]
-    dateinname = datetime.strptime(
-        dfdict["starttime"][0], "%d/%m/%Y-%H:%M:%S"
-    ).strftime("%Y%m%d%H%M")
-    dateendname = datetime.strptime(
-        dfdict["starttime"].iloc[-1], "%d/%m/%Y-%H:%M:%S"
-    ).strftime("%Y%m%d%H%M")
-    meanrcsfigurename = "".join(
-        [
-            dateinname,
-            "_",
-            dateendname,
-            "_",
-            measperiod,
-            "_",
-            str(int(maxscale_alt / 1000)).zfill(2),
-            "km_",
-            dfdict["station"][0],
-            "_meanrcsfigure_",
-            channelmode,
-            "_",
-            version,
-            ".png",
-        ]
+    meanrcsfigurename, measperiod = meanrcs_figname(
+        dfdict, fileinfo, rootdir_name, channelmode, maxscale_alt, version
     )
 
     levelinfo = Path(os.path.relpath(fileinfo, rootdir_name)).parts[0][-1]
@@ -191,6 +275,42 @@ def meanrcs(
     return meanrcsfigurename, measperiod
 
 
+def position_label(labels):
+    """Tick formatter function returning the label of the row/column at a tick position."""
+
+    def label(position, _):
+        index = int(round(position))
+        if index == position and 0 <= index < len(labels):
+            return labels[index]
+        return ""
+
+    return label
+
+
+def block_reduce(data, npixels, axis, reducer="mean"):
+    """Reduce data along axis in blocks of consecutive samples to about npixels values.
+
+    reducer is "mean" (each pixel shows the average of its samples) or "max" (keeps thin
+    layers such as clouds visible, but shows the noise peaks too). Data that already fits
+    in npixels is returned unchanged. Return the reduced array and the
+    number of samples of each block.
+    """
+    nsamples = data.shape[axis]
+    factor = max(1, nsamples // npixels)
+    if factor == 1:
+        return data, factor
+    blocks = np.arange(0, nsamples, factor)
+    if reducer == "max":
+        return np.fmax.reduceat(data, blocks, axis=axis), factor
+    elif reducer == "mean":
+        counts = np.diff(np.append(blocks, nsamples))
+        shape = [1] * data.ndim
+        shape[axis] = len(blocks)
+        return np.add.reduceat(data, blocks, axis=axis) / counts.reshape(shape), factor
+    else:
+        raise ValueError("Reducer %s not available, use mean or max" % reducer)
+
+
 def ql(
     new_rcslambda,
     alt,
@@ -203,7 +323,13 @@ def ql(
     rootdir_name,
     version,
     quicklook_graphics_dir,
+    reducer="mean",
 ):
+    """RCS quicklook of one wavelength and channel mode of a day.
+
+    new_rcslambda (altitudes x times) is cropped to maxscale_altql and block-reduced with
+    reducer ("mean" or "max") to the pixel grid of the plot before it is drawn as an image.
+    """
 
     #    if lamb == 355:
     #        colorfactor = 9e6
@@ -226,7 +352,8 @@ def ql(
     ##            colorfactor = 4e8
 
     ###daytime color configuration for PC channels
-    elif qlchannelmode == "PC":
+    ###AN and PC glued on the PC scale
+    elif qlchannelmode == "PC" or qlchannelmode == "GL":
         if lamb == 355:
             colorfactor = 2e8
         elif lamb == 532:
@@ -277,40 +404,38 @@ def ql(
         os.path.join(rootdir_name, "img", "Logo_InCite_blue_site.png")
     )
 
-    measperiod = Path(os.path.relpath(fileinfo, rootdir_name)).parts[-1][-2:]
-    dateinname = datetime.strptime(
-        dfdict["starttime"][0], "%d/%m/%Y-%H:%M:%S"
-    ).strftime("%Y_%m_%d_")
-    quicklook_figname = "".join(
-        [
-            dateinname,
-            measperiod,
-            "_",
-            str(int(maxscale_altql / 1000)).zfill(2),
-            "km_",
-            str(lamb),
-            "nm",
-            qlchannelmode,
-            "_",
-            dfdict["station"][0],
-            "_QL_",
-            version,
-            ".png",
-        ]
+    quicklook_figname = ql_figname(
+        dfdict, fileinfo, rootdir_name, lamb, qlchannelmode, maxscale_altql, version
     )
 
     fig = plt.figure(figsize=[14, 7])
     ax = fig.add_axes([0.11, 0.15, 0.78, 0.74])
-    pcmesh = ax.pcolormesh(
-        list(new_rcslambda.columns.values.astype(str)),
-        list(new_rcslambda.index.values.astype(str)),
-        new_rcslambda,
+    ymax = np.ceil(maxscale_altql / float(dfdict["vert_res"][0]))
+    altlabels = list(new_rcslambda.index.values.astype(str))
+    timelabels = list(new_rcslambda.columns.values.astype(str))
+
+    # Rows and columns are drawn at their position, as the categorical axes of pcolormesh did
+    rcsimage = new_rcslambda.to_numpy(dtype=float)[: int(ymax) + 1]
+    axwidth, axheight = ax.get_position().size * fig.get_size_inches() * fig.dpi
+    rcsimage, _ = block_reduce(rcsimage, int(axheight), 0, reducer)
+    rcsimage, _ = block_reduce(rcsimage, int(axwidth), 1, reducer)
+    pcmesh = ax.imshow(
+        rcsimage,
+        extent=(
+            -0.5,
+            len(timelabels) - 0.5,
+            -0.5,
+            min(len(altlabels), int(ymax) + 1) - 0.5,
+        ),
+        origin="lower",
+        aspect="auto",
+        interpolation="nearest",
         vmin=0e0,
         vmax=colorfactor,
         cmap=labview_colormap(),
-        rasterized=True,
-        shading="nearest",
     )
+    ax.xaxis.set_major_formatter(FuncFormatter(position_label(timelabels)))
+    ax.yaxis.set_major_formatter(FuncFormatter(position_label(altlabels)))
     ax.set_xlabel("Time UTC", fontsize=20, fontweight="bold")
     ax.set_ylabel("Height (m a.g.l.)", fontsize=20, fontweight="bold")
 
@@ -318,7 +443,7 @@ def ql(
     ax.yaxis.set_minor_locator(MultipleLocator(yminorfactor))
     ax.xaxis.set_major_locator(MultipleLocator(xmajorfactor))
     ax.xaxis.set_minor_locator(MultipleLocator(xminorfactor))
-    ax.set_ylim([1, np.ceil(maxscale_altql / float(dfdict["vert_res"][0]))])
+    ax.set_ylim([1, ymax])
     #    ax.set_ylim([np.ceil(15000/float(dfdict['vert_res'][0])), np.ceil(maxscale_altql/float(dfdict['vert_res'][0]))])
     # ax.set_xlim(xmin=0, xmax=new_rcslambda.shape[1] - 1)
     ax.tick_params(
@@ -6,11 +6,17 @@ Created on Fri Jun 18 07:02:05 2021
 
 import locale
 import os
+import re
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from pathlib import Path
 
 import numpy as np
 import pandas as pd
 
+from atmospheric_lidar import licel_mmap
+
 locale.setlocale(locale.LC_ALL, "en_US.UTF-8")
 
 
@@ -97,10 +103,168 @@ def readfiles_meastype(datadir_name):
     return pathdirname, datefoldertype
 
 
+licel_datetime_pattern = re.compile(r"\d{2}/\d{2}/\d{4} \d{2}:\d{2}:\d{2}")
+
+
+def readheader_licel(filepath):
+    """Return a dict with the main header fields of a Licel binary file.
+
+    Only the ASCII header lines are read (the binary data block is never touched), so the
+    function is cheap enough to be called over thousands of files.
+    """
+    with open(filepath, "rb") as f:
+        f.readline()
+        second_line = f.readline().decode("utf-8")
+        third_line = f.readline().decode("utf-8").split()
+        n_channels = int(third_line[4])
+        channel_lines = [
+            f.readline().decode("utf-8").split() for k in range(n_channels)
+        ]
+
+    start_time, stop_time = licel_datetime_pattern.findall(second_line)[0:2]
+    location = second_line[second_line.index(stop_time) + len(stop_time) :].split()
+
+    return {
+        "filepath": filepath,
+        "site": second_line[: second_line.index(start_time)].strip(),
+        "start_time": datetime.strptime(start_time, "%d/%m/%Y %H:%M:%S"),
+        "stop_time": datetime.strptime(stop_time, "%d/%m/%Y %H:%M:%S"),
+        "altitude": float(location[0]),
+        "long": float(location[1]),
+        "lat": float(location[2]),
+        "nshots": int(third_line[2]),
+        "laser_freq": int(third_line[1]),
+        "channels": n_channels,
+        "nbins": int(channel_lines[0][3]) if channel_lines else 0,
+    }
+
+
+def headerindex(filepaths, workers=8, index_path=None):
+    """Return a DataFrame with one row of header fields (see readheader_licel) per Licel file.
+
+    The headers are read with a thread pool, since the work is dominated by file opening.
+    Rows keep the order of filepaths. If index_path is given, the index is also saved
+    there as a Parquet file (requires pyarrow). It holds only file-level fields, for the
+    file selection of LIBIDS; rebind and the SCC conversion read the channel lines and data
+    of each file anyway, so they parse the full header themselves.
+    """
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        records = list(executor.map(readheader_licel, filepaths))
+
+    df_index = pd.DataFrame(
+        records,
+        columns=[
+            "filepath",
+            "site",
+            "start_time",
+            "stop_time",
+            "altitude",
+            "long",
+            "lat",
+            "nshots",
+            "laser_freq",
+            "channels",
+            "nbins",
+        ],
+    )
+    df_index["start_time"] = pd.to_datetime(df_index["start_time"])
+    df_index["stop_time"] = pd.to_datetime(df_index["stop_time"])
+
+    if index_path is not None:
+        df_index.to_parquet(index_path, index=False)
+
+    return df_index
+
+
+headercatalog_columns = [
+    "site",
+    "start_time",
+    "stop_time",
+    "altitude",
+    "long",
+    "lat",
+    "nshots",
+    "laser_freq",
+    "channels",
+    "nbins",
+]
+
+
+def headercatalog(filepaths, catalog_path, workers=8):
+    """Return the header index of filepaths, using a persistent SQLite catalog.
+
+    The catalog stores the readheader_licel fields keyed by absolute path, file size and
+    modification time. Only files that are new or whose size/mtime changed since the last
+    run are opened again; everything else is answered from the catalog. Rows of files that
+    no longer exist are removed. The returned DataFrame has the same columns and row order
+    as headerindex.
+    """
+    keys = [os.path.abspath(filepath) for filepath in filepaths]
+    stats = {key: os.stat(key) for key in keys}
+
+    with sqlite3.connect(catalog_path) as con:
+        con.execute(
+            "CREATE TABLE IF NOT EXISTS licel_header ("
+            "filepath TEXT PRIMARY KEY, size INTEGER, mtime REAL, site TEXT, "
+            "start_time TEXT, stop_time TEXT, altitude REAL, long REAL, lat REAL, "
+            "nshots INTEGER, laser_freq INTEGER, channels INTEGER, nbins INTEGER)"
+        )
+        cataloged = {
+            row[0]: (row[1], row[2])
+            for row in con.execute("SELECT filepath, size, mtime FROM licel_header")
+        }
+
+        stale = [
+            key
+            for key, stat in stats.items()
+            if cataloged.get(key) != (stat.st_size, stat.st_mtime)
+        ]
+        if stale:
+            df_stale = headerindex(stale, workers=workers)
+            df_stale["size"] = [stats[key].st_size for key in stale]
+            df_stale["mtime"] = [stats[key].st_mtime for key in stale]
+            df_stale["start_time"] = df_stale["start_time"].dt.strftime(
+                "%Y-%m-%d %H:%M:%S"
+            )
+            df_stale["stop_time"] = df_stale["stop_time"].dt.strftime(
+                "%Y-%m-%d %H:%M:%S"
+            )
+            con.executemany(
+                "INSERT OR REPLACE INTO licel_header VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                df_stale[["filepath", "size", "mtime"] + headercatalog_columns]
+                .astype(object)
+                .itertuples(index=False, name=None),
+            )
+
+        # Files moved or deleted since they were cataloged (e.g. organized by LIBIDS)
+        removed = [
+            key for key in cataloged if key not in stats and not os.path.exists(key)
+        ]
+        con.executemany(
+            "DELETE FROM licel_header WHERE filepath = ?", [(key,) for key in removed]
+        )
+
+        df_catalog = pd.read_sql_query(
+            "SELECT filepath, "
+            + ", ".join(headercatalog_columns)
+            + " FROM licel_header",
+            con,
+        ).set_index("filepath")
+    con.close()
+
+    df_index = df_catalog.reindex(keys).reset_index(drop=True)
+    df_index.insert(0, "filepath", list(filepaths))
+    df_index["start_time"] = pd.to_datetime(df_index["start_time"])
+    df_index["stop_time"] = pd.to_datetime(df_index["stop_time"])
+
+    return df_index
+
+
 def folder_creation(csvfiledir):
+    # exist_ok: measurement days processed in parallel may create the same parent folders
     if not os.path.exists(csvfiledir):
         try:
-            os.makedirs(csvfiledir)
+            os.makedirs(csvfiledir, exist_ok=True)
         except OSError:
             print(
                 "Creation of the CSV file directory % s failed"
@@ -113,35 +277,16 @@ def folder_creation(csvfiledir):
             )
 
 
-def writedown_header(
-    filepath_towrite,
-    line1,
-    line2,
-    line3,
-    line4,
-    line5,
-    line6,
-    line7,
-    line8,
-    line9,
-    line10,
-):
-    ff = open(filepath_towrite, "r")
-    lines = ff.readlines()
-    ff = open(filepath_towrite, "w")
-    ff.write(line1)
-    ff.write(line2)
-    ff.write(line3)
-    ff.write(line4)
-    ff.write(line5)
-    ff.write(line6)
-    ff.write(line7)
-    ff.write(line8)
-    ff.write(line9)
-    ff.write(line10)
-    ff = open(filepath_towrite, "a")
-    ff.writelines(lines)
-    ff.close()
+def writedown_header(ff, header):
+    """Write the header dictionary as "key value" lines to an open text file."""
+    ff.writelines([key + " " + str(value) + "\n" for key, value in header.items()])
+
+
+def writedown_csv(filepath_towrite, dataframe, header):
+    """Write a header-prefixed csv file (header lines, then the data) in a single pass."""
+    with open(filepath_towrite, "w", newline="") as ff:
+        writedown_header(ff, header)
+        dataframe.to_csv(ff, index=False, float_format="%.4f")
 
 
 def readdown_header(filepath):
@@ -159,94 +304,134 @@ def readdown_header(filepath):
     return rows_list
 
 
+def decode_licel_pair(binarydata, n_bins, n_bit, norm, n_shots):
+    """Convert one AN/PC block of Licel int32 counts to physical units in a single array step.
+
+    binarydata holds the AN samples followed by the PC samples of the same wavelength;
+    n_bit, norm and n_shots are the (AN, PC) values read from the channel header lines.
+    """
+    binarydata = np.asarray(binarydata, dtype=np.float64)
+    an = (binarydata[0:n_bins] / 2 ** n_bit[0]) * (norm[0] / n_shots[0])
+    pc = np.round(binarydata[n_bins : 2 * n_bins] / 2 ** n_bit[1]) * (
+        norm[1] / n_shots[1]
+    )
+    return an, pc
+
+
+def deadtime_correction(signal, deadtime):
+    """Apply the non-paralyzable dead-time correction to a whole signal array."""
+    return signal / (1 - signal * deadtime)
+
+
 def rebind(
-    rawdata, deadtime, rootdir_name, datadir_name, files_dir_level0, files_dir_level1
+    rawdata,
+    deadtime,
+    rootdir_name,
+    datadir_name,
+    files_dir_level0,
+    files_dir_level1,
+    product_format="csv",
 ):
-    """Save Level 0 database - raw signal as csv format with no pre-corrections.
+    """Save Level 0 database - raw signal with no pre-corrections, in the product_format given
+    (see product_function: 'csv' or 'netcdf').
     Return the mean dark-current file and the measurements files with dead-time correction applied.
     """
+    # product_function uses the csv helpers of this module, import it here to avoid a cycle
+    from functions import product_function as pf
+
     starttimeaux = []
     stoptimeaux = []
     filenameaux = []
     rawdatafiles = []
     csv_files_pathaux = []
+    level0files = []
+    level0headers = []
     meandc_df = pd.DataFrame()
 
     """Reading binary data and its header"""
     for j in range(len(rawdata)):
-        f = open(rawdata[j], "rb")
-        line = f.readline().decode("utf-8")  # noqa: F841
-        aux = []
-        """14 is the line number in the header of licel binary data"""
-        """ If measurement is from January 23 2022 the number should be 12 """
-        for ix in range(14):
-            aux.append(f.readline().decode("utf-8"))
-
-        """Reading binary data heads (2nd line) to select number of shots, start and stop time of measurements"""
-        start_time = aux[0][10:20] + "-" + aux[0][21:29]
-        stop_time = aux[0][30:40] + "-" + aux[0][41:49]
-        alt_station = aux[0][51:54]
-        site = aux[0][1:4]
-        if site == "Sao":
-            site = site + "_Paulo"
-        lat = aux[0][62:63] + aux[0][64:68]
-        long = aux[0][55:56] + aux[0][57:61]
-        laser_freq = aux[1][10:13]
-        n_channel = int(aux[1][27:29])
-        n_bit = []
-        norm = []
-        channel = []
-        n_bins = []
-        n_shots = []
-        n_pcfactor = []
-        n_resolution = []
-        flag_channel = []
-
-        for k in range(2, n_channel + 2):
-            if aux[k][3] == "0":
-                flag_channel.append(int(aux[k][3]))
-                n_bit.append(int(aux[k][44:46]))
-                norm.append(int(float(aux[k][54:59]) * 1e3))
-            else:
-                flag_channel.append("1")
-                n_bit.append(16)
-                norm.append(20)
-
-            channel.append(str(int(aux[k][25:30])))
-            n_bins.append(int(aux[k][7:12]))
-            n_shots.append(int(aux[k][47:53]))
-            n_resolution.append(float(aux[k][20:23]))
-            n_pcfactor.append(2 * (int(aux[k][7:12])) + 1)
-
-        df = pd.DataFrame()
-        dfdeadtime = pd.DataFrame()
-        f.readline().decode("utf-8")
-
-        for ii in range(int(n_channel / 2)):
-            binarydata = np.fromfile(f, np.int32, n_pcfactor[ii])
-
-            an = []
-            for m in range(n_bins[ii]):
-                an.append(
-                    (binarydata[m] / 2 ** n_bit[2 * ii])
-                    * (norm[2 * ii] / n_shots[2 * ii])
+        with licel_mmap.map_file(rawdata[j]) as f:
+            line = f.readline().decode("utf-8")  # noqa: F841
+            aux = []
+            """14 is the line number in the header of licel binary data"""
+            """ If measurement is from January 23 2022 the number should be 12 """
+            for ix in range(14):
+                aux.append(f.readline().decode("utf-8"))
+
+            """Reading binary data heads (2nd line) to select number of shots, start and stop time of measurements"""
+            start_time = aux[0][10:20] + "-" + aux[0][21:29]
+            stop_time = aux[0][30:40] + "-" + aux[0][41:49]
+            alt_station = aux[0][51:54]
+            site = aux[0][1:4]
+            if site == "Sao":
+                site = site + "_Paulo"
+            lat = aux[0][62:63] + aux[0][64:68]
+            long = aux[0][55:56] + aux[0][57:61]
+            laser_freq = aux[1][10:13]
+            n_channel = int(aux[1][27:29])
+            n_bit = []
+            norm = []
+            channel = []
+            n_bins = []
+            n_shots = []
+            n_pcfactor = []
+            n_resolution = []
+            flag_channel = []
+
+            for k in range(2, n_channel + 2):
+                if aux[k][3] == "0":
+                    flag_channel.append(int(aux[k][3]))
+                    n_bit.append(int(aux[k][44:46]))
+                    norm.append(int(float(aux[k][54:59]) * 1e3))
+                else:
+                    flag_channel.append("1")
+                    n_bit.append(16)
+                    norm.append(20)
+
+                channel.append(str(int(aux[k][25:30])))
+                n_bins.append(int(aux[k][7:12]))
+                n_shots.append(int(aux[k][47:53]))
+                n_resolution.append(float(aux[k][20:23]))
+                n_pcfactor.append(2 * (int(aux[k][7:12])) + 1)
+
+            f.readline().decode("utf-8")
+
+            """Each AN/PC pair is read as one block of 2 * bins + 1 int32 values, copied out of the mapped file"""
+            offsets = licel_mmap.record_offsets(f.tell(), n_bins)
+            separators = licel_mmap.separators(f, offsets, n_bins)
+            if not licel_mmap.valid_separators(separators).all():
+                print(
+                    "No end of line found after record. File could be corrupt: "
+                    + rawdata[j]
+                )
+            pair_offsets = offsets[0::2]
+
+            signal = {}
+            signaldeadtime = {}
+            for ii in range(int(n_channel / 2)):
+                binarydata = licel_mmap.records(
+                    f, pair_offsets[ii : ii + 1], n_pcfactor[ii : ii + 1]
+                )[0]
+
+                an, pc = decode_licel_pair(
+                    binarydata,
+                    n_bins[ii],
+                    n_bit[2 * ii : 2 * ii + 2],
+                    norm[2 * ii : 2 * ii + 2],
+                    n_shots[2 * ii : 2 * ii + 2],
                 )
 
-            pc = []
-            for m in range(n_bins[ii], 2 * n_bins[ii]):
-                pc.append(
-                    round(binarydata[m] / 2 ** n_bit[2 * ii + 1])
-                    * (norm[2 * ii + 1] / n_shots[2 * ii + 1])
+                signal[channel[2 * ii] + "AN"] = an
+                signal[channel[2 * ii + 1] + "PC"] = pc
+                signaldeadtime[channel[2 * ii] + "AN"] = deadtime_correction(
+                    an, deadtime[2 * ii]
+                )
+                signaldeadtime[channel[2 * ii + 1] + "PC"] = deadtime_correction(
+                    pc, deadtime[2 * ii + 1]
                 )
 
-            df[channel[2 * ii] + "AN"] = an
-            df[channel[2 * ii + 1] + "PC"] = pc
-            dfdeadtime[channel[2 * ii] + "AN"] = df[channel[2 * ii] + "AN"].apply(
-                lambda x: x / (1 - x * deadtime[2 * ii])
-            )
-            dfdeadtime[channel[2 * ii + 1] + "PC"] = df[
-                channel[2 * ii + 1] + "PC"
-            ].apply(lambda x: x / (1 - x * deadtime[2 * ii + 1]))
+        df = pd.DataFrame(signal)
+        dfdeadtime = pd.DataFrame(signaldeadtime)
 
         rawdatafiles.append(dfdeadtime)
 
@@ -277,35 +462,28 @@ def rebind(
             "long": long,
         }
 
-        folder_creation(csv_dir)
-
-        df.to_csv(csv_files_path, index=False, float_format="%.4f")
-
-        """writing down the header for Raw data files """
-        line1 = " ".join(["station " + str(site) + "\n"])
-        line2 = " ".join(["altitude " + str(alt_station) + "\n"])
-        line3 = " ".join(["lat " + str(lat) + "\n"])
-        line4 = " ".join(["long " + str(long) + "\n"])
-        line5 = " ".join(["starttime " + str(start_time) + "\n"])
-        line6 = " ".join(["stoptime " + str(stop_time) + "\n"])
-        line7 = " ".join(["bins " + str(n_bins[0]) + "\n"])
-        line8 = " ".join(["vert_res " + str(n_resolution[0]) + "\n"])
-        line9 = " ".join(["shotnumber " + str(n_shots[0]) + "\n"])
-        line10 = " ".join(["laser_freq " + laser_freq + "\n"])
-        writedown_header(
-            csv_files_path,
-            line1,
-            line2,
-            line3,
-            line4,
-            line5,
-            line6,
-            line7,
-            line8,
-            line9,
-            line10,
+        """header for Raw data files """
+        level0files.append(df)
+        level0headers.append(
+            {
+                "station": site,
+                "altitude": alt_station,
+                "lat": lat,
+                "long": long,
+                "starttime": start_time,
+                "stoptime": stop_time,
+                "bins": n_bins[0],
+                "vert_res": n_resolution[0],
+                "shotnumber": n_shots[0],
+                "laser_freq": laser_freq,
+            }
         )
 
+    folder_creation(csv_dir)
+    pf.write_day(
+        product_format, csv_dir, datedir, filenameaux, level0files, level0headers
+    )
+
     """RETURN ALSO dfdeadtime"""
     if meastypedir == "measurements":
         return rawdatafiles, dictsetup, filenameaux, csv_files_pathaux
@@ -338,40 +516,25 @@ def rebind(
         )
 
         folder_creation(meandc_csv_dir)
-        meandc_df.to_csv(meandc_csv_files, index=False, float_format="%.4f")
-
-        line11 = " ".join(["station " + str(site) + "\n"])
-        line12 = " ".join(["altitude " + str(alt_station) + "\n"])
-        line13 = " ".join(["lat " + str(lat) + "\n"])
-        line14 = " ".join(["long " + str(long) + "\n"])
-        line15 = " ".join(
-            [
-                "starttime1 " + str(starttimeaux[0]) + ",",
-                "stoptime1 " + str(stoptimeaux[0]) + "\n",
-            ]
-        )
-        line16 = " ".join(
-            [
-                "starttime2 " + str(starttimeaux[-1]) + ",",
-                "stoptime2 " + str(stoptimeaux[-1]) + "\n",
-            ]
-        )
-        line17 = " ".join(["bins " + str(n_bins[0]) + "\n"])
-        line18 = " ".join(["vert_res " + str(n_resolution[0]) + "\n"])
-        line19 = " ".join(["shotnumber " + str(n_shots[0]) + "\n"])
-        line20 = " ".join(["laser_freq " + laser_freq + "\n"])
-        writedown_header(
+        writedown_csv(
             meandc_csv_files,
-            line11,
-            line12,
-            line13,
-            line14,
-            line15,
-            line16,
-            line17,
-            line18,
-            line19,
-            line20,
+            meandc_df,
+            {
+                "station": site,
+                "altitude": alt_station,
+                "lat": lat,
+                "long": long,
+                "starttime1": ", stoptime1 ".join(
+                    [str(starttimeaux[0]), str(stoptimeaux[0])]
+                ),
+                "starttime2": ", stoptime2 ".join(
+                    [str(starttimeaux[-1]), str(stoptimeaux[-1])]
+                ),
+                "bins": n_bins[0],
+                "vert_res": n_resolution[0],
+                "shotnumber": n_shots[0],
+                "laser_freq": laser_freq,
+            },
         )
 
         return meandc_df
@@ -0,0 +1,201 @@
+"""
+Functions to write and read the level 0 and level 1 lidar products of one measurement day.
+Two product formats are available:
+    -csv: one csv file per profile with a 10-line header (original LIPANCORA format)
+    -netcdf: one NetCDF4 cube per measurement day (time x channel x bin) with the header
+     fields stored as attributes (constant values) or per-profile string variables
+"""
+
+import os
+
+import netCDF4 as netcdf
+import numpy as np
+import pandas as pd
+
+from functions import milgrau_function as mf
+
+product_formats = ["csv", "netcdf"]
+
+
+def write_day(product_format, dirpath, dayname, filenames, profiles, headers):
+    """Write all the profiles of a measurement day in the chosen product format.
+
+    filenames, profiles and headers are lists with one entry per profile: the csv file
+    name, a DataFrame (bins x channels) and the header dictionary (see writedown_csv).
+    For the netcdf format a single <dayname>_<product>.nc file is written in dirpath.
+    Return the list of written file paths.
+    """
+    if product_format == "csv":
+        return write_day_csv(dirpath, filenames, profiles, headers)
+    elif product_format == "netcdf":
+        return [write_day_netcdf(dirpath, dayname, filenames, profiles, headers)]
+    else:
+        raise ValueError(
+            "Product format %s not available, use one of %s"
+            % (product_format, product_formats)
+        )
+
+
+def write_day_csv(dirpath, filenames, profiles, headers):
+    filepaths = []
+    for filename, profile, header in zip(filenames, profiles, headers):
+        filepath = os.path.join(dirpath, filename)
+        mf.writedown_csv(filepath, profile, header)
+        filepaths.append(filepath)
+    return filepaths
+
+
+def write_day_netcdf(dirpath, dayname, filenames, profiles, headers):
+    # <raw file name>_level0, <raw file name>_level1_rcsignal, ...: the raw name may contain "_"
+    product_name = filenames[0][filenames[0].rindex("_level") + 1 :]
+    filepath = os.path.join(dirpath, "".join([dayname, "_", product_name, ".nc"]))
+    channels = list(profiles[0].columns)
+    header_keys = list(headers[0].keys())
+
+    with netcdf.Dataset(filepath, "w", format="NETCDF4") as f:
+        f.createDimension("time", len(profiles))
+        f.createDimension("channel", len(channels))
+        f.createDimension("bin", len(profiles[0].index))
+        f.header_keys = " ".join(header_keys)
+
+        temp_v = f.createVariable("channel", str, ("channel",))
+        temp_v[:] = np.array(channels, dtype=object)
+        temp_v = f.createVariable("filename", str, ("time",))
+        temp_v[:] = np.array(filenames, dtype=object)
+
+        # Header values constant over the day are attributes, the others are per-profile strings
+        for key in header_keys:
+            values = [str(header[key]) for header in headers]
+            if len(set(values)) == 1:
+                setattr(f, key, values[0])
+            else:
+                temp_v = f.createVariable(key, str, ("time",))
+                temp_v[:] = np.array(values, dtype=object)
+
+        temp_v = f.createVariable(
+            "signal",
+            "d",
+            ("time", "channel", "bin"),
+            zlib=True,
+        )
+        temp_v[:] = np.stack([profile.to_numpy().T for profile in profiles])
+
+    return filepath
+
+
+def read_day(dirpath):
+    """Read all the profiles of a measurement day product directory, csv or netcdf.
+
+    Return three lists with one entry per profile: the file paths (for netcdf products, the
+    path of the original csv name inside dirpath), the profiles as DataFrames (bins x channels)
+    and the header dictionaries with string values, as returned by readdown_header.
+    """
+    ncfiles = [
+        filepath
+        for filepath in mf.readfiles_generic(dirpath)
+        if filepath.endswith(".nc")
+    ]
+    if ncfiles:
+        filepaths, profiles, headers = [], [], []
+        for ncfile in ncfiles:
+            day = read_day_netcdf(ncfile)
+            filepaths.extend(os.path.join(dirpath, filename) for filename in day[0])
+            profiles.extend(day[1])
+            headers.extend(day[2])
+        return filepaths, profiles, headers
+
+    filepaths = mf.readfiles_generic(dirpath)
+    profiles = [
+        pd.read_csv(filepath, sep=",", skiprows=range(0, 10)) for filepath in filepaths
+    ]
+    headers = [mf.readdown_header(filepath) for filepath in filepaths]
+    return filepaths, profiles, headers
+
+
+def read_day_netcdf(filepath):
+    filenames, signal, channels, headers = read_cube_netcdf(filepath)
+    profiles = [
+        pd.DataFrame(signal[n], columns=channels) for n in range(len(filenames))
+    ]
+    return filenames, profiles, headers
+
+
+def read_cube_netcdf(filepath):
+    """Read a netcdf day product as file names, signal (time x bin x channel), channel
+    names and header dictionaries."""
+    with netcdf.Dataset(filepath, "r") as f:
+        channels = list(f.variables["channel"][:])
+        filenames = list(f.variables["filename"][:])
+        signal = np.ma.filled(f.variables["signal"][:], np.nan).transpose(0, 2, 1)
+
+        headers = []
+        for n in range(len(filenames)):
+            header = {}
+            for key in f.header_keys.split():
+                if key in f.variables:
+                    header[key] = str(f.variables[key][n])
+                else:
+                    header[key] = str(getattr(f, key))
+            headers.append(header)
+
+    return filenames, signal, channels, headers
+
+
+def load_day(dirpath):
+    """Read all the profiles of a measurement day product directory once, csv or netcdf.
+
+    Return the file paths (as in read_day), the signal as a 3-D array (time x bin x channel),
+    the channel names and the headers as a DataFrame with one row of strings per profile.
+    """
+    ncfiles = [
+        filepath
+        for filepath in mf.readfiles_generic(dirpath)
+        if filepath.endswith(".nc")
+    ]
+    if ncfiles:
+        filepaths, signal, channels, headers = [], [], None, []
+        for ncfile in ncfiles:
+            day = read_cube_netcdf(ncfile)
+            filepaths.extend(os.path.join(dirpath, filename) for filename in day[0])
+            signal.append(day[1])
+            channels = day[2]
+            headers.extend(day[3])
+        return filepaths, np.concatenate(signal), channels, pd.DataFrame(headers)
+
+    filepaths, profiles, headers = read_day(dirpath)
+    signal = np.stack([profile.to_numpy(dtype=float) for profile in profiles])
+    return filepaths, signal, list(profiles[0].columns), pd.DataFrame(headers)
+
+
+def day_altitude(dfdict, nbins):
+    """Altitude (m) of the bin centres as a one-column ("altitude") DataFrame."""
+    vert_res = float(dfdict["vert_res"].iloc[-1])
+    alt = pd.DataFrame((np.arange(nbins) + 1) * vert_res, columns=["altitude"])
+    return alt
+
+
+def day_mean_profile(signal, channels):
+    """Mean profile of the day (bins x channels DataFrame), NaN values skipped."""
+    return pd.DataFrame(np.nanmean(signal, axis=0), columns=channels)
+
+
+def day_time_average(signal, naverage):
+    """Average groups of naverage consecutive profiles of a (time x ...) array, the last
+    group possibly shorter."""
+    starts = np.arange(0, signal.shape[0], naverage)
+    counts = np.diff(np.append(starts, signal.shape[0]))
+    return np.add.reduceat(signal, starts, axis=0) / counts.reshape(
+        (-1,) + (1,) * (signal.ndim - 1)
+    )
+
+
+def day_channel_matrix(signal, channels, channel):
+    """Time-height matrix (bins x profiles) of one channel."""
+    return signal[:, :, list(channels).index(channel)].T
+
+
+def export_csv(ncfilepath, dirpath):
+    """Export a netcdf day product as the original one-csv-per-profile files in dirpath."""
+    filenames, profiles, headers = read_day_netcdf(ncfilepath)
+    mf.folder_creation(dirpath)
+    return write_day_csv(dirpath, filenames, profiles, headers)
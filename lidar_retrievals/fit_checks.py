@@ -29,6 +29,8 @@ https://gitlab.com/ioannis_binietoglou/lidar_molecular
 
 """
 import numpy as np
+from scipy.ndimage import maximum_filter1d, minimum_filter1d
+from scipy.stats import chi2
 from scipy.stats import shapiro
 from scipy.stats.mstats import normaltest
 from scipy.stats import linregress
@@ -110,10 +112,11 @@ def sliding_check_correlation(first_signal, second_signal, window_length=11, thr
     if window_length % 2:
         window_length += 1
 
-    sliding_first_signal = _rolling_window(first_signal, window_length)
-    sliding_second_signal = _rolling_window(second_signal, window_length)
+    _, _, correlation, _ = _sliding_linear_fit(first_signal, second_signal, window_length)
+
+    if threshold:
+        correlation = correlation > threshold
 
-    correlation = check_correlation(sliding_first_signal, sliding_second_signal, threshold)
     correlation = _restore_array_length(correlation, window_length)
 
     return correlation
@@ -182,11 +185,9 @@ def sliding_check_linear_fit_intercept_and_correlation(first_signal, second_sign
     if window_length % 2:
         window_length += 1
 
-    results = _apply_sliding_check(check_linear_fit_intercept_and_correlation, first_signal, second_signal, window_length)
+    _, intercepts, correlations, second_mean = _sliding_linear_fit(first_signal, second_signal, window_length)
+    intercepts = np.abs(intercepts / second_mean * 100)
 
-    intercepts = results[:, 0]
-    correlations = results[:, 1]
-    
     intercepts = _restore_array_length(intercepts, window_length)
     correlations = _restore_array_length(correlations, window_length)
 
@@ -242,12 +243,16 @@ def sliding_check_residuals_not_gaussian(first_signal, second_signal, window_len
     If a threshold is provided, returns True if the p value is below the specified threshold, i.e. if
     the residuals are probably not gaussian.
 
+    The Shapiro-Wilk test has no vectorized form, so it is called for every window (and, for 2D signals,
+    for every profile) in a Python loop. `sliding_check_residuals_not_gaussian_jarque_bera` tests all the
+    windows at once and can be chosen in the gluing functions with `normality_test='jarque_bera'`.
+
     Parameters
     ----------
     first_signal: array
-       The first signal array
+       The first signal array, 1D or 2D (profiles x range)
     second_signal: array
-       The second signal array
+       The second signal array, same shape as first_signal
     window_length: int
        The length of the window. It should be an odd number.
     threshold: float or None
@@ -263,7 +268,12 @@ def sliding_check_residuals_not_gaussian(first_signal, second_signal, window_len
     if window_length % 2:
         window_length += 1
 
-    p_values = _apply_sliding_check(check_residuals_not_gaussian, first_signal, second_signal, window_length, threshold)
+    if np.ndim(first_signal) == 2:
+        p_values = np.array([_apply_sliding_check(check_residuals_not_gaussian, first_row, second_row, window_length,
+                                                  threshold) for first_row, second_row in zip(first_signal, second_signal)])
+    else:
+        p_values = _apply_sliding_check(check_residuals_not_gaussian, first_signal, second_signal, window_length,
+                                        threshold)
     p_values = _restore_array_length(p_values, window_length)
 
     return p_values
@@ -338,10 +348,14 @@ def sliding_check_min_max_ratio(first_signal, second_signal, window_length=11, t
     if window_length % 2:
         window_length += 1
 
-    sliding_first_signal = _rolling_window(first_signal, window_length)
-    sliding_second_signal = _rolling_window(second_signal, window_length)
+    minmax_first = _sliding_min(first_signal, window_length) / _sliding_max(first_signal, window_length)
+    minmax_second = _sliding_min(second_signal, window_length) / _sliding_max(second_signal, window_length)
+
+    minmax_ratio = np.minimum(minmax_first, minmax_second)
+
+    if threshold:
+        minmax_ratio = minmax_ratio > threshold
 
-    minmax_ratio = check_min_max_ratio(sliding_first_signal, sliding_second_signal, threshold)
     minmax_ratio = _restore_array_length(minmax_ratio, window_length)
 
     return minmax_ratio
@@ -422,6 +436,162 @@ def sliding_check_residuals_not_gaussian_dagostino(first_signal, second_signal,
     return p_values
 
 
+def check_residuals_not_gaussian_jarque_bera(first_signal, second_signal, threshold=None):
+    """
+    Check if the residuals of the linear fit are not from a normal distribution.
+
+    The function uses a Jarque-Bera test on the residuals of a linear fit, assuming y = ax. It is computed from
+    the sample skewness and kurtosis only, so it is much cheaper than the Shapiro-Wilk test and can be
+    evaluated for all the windows of a sliding check at once.
+
+    If a threshold is provided, returns True if the p value is below the specified threshold, i.e. if
+    the residuals are probably not gaussian.
+
+    Parameters
+    ----------
+    first_signal: array
+       The first signal array. It can also be a 2D array of rolling slices (one slice per row).
+    second_signal: array
+       The second signal array, same shape as first_signal.
+    threshold: float or None
+       Threshold for the Jarque-Bera p-value.
+
+    Returns
+    -------
+    p_value: float or boolean
+       If threshold is None, then the function returns the p-value of the Jarque-Bera test on the residuals.
+       If a threshold is provided, the function returns True if p-value is below the threshold.
+    """
+    # Fit y = ax along the last axis and calculate residuals
+    a = np.einsum('...i,...i->...', first_signal, second_signal) / np.einsum('...i,...i->...', first_signal,
+                                                                             first_signal)
+    residuals = np.expand_dims(a, -1) * first_signal
+    residuals -= second_signal
+    residuals -= np.mean(residuals, axis=-1, keepdims=True)
+
+    # Products instead of powers, these arrays can be large for sliding windows
+    squared_residuals = residuals * residuals
+    variance = np.mean(squared_residuals, axis=-1)
+    skewness = np.einsum('...i,...i->...', squared_residuals, residuals) / first_signal.shape[-1] / (
+        variance * np.sqrt(variance))
+    kurtosis = np.einsum('...i,...i->...', squared_residuals, squared_residuals) / first_signal.shape[-1] / (
+        variance * variance)
+
+    jarque_bera = first_signal.shape[-1] / 6. * (skewness ** 2 + (kurtosis - 3) ** 2 / 4.)
+    p_value = chi2.sf(jarque_bera, 2)
+
+    if threshold:
+        p_value = p_value < threshold
+
+    return p_value
+
+
+def sliding_check_residuals_not_gaussian_jarque_bera(first_signal, second_signal, window_length, threshold=None):
+    """
+    Check if the residuals of the linear fit are not from a normal distribution, using a Jarque-Bera test.
+
+    Vectorized alternative of `sliding_check_residuals_not_gaussian`: all the windows are tested at once
+    on a rolling window view of the signals instead of calling a test for each window position.
+
+    Parameters
+    ----------
+    first_signal: array
+       The first signal array
+    second_signal: array
+       The second signal array
+    window_length: int
+       The length of the window. It should be an odd number.
+    threshold: float or None
+       Threshold for the Jarque-Bera p-value.
+
+    Returns
+    -------
+    p_value: array
+       If threshold is None, then the function returns the p-value of the Jarque-Bera test on the residuals.
+       If a threshold is provided, the function returns True if p-value is below the threshold.
+    """
+    # Make window length odd
+    if window_length % 2:
+        window_length += 1
+
+    signal_ndim = np.ndim(first_signal)
+    first_signal = np.atleast_2d(np.asarray(first_signal, dtype=float))
+    second_signal = np.atleast_2d(np.asarray(second_signal, dtype=float))
+
+    # Process the profiles in chunks to bound the size of the rolling window arrays
+    chunk_length = max(1, int(4e6 // (first_signal.shape[-1] * window_length)))
+    p_values = np.concatenate([
+        check_residuals_not_gaussian_jarque_bera(_rolling_window(first_signal[idx:idx + chunk_length], window_length),
+                                                 _rolling_window(second_signal[idx:idx + chunk_length], window_length),
+                                                 threshold)
+        for idx in range(0, first_signal.shape[0], chunk_length)])
+    if signal_ndim == 1:
+        p_values = p_values[0]
+    p_values = _restore_array_length(p_values, window_length)
+
+    return p_values
+
+
+def _sliding_linear_fit(first_signal, second_signal, window_length):
+    """
+    Least squares fit y = ax + b of the second signal on the first in every window, from cumulative sums.
+
+    The cost does not depend on the window length. The signals are centered on their mean before the
+    cumulative sums to limit the round-off of the differences of large partial sums.
+
+    Returns
+    -------
+    slope, intercept, correlation, second_mean: arrays
+       The fit parameters, the correlation coefficient and the mean of the second signal of each window
+       (length len(first_signal) - window_length + 1).
+    """
+    first_signal = np.asarray(first_signal, dtype=float)
+    second_signal = np.asarray(second_signal, dtype=float)
+    first_offset = np.mean(first_signal, axis=-1, keepdims=True)
+    second_offset = np.mean(second_signal, axis=-1, keepdims=True)
+    x = first_signal - first_offset
+    y = second_signal - second_offset
+
+    sum_x = _sliding_sum(x, window_length)
+    sum_y = _sliding_sum(y, window_length)
+    sxx = _sliding_sum(x * x, window_length) - sum_x ** 2 / window_length
+    syy = _sliding_sum(y * y, window_length) - sum_y ** 2 / window_length
+    sxy = _sliding_sum(x * y, window_length) - sum_x * sum_y / window_length
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        slope = sxy / sxx
+        correlation = np.clip(sxy / np.sqrt(sxx * syy), -1, 1)
+
+    first_mean = sum_x / window_length + first_offset
+    second_mean = sum_y / window_length + second_offset
+    intercept = second_mean - slope * first_mean
+
+    return slope, intercept, correlation, second_mean
+
+
+def _sliding_sum(signal, window_length):
+    """ Sum of every window of the signal, from its cumulative sum (accumulated in extended precision)."""
+    cumulative_sum = np.cumsum(signal, axis=-1, dtype=np.longdouble)
+    cumulative_sum = np.concatenate([np.zeros(signal.shape[:-1] + (1,), dtype=np.longdouble), cumulative_sum], axis=-1)
+    return (cumulative_sum[..., window_length:] - cumulative_sum[..., :-window_length]).astype(float)
+
+
+def _sliding_min(signal, window_length):
+    """ Minimum of every window of the signal (length len(signal) - window_length + 1)."""
+    start = window_length // 2
+    signal_length = np.shape(signal)[-1]
+    return minimum_filter1d(np.asarray(signal, dtype=float), window_length,
+                            axis=-1)[..., start:start + signal_length - window_length + 1]
+
+
+def _sliding_max(signal, window_length):
+    """ Maximum of every window of the signal (length len(signal) - window_length + 1)."""
+    start = window_length // 2
+    signal_length = np.shape(signal)[-1]
+    return maximum_filter1d(np.asarray(signal, dtype=float), window_length,
+                            axis=-1)[..., start:start + signal_length - window_length + 1]
+
+
 def _residuals(first_signal, second_signal):
     # Fit y = ax
     a, _, _, _ = np.linalg.lstsq(first_signal[:, np.newaxis], second_signal,rcond=None)
@@ -487,7 +657,7 @@ def _restore_array_length(input_array, window_length):
     Parameters
     ----------
     input_array: array
-       The input 1D numpy array.
+       The input numpy array, 1D or 2D (profiles x windows). It is padded along the last axis.
     window_length:
        Size of the window used for the sliding operation/
 
@@ -500,10 +670,9 @@ def _restore_array_length(input_array, window_length):
     append_region_length = window_length - prepend_region_length - 1
 
     # Create nan arrays fill the begining and end of the array
-    prepend_array = np.ma.masked_all(prepend_region_length, dtype=input_array.dtype)
-    append_array = np.ma.masked_all(append_region_length, dtype=input_array.dtype)
-    output_array = np.ma.append(prepend_array, input_array)
-    output_array = np.ma.append(output_array, append_array)
+    prepend_array = np.ma.masked_all(input_array.shape[:-1] + (prepend_region_length,), dtype=input_array.dtype)
+    append_array = np.ma.masked_all(input_array.shape[:-1] + (append_region_length,), dtype=input_array.dtype)
+    output_array = np.ma.concatenate([prepend_array, input_array, append_array], axis=-1)
 
     output_array = np.ma.masked_invalid(output_array)
     return output_array
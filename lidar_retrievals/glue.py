@@ -137,7 +137,7 @@ def calculate_gluing_values(lower_gluing_region, upper_gluing_region, use_upper_
     
 def glue_signals_1d(lower_signal, upper_signal, window_length, correlation_threshold,
                  intercept_threshold, gaussian_threshold, minmax_threshold,
-                 min_idx, max_idx, use_upper_as_reference=True):
+                 min_idx, max_idx, use_upper_as_reference=True, normality_test='shapiro'):
     """
     Automatically glue two signals.
 
@@ -154,13 +154,15 @@ def glue_signals_1d(lower_signal, upper_signal, window_length, correlation_thres
     intercept_threshold:
        Threshold for the linear fit intercept
     gaussian_threshold:
-       Threshold for the Shapiro-Wilk p-value.
+       Threshold for the normality test p-value.
     minmax_threshold:
        Threshold for the min/max ratio
     min_idx, max_idx: int
        Minimum and maximum index to search for a gluing region.
     use_upper_as_reference: bool
        If True, the upper signal is used as reference. Else, the lower signal is used.
+    normality_test: str
+       Test of the residuals normality, 'shapiro' (one test per window) or 'jarque_bera' (vectorized, faster).
 
     Returns
     -------
@@ -178,7 +180,7 @@ def glue_signals_1d(lower_signal, upper_signal, window_length, correlation_thres
     upper_signal_cut = upper_signal[min_idx:max_idx]
 
     gluing_score = get_sliding_gluing_score(lower_signal_cut, upper_signal_cut, window_length, correlation_threshold,
-                                            intercept_threshold, gaussian_threshold, minmax_threshold)
+                                            intercept_threshold, gaussian_threshold, minmax_threshold, normality_test)
 
     gluing_center_idx = np.argmax(gluing_score) + min_idx  # Index of the original, uncut signals
 
@@ -266,8 +268,98 @@ def glue_signals_2d(lower_signal, upper_signal, correlation_threshold=0.95,
     return glued_signal, c_lower, c_upper
 
 
+def glue_signals_time_resolved(lower_signal, upper_signal, window_length, correlation_threshold,
+                               intercept_threshold, gaussian_threshold, minmax_threshold,
+                               min_idx, max_idx, use_upper_as_reference=True, normality_test='jarque_bera'):
+    """
+    Automatically glue every profile of two time-resolved signals.
+
+    The gluing score of every profile is calculated at once with the sliding checks along the range axis,
+    and each profile is glued at its own best region with its own calibration constants. Profiles without
+    any region passing the checks use the median gluing index and calibration constants of the valid ones.
+
+    Parameters
+    ----------
+    lower_signal: array
+       The low-range signal to be used, 2D with dimensions (time, range).
+    upper_signal: array
+       The high-range signal to be used, 2D with dimensions (time, range).
+    window_length: int
+       The number of bins to be used for gluing
+    correlation_threshold: float
+       Threshold for the correlation coefficient
+    intercept_threshold:
+       Threshold for the linear fit intercept
+    gaussian_threshold:
+       Threshold for the normality test p-value.
+    minmax_threshold:
+       Threshold for the min/max ratio
+    min_idx, max_idx: int
+       Minimum and maximum index to search for a gluing region.
+    use_upper_as_reference: bool
+       If True, the upper signal is used as reference. Else, the lower signal is used.
+    normality_test: str
+       Test of the residuals normality, 'shapiro' (one test per window) or 'jarque_bera' (vectorized, faster).
+
+    Returns
+    -------
+    glued_signal: array
+       The glued signal array, same size as lower_signal and upper_signal.
+    gluing_center_idx: array
+       Index chosen to perform gluing, one per profile.
+    gluing_score: array
+       The gluing score at the chosen point, one per profile (nan for the profiles without a valid region).
+    c_lower, c_upper: arrays
+       Calibration constants of the lower and upper signal, one per profile. One of them will be 1, depending
+       on the value of `use_upper_as_reference` argument.
+    gluing_valid: array
+       True for the profiles glued at their own region, False for those using the median values.
+    """
+    lower_signal = np.asarray(lower_signal, dtype=float)
+    upper_signal = np.asarray(upper_signal, dtype=float)
+    profile_idxs = np.arange(lower_signal.shape[0])
+
+    gluing_score = _sliding_gluing_score(lower_signal[:, min_idx:max_idx], upper_signal[:, min_idx:max_idx],
+                                         window_length, correlation_threshold, intercept_threshold,
+                                         gaussian_threshold, minmax_threshold, normality_test)
+    gluing_valid = ~np.all(np.ma.getmaskarray(gluing_score), axis=1)
+
+    if not np.any(gluing_valid):
+        raise RuntimeError("No suitable gluing regions found.")
+
+    gluing_center_idx = np.ma.argmax(gluing_score, axis=1, fill_value=-np.inf) + min_idx
+    gluing_center_idx[~gluing_valid] = int(np.median(gluing_center_idx[gluing_valid]))
+    score = np.ma.filled(gluing_score[profile_idxs, gluing_center_idx - min_idx].astype(float), np.nan)
+
+    # Zero-intercept least squares slope of every profile in its gluing region
+    region_idxs = gluing_center_idx[:, np.newaxis] + np.arange(-(window_length // 2), window_length // 2)
+    lower_gluing_region = np.take_along_axis(lower_signal, region_idxs, axis=1)
+    upper_gluing_region = np.take_along_axis(upper_signal, region_idxs, axis=1)
+    slope_zero_intercept = np.sum(lower_gluing_region * upper_gluing_region, axis=1) / np.sum(
+        lower_gluing_region ** 2, axis=1)
+    slope_zero_intercept[~gluing_valid] = np.median(slope_zero_intercept[gluing_valid])
+
+    if use_upper_as_reference:
+        c_upper = np.ones_like(slope_zero_intercept)
+        c_lower = slope_zero_intercept
+    else:
+        c_upper = 1 / slope_zero_intercept
+        c_lower = np.ones_like(slope_zero_intercept)
+
+    # Linear fade-in/fade-out in each profile's gluing region, as in glue_signals_at_bins
+    min_bin = (gluing_center_idx - window_length // 2)[:, np.newaxis]
+    gluing_length = 2 * (window_length // 2)
+    lower_weights = np.clip(1 - (np.arange(lower_signal.shape[1]) - min_bin) / float(gluing_length), 0, 1)
+    upper_weights = 1 - lower_weights
+
+    glued_signal = (c_lower[:, np.newaxis] * lower_weights * lower_signal +
+                    c_upper[:, np.newaxis] * upper_weights * upper_signal)
+
+    return glued_signal, gluing_center_idx, score, c_lower, c_upper, gluing_valid
+
+
 def get_sliding_gluing_score(lower_signal, upper_signal, window_length, correlation_threshold, intercept_threshold,
-                             gaussian_threshold, minmax_threshold):
+                             gaussian_threshold, minmax_threshold, normality_test='shapiro'):
     """ Get gluing score.
 
     Parameters
@@ -283,9 +375,11 @@ def get_sliding_gluing_score(lower_signal, upper_signal, window_length, correlat
     intercept_threshold : float
        Threshold for the linear fit intercept
     gaussian_threshold : float
-       Threshold for the Shapiro-Wilk p-value.
+       Threshold for the normality test p-value.
     minmax_threshold : float
        Threshold for the min/max ratio.
+    normality_test : str
+       Test of the residuals normality, 'shapiro' (one test per window) or 'jarque_bera' (vectorized, faster).
 
     Returns
     -------
@@ -293,10 +387,30 @@ def get_sliding_gluing_score(lower_signal, upper_signal, window_length, correlat
        A score indicating regions were gluing is better. Regions were gluing is not possible are masked.
     """
 
+    gluing_score = _sliding_gluing_score(lower_signal, upper_signal, window_length, correlation_threshold,
+                                         intercept_threshold, gaussian_threshold, minmax_threshold, normality_test)
+
+    if np.all(np.ma.getmaskarray(gluing_score)):
+        raise RuntimeError("No suitable gluing regions found.")
+
+    return gluing_score
+
+
+def _sliding_gluing_score(lower_signal, upper_signal, window_length, correlation_threshold, intercept_threshold,
+                          gaussian_threshold, minmax_threshold, normality_test):
+    """ Sliding gluing score of 1D signals or of every profile of 2D (time, range) signals, see
+    `get_sliding_gluing_score`. Regions (or whole profiles) where gluing is not possible are masked.
+    """
     # Get values of various gluing tests
     intercept_values, correlation_values = fit_checks.sliding_check_linear_fit_intercept_and_correlation(lower_signal, upper_signal, window_length)
-    
-    gaussian_values = fit_checks.sliding_check_residuals_not_gaussian(lower_signal, upper_signal, window_length)
+
+    if normality_test == 'shapiro':
+        gaussian_values = fit_checks.sliding_check_residuals_not_gaussian(lower_signal, upper_signal, window_length)
+    elif normality_test == 'jarque_bera':
+        gaussian_values = fit_checks.sliding_check_residuals_not_gaussian_jarque_bera(lower_signal, upper_signal,
+                                                                                      window_length)
+    else:
+        raise ValueError("Normality test {0} not available, use 'shapiro' or 'jarque_bera'.".format(normality_test))
     minmax_ratio_values = fit_checks.sliding_check_min_max_ratio(lower_signal, upper_signal, window_length)
 
     # Find regions where all tests pass
@@ -307,9 +421,6 @@ def get_sliding_gluing_score(lower_signal, upper_signal, window_length, correlat
 
     gluing_possible = correlation_mask & intercept_mask & ~not_gaussian_mask & minmax_ratio_large_mask
 
-    if not np.any(gluing_possible):
-        raise RuntimeError("No suitable gluing regions found.")
-
     # Calculate a (arbitrary) cost function to deside which region is best
     intercept_scale_value = 40.
     intercept_values[intercept_values > intercept_scale_value] = intercept_scale_value
@@ -34,6 +34,7 @@ https://gitlab.com/ioannis_binietoglou/lidar_molecular
 import numpy as np
 from scipy.signal import savgol_filter
 from scipy.integrate import cumtrapz
+from scipy.optimize import brentq
 
 
 def klett_backscatter_aerosol(range_corrected_signal, lidar_ratio_aerosol, beta_molecular, index_reference,
@@ -44,12 +45,13 @@ def klett_backscatter_aerosol(range_corrected_signal, lidar_ratio_aerosol, beta_
 
     Parameters
     ----------
-    range_corrected_signal : float.
-       The range corrected signal.
-    lidar_ratio_aerosol : float.
-       The aerosol lidar ratio.
+    range_corrected_signal : array_like
+       The range corrected signal. A 2-D array (profiles x bins) inverts all the profiles
+       in one call; the integrals run along the last (range) axis.
+    lidar_ratio_aerosol : float or array_like
+       The aerosol lidar ratio. For 2-D signals it can be given per profile as a (profiles x 1) array.
     beta_molecular : array_like
-       The molecular backscatter coefficient. (m^-1 * sr^-1)
+       The molecular backscatter coefficient, one profile or one per signal profile. (m^-1 * sr^-1)
     index_reference : integer
        The index of the reference height. (bins)
     reference_range : integer
@@ -63,8 +65,8 @@ def klett_backscatter_aerosol(range_corrected_signal, lidar_ratio_aerosol, beta_
 
     Returns
     -------
-    beta_aerosol: float
-       The aerosol backscatter coefficient. (m^-1 * sr^-1)
+    beta_aerosol: array_like
+       The aerosol backscatter coefficient, with the shape of range_corrected_signal. (m^-1 * sr^-1)
 
     Notes
     -----
@@ -136,6 +138,82 @@ def klett_backscatter_aerosol(range_corrected_signal, lidar_ratio_aerosol, beta_
     return beta_aerosol
 
 
+def klett_lidar_ratio_sweep(range_corrected_signal, lidar_ratios, beta_molecular, index_reference, reference_range,
+                            beta_aerosol_reference, bin_length, lidar_ratio_molecular=8.37758041, index_bottom=0):
+    r"""Klett inversion of one range corrected signal for a vector of aerosol lidar ratios in a single pass.
+
+    Parameters
+    ----------
+    range_corrected_signal : array_like
+       The range corrected signal (1-D).
+    lidar_ratios : array_like
+       The candidate aerosol lidar ratios. (sr)
+    beta_molecular, index_reference, reference_range, beta_aerosol_reference, bin_length, lidar_ratio_molecular :
+       As in `klett_backscatter_aerosol`.
+    index_bottom : integer
+       The first bin of the aerosol optical depth integral. (bins)
+
+    Returns
+    -------
+    beta_aerosol : array_like
+       The aerosol backscatter coefficient, one profile per lidar ratio. (m^-1 * sr^-1)
+    aod : array_like
+       The aerosol optical depth between index_bottom and the reference height, one per lidar ratio.
+    """
+    lidar_ratios = np.asarray(lidar_ratios, dtype=float).reshape(-1, 1)
+    beta_aerosol = klett_backscatter_aerosol(np.asarray(range_corrected_signal), lidar_ratios,
+                                             np.asarray(beta_molecular), index_reference, reference_range,
+                                             beta_aerosol_reference, bin_length, lidar_ratio_molecular)
+    aod = np.trapz(lidar_ratios * beta_aerosol[:, index_bottom:index_reference + 1], dx=bin_length, axis=-1)
+
+    return beta_aerosol, aod
+
+
+def klett_lidar_ratio_aod(range_corrected_signal, aod, lidar_ratios, beta_molecular, index_reference,
+                          reference_range, beta_aerosol_reference, bin_length, lidar_ratio_molecular=8.37758041,
+                          index_bottom=0):
+    r"""Aerosol lidar ratio for which the Klett retrieval reproduces a column aerosol optical depth.
+
+    The lidar ratios are swept with `klett_lidar_ratio_sweep` to bracket the solution, which is then refined with
+    Brent's method between the two bracketing candidates.
+
+    Parameters
+    ----------
+    range_corrected_signal : array_like
+       The range corrected signal (1-D).
+    aod : float
+       The column aerosol optical depth to match, e.g. measured by a sun photometer.
+    lidar_ratios : array_like
+       The candidate aerosol lidar ratios, in increasing order. (sr)
+    beta_molecular, index_reference, reference_range, beta_aerosol_reference, bin_length, lidar_ratio_molecular,
+    index_bottom :
+       As in `klett_lidar_ratio_sweep`.
+
+    Returns
+    -------
+    lidar_ratio_aerosol : float
+       The aerosol lidar ratio matching `aod`, or NaN if no candidate range brackets it. (sr)
+    """
+    lidar_ratios = np.asarray(lidar_ratios, dtype=float)
+    beta_aerosol, aod_sweep = klett_lidar_ratio_sweep(range_corrected_signal, lidar_ratios, beta_molecular,
+                                                      index_reference, reference_range, beta_aerosol_reference,
+                                                      bin_length, lidar_ratio_molecular, index_bottom)
+    residual = aod_sweep - aod
+    bracket = np.flatnonzero(np.isfinite(residual[:-1]) & np.isfinite(residual[1:]) &
+                             (np.sign(residual[:-1]) != np.sign(residual[1:])))
+    if residual[0] == 0:
+        return lidar_ratios[0]
+    if len(bracket) == 0:
+        return np.nan
+
+    def aod_residual(lidar_ratio):
+        return klett_lidar_ratio_sweep(range_corrected_signal, [lidar_ratio], beta_molecular, index_reference,
+                                       reference_range, beta_aerosol_reference, bin_length, lidar_ratio_molecular,
+                                       index_bottom)[1][0] - aod
+
+    return brentq(aod_residual, lidar_ratios[bracket[0]], lidar_ratios[bracket[0] + 1])
+
+
 def _get_reference_values(beta_molecular, index_reference, range_corrected_signal, reference_range):
     """
     Determine the reference value for Klett retrieval.
@@ -146,23 +224,24 @@ def _get_reference_values(beta_molecular, index_reference, range_corrected_signa
        The molecular backscatter coefficient. (m^-1 * sr^-1)
     index_reference : integer
        The index of the reference height. (bins)
-    range_corrected_signal : float.
-       The range corrected signal.
+    range_corrected_signal : array_like
+       The range corrected signal, 1-D or 2-D (profiles x bins).
     reference_range : integer
        The reference height range. (bins)
 
     Returns
     -------
-    beta_molecular_reference : float
-       The reference molecular value
-    range_corrected_signal_reference : float
-       The reference value for the range corrected signal
+    beta_molecular_reference : array_like
+       The reference molecular value, one per profile (last axis kept with length 1)
+    range_corrected_signal_reference : array_like
+       The reference value for the range corrected signal, one per profile (last axis kept with length 1)
     """
     range_corrected_signal_reference = savgol_filter(
-        range_corrected_signal[(index_reference - reference_range):(index_reference + reference_range)], 11, 3)
-    range_corrected_signal_reference = np.median(range_corrected_signal_reference)
-    beta_molecular_reference = beta_molecular[index_reference]
-    
+        np.asarray(range_corrected_signal)[..., (index_reference - reference_range):(index_reference + reference_range)],
+        11, 3, axis=-1)
+    range_corrected_signal_reference = np.median(range_corrected_signal_reference, axis=-1, keepdims=True)
+    beta_molecular_reference = np.asarray(beta_molecular)[..., index_reference:index_reference + 1]
+
     return beta_molecular_reference, range_corrected_signal_reference
 
 
@@ -173,7 +252,7 @@ def _integrate_from_reference(integral_argument, index_reference, bin_length):
     Parameters
     ----------
     integral_argument : array_like
-       The argument to integrate
+       The argument to integrate, 1-D or 2-D (profiles x bins). The integral runs along the last axis.
     index_reference : integer
        The index of the reference height. (bins)
     bin_length : float
@@ -184,13 +263,17 @@ def _integrate_from_reference(integral_argument, index_reference, bin_length):
     tau_integral : array_like
        The cumulative integral from the reference point.
     """
+    integral_argument = np.asarray(integral_argument)
+
     # Integrate from the reference point towards the beginning
-    tau_integral_below = cumtrapz(integral_argument[:index_reference + 1][::-1], dx=-bin_length)[::-1]
+    tau_integral_below = cumtrapz(integral_argument[..., :index_reference + 1][..., ::-1], dx=-bin_length,
+                                  axis=-1)[..., ::-1]
 
     # Integrate from the reference point towards the end
-    tau_integral_above = cumtrapz(integral_argument[index_reference:], dx=bin_length)
+    tau_integral_above = cumtrapz(integral_argument[..., index_reference:], dx=bin_length, axis=-1)
 
     # Join the arrays and set a 0 value for the reference point.
-    tau_integral = np.concatenate([tau_integral_below, np.zeros(1), tau_integral_above])
+    tau_integral = np.concatenate([tau_integral_below, np.zeros(integral_argument.shape[:-1] + (1,)),
+                                   tau_integral_above], axis=-1)
 
     return tau_integral
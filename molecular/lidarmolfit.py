@@ -8,8 +8,10 @@ Creation started on Sun Jan 30 08:19:50 2022
 @author: Fábio J. S. Lopes
 """
 
+import hashlib
 import os
 import os.path
+from collections import OrderedDict
 import numpy as np
 import pandas as pd
 from scipy import integrate
@@ -17,84 +19,201 @@ from scipy import interpolate
 from datetime import datetime
 from datetime import timedelta
 from molecular import us_std
+from molecular import radiosounding
 from molecular import lidarmolfit_plots
 from molecular import rayleigh_scattering_bucholtz as rsbucholtz
 
+molecular_cache_folder = None # folder of the on-disk molecular profile cache, None to keep them only in memory
+molecular_cache_size = 32 # number of molecular profiles kept in memory (least recently used are dropped)
+_molecular_cache = OrderedDict()
+
+rawinsonde_stations = {'Sao_Paulo': '83779_SBMT'} # radiosounding station of each lidar station
+rawinsonde_max_hours = 12 # largest time (h) between the expected launch and a sounding taken from the station store
+
+
+def set_molecular_cache(folder=None, size=32):
+    """Configure the molecular profile cache: on-disk folder (None for memory only) and in-memory size."""
+    global molecular_cache_folder, molecular_cache_size
+    molecular_cache_folder = folder
+    molecular_cache_size = size
+    if folder is not None:
+        os.makedirs(folder, exist_ok=True)
+    while len(_molecular_cache) > molecular_cache_size:
+        _molecular_cache.popitem(last=False)
+
+
+def cached_molecular_profile(key, calculate):
+    """
+    Return the molecular profile arrays identified by key, calling calculate() only when they are
+    neither in the in-memory LRU cache nor in the on-disk cache folder.
+    key is a tuple (source, source id, wavelength, vert_res, nbins, station altitude), with wavelength None
+    for the pressure and temperature profiles.
+    """
+    if key in _molecular_cache:
+        _molecular_cache.move_to_end(key)
+        return [np.copy(profile) for profile in _molecular_cache[key]]
+
+    profiles = None
+    if molecular_cache_folder is not None:
+        cachefile = os.path.join(molecular_cache_folder, ''.join([hashlib.sha1(repr(key).encode()).hexdigest(), '.npz']))
+        if os.path.isfile(cachefile):
+            with np.load(cachefile) as f:
+                profiles = [f['arr_%d' % n] for n in range(len(f.files))]
+
+    if profiles is None:
+        profiles = [np.asarray(profile) for profile in calculate()]
+        if molecular_cache_folder is not None:
+            # written under a temporary name so concurrent runs never read a partial file
+            with open(cachefile + '.tmp%d' % os.getpid(), 'wb') as f:
+                np.savez(f, *profiles)
+            os.replace(cachefile + '.tmp%d' % os.getpid(), cachefile)
+
+    _molecular_cache[key] = profiles
+    while len(_molecular_cache) > molecular_cache_size:
+        _molecular_cache.popitem(last=False)
+    return [np.copy(profile) for profile in profiles]
+
+
+def _file_hash(filepath):
+    with open(filepath, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def _launch_time(starttime):
+    # launch used for a measurement: 00Z up to 08h, 12Z from 09h to 20h and 00Z of the next day from 21h
+    start = datetime.strptime(starttime,'%d/%m/%Y-%H:%M:%S')
+    if start.hour <= 8:
+        return datetime(start.year, start.month, start.day, 0)
+    elif start.hour <= 20:
+        return datetime(start.year, start.month, start.day, 12)
+    else:
+        return datetime(start.year, start.month, start.day, 0) + timedelta(days=1)
+
+
+def _find_rawinsonde(filenameheader, rawinsonde_folder):
+    """
+    Sounding of the measurement, searched in this order: the expected launch in the station store
+    (see radiosounding.py), the csv file of the expected launch (not imported into the store yet) and
+    the launch nearest to the expected one in the store, within rawinsonde_max_hours.
+    Return the sounding id (for the molecular profile cache) and a function reading the sounding, or None.
+    """
+    rawinsonde_station = rawinsonde_stations[filenameheader[0]['station']]
+    launch_time = _launch_time(filenameheader[0]['starttime'])
+    store = radiosounding.store_path(os.path.join(os.getcwd(),rawinsonde_folder), rawinsonde_station)
+    
+    stored = radiosounding.nearest_sounding(store, launch_time, 0)
+    if stored is not None:
+        return _stored_sounding(stored[1])
+    
+    rawinsonde_files = os.path.join(os.getcwd(),rawinsonde_folder,rawinsonde_station,''.join([rawinsonde_station,'_',launch_time.strftime('%Y_%m_%d_%HZ'),'.csv']))
+    if os.path.isfile(rawinsonde_files):
+        return _file_hash(rawinsonde_files), lambda: radiosounding.read_sounding_csv(rawinsonde_files)[2]
+    
+    stored = radiosounding.nearest_sounding(store, launch_time, rawinsonde_max_hours)
+    if stored is not None:
+        return _stored_sounding(stored[1])
+    
+    return None
+
+
+def _stored_sounding(sounding):
+    sounding_id = hashlib.sha1(repr(list(sounding.columns)).encode() + sounding.to_numpy(dtype=float).tobytes()).hexdigest()
+    return sounding_id, lambda: sounding
+
+
+def _read_rawinsonde(rawinsonde):
+    # getting data products from Radisounding - altitude (a.s.l.), pressure (hPa) and Temperature (in C to K)
+    rawinsonde['press'] = rawinsonde['PRES'] # Pressão atmosférica local.
+    rawinsonde['alt'] = (rawinsonde['HGHT'])  # Altitude acima do solo em m.
+    rawinsonde['temp'] = rawinsonde['TEMP'] + 273.15  # Temperatura local em K.
+    
+    return pd.DataFrame(rawinsonde, columns = ['alt', 'press', 'temp'])
+
+
+def _rayleigh_radiosounding(read_sounding, lamb, altitude, spustation_alt):
+    rawinsonde = _read_rawinsonde(read_sounding()).dropna()
+    
+    rawbetamol = rsbucholtz.angular_volume_scattering_coefficient(lamb, rawinsonde['press'].to_numpy(), rawinsonde['temp'].to_numpy(), np.pi)*1e-3
+    rawalphamol = rsbucholtz.volume_scattering_coefficient(lamb, rawinsonde['press'].to_numpy(), rawinsonde['temp'].to_numpy())*1e-3
+    
+    rawbetamol_func = interpolate.interp1d(rawinsonde['alt'].values.tolist(),np.log(rawbetamol), kind ='linear' ,fill_value="extrapolate")
+    betamol_interp = np.exp(rawbetamol_func(np.add(altitude,spustation_alt)))
+    
+    rawalphamol_func = interpolate.interp1d(rawinsonde['alt'].values.tolist(),np.log(rawalphamol), kind ='linear' ,fill_value="extrapolate")
+    alphamol_interp = np.exp(rawalphamol_func(np.add(altitude,spustation_alt)))
+    
+    return betamol_interp, alphamol_interp
+
+
+def _rayleigh_us_std(my_atmosphere_std, lamb, altitude, spustation_alt):
+    temp = my_atmosphere_std.temperature(altitude)
+    press = my_atmosphere_std.pressure(altitude)
+    rawbetamol = rsbucholtz.angular_volume_scattering_coefficient(lamb,press,temp, np.pi)*1e-3
+    rawalphamol = rsbucholtz.volume_scattering_coefficient(lamb,press,temp)*1e-3
+
+    rawbetamol_func = interpolate.interp1d(altitude,np.log(rawbetamol), kind ='linear' ,fill_value="extrapolate")
+    betamol_interp = np.exp(rawbetamol_func(np.add(altitude,spustation_alt)))
+    
+    rawalphamol_func = interpolate.interp1d(altitude,np.log(rawalphamol), kind ='linear' ,fill_value="extrapolate")
+    alphamol_interp = np.exp(rawalphamol_func(np.add(altitude,spustation_alt)))
+    
+    return betamol_interp, alphamol_interp
+
+
+def _press_temp_radiosounding(read_sounding, altitude, spustation_alt):
+    rawinsonde = _read_rawinsonde(read_sounding())
+    
+    # remove negative values
+    rawinsonde[(rawinsonde < 0).any(axis=1)] = np.nan
+    rawinsonde = rawinsonde.dropna()
+
+    press_func = interpolate.interp1d(rawinsonde['alt'].values.tolist(),rawinsonde['press'].values.tolist(), kind ='linear' ,fill_value="extrapolate")
+    press_interpolated = press_func(np.add(altitude,spustation_alt))
+    
+    temp_func = interpolate.interp1d(rawinsonde['alt'].values.tolist(),rawinsonde['temp'].values.tolist(), kind ='linear' ,fill_value="extrapolate")
+    temp_interpolated = temp_func(np.add(altitude,spustation_alt))
+    
+    return press_interpolated, temp_interpolated
+
+
+def _press_temp_us_std(my_atmosphere_std, altitude, spustation_alt):
+    temp = my_atmosphere_std.temperature(altitude)
+    press = my_atmosphere_std.pressure(altitude)
+
+    press_func = interpolate.interp1d(altitude,press, kind ='linear' ,fill_value="extrapolate")
+    press_interpolated = press_func(np.add(altitude,spustation_alt))
+    
+    temp_func = interpolate.interp1d(altitude,temp, kind ='linear' ,fill_value="extrapolate")
+    temp_interpolated = temp_func(np.add(altitude,spustation_alt))
+    
+    return press_interpolated, temp_interpolated
+
     
 def lidarmolfit(station, atmospheric_flag, filenameheader,preprocessedsignalmean, ini_molref_alt, fin_molref_alt,lamb,channelmode,rawinsonde_folder):
     
     if atmospheric_flag == 'radiosounding':
     
-        rawinsonde_files = []
-        datestr = []
-                
-        if filenameheader[0]['station'] == 'Sao_Paulo' :
-            rawinsonde_station = '83779_SBMT'
-            rawinsonde_folder0 = rawinsonde_folder
-            # rawinsonde_folder01 = os.path.join(os.getcwd(),rawinsonde_folder0,rawinsonde_station)
-      
-        if datetime.strptime(filenameheader[0]['starttime'],'%d/%m/%Y-%H:%M:%S').hour >= 0 and datetime.strptime(filenameheader[0]['starttime'],'%d/%m/%Y-%H:%M:%S').hour <= 8:
-            datestr = datetime.strftime(datetime.strptime(filenameheader[0]['starttime'],'%d/%m/%Y-%H:%M:%S'),('%Y_%m_%d_'))
-            rawinsonde_files = os.path.join(os.getcwd(),rawinsonde_folder0,rawinsonde_station,''.join([rawinsonde_station,'_',datestr,'00Z.csv']))
-       
-        elif datetime.strptime(filenameheader[0]['starttime'],'%d/%m/%Y-%H:%M:%S').hour >= 9 and datetime.strptime(filenameheader[0]['starttime'],'%d/%m/%Y-%H:%M:%S').hour <= 20:
-            datestr = datetime.strftime(datetime.strptime(filenameheader[0]['starttime'],'%d/%m/%Y-%H:%M:%S'),('%Y_%m_%d_'))
-            rawinsonde_files = os.path.join(os.getcwd(),rawinsonde_folder0,rawinsonde_station,''.join([rawinsonde_station,'_',datestr,'12Z.csv']))
-
-        elif datetime.strptime(filenameheader[0]['starttime'],'%d/%m/%Y-%H:%M:%S').hour >= 21 and datetime.strptime(filenameheader[0]['starttime'],'%d/%m/%Y-%H:%M:%S').hour <= 23:
-            datestr = datetime.strftime(datetime.strptime(filenameheader[0]['starttime'],'%d/%m/%Y-%H:%M:%S')+timedelta(days=1),('%Y_%m_%d_'))
-            rawinsonde_files = os.path.join(os.getcwd(),rawinsonde_folder0,rawinsonde_station,''.join([rawinsonde_station,'_',datestr,'00Z.csv']))
-        
-        if os.path.isfile(rawinsonde_files) == True:
-            rawinsonde = pd.read_table(rawinsonde_files, skiprows = [0, 1, 3, 4, 5], skipfooter = 0, sep = '\s+', engine = 'python')
-        else:
+        rawinsonde = _find_rawinsonde(filenameheader, rawinsonde_folder)
+        if rawinsonde is None:
             return print('There are no radiosounding data - try to use Atmospheric Standard Model \n change atmospheric_flag to us_std')
-            
-        # getting data products from Radisounding - altitude (a.s.l.), pressure (hPa) and Temperature (in C to K)
-        rawinsonde['press'] = rawinsonde['PRES'] # Pressão atmosférica local.
-        rawinsonde['alt'] = (rawinsonde['HGHT'])  # Altitude acima do solo em m.
-        rawinsonde['temp'] = rawinsonde['TEMP'] + 273.15  # Temperatura local em K.
-        
-    # Organizing dataframe and remove negative values
-        rawinsonde = pd.DataFrame(rawinsonde, columns = ['alt', 'press', 'temp'])
-        rawinsonde.where(rawinsonde < 0, np.nan)
-        rawinsonde = rawinsonde.dropna()
-        
-        rawbetamol = []
-        rawalphamol = []
         
         spustation_alt=766 # altitude station as the sea level
-        altitude=[]
-        for i in range(0,len(preprocessedsignalmean)):
-            altitude.append(i*float(filenameheader[0]['vert_res'])+float(filenameheader[0]['vert_res']))
-            
-        for i in range(0,len(rawinsonde)):
-            rawbetamol.append(rsbucholtz.angular_volume_scattering_coefficient(lamb, rawinsonde['press'][i], rawinsonde['temp'][i], np.pi)*1e-3) 
-            rawalphamol.append(rsbucholtz.volume_scattering_coefficient(lamb, rawinsonde['press'][i], rawinsonde['temp'][i])*1e-3)
-        
-        rawbetamol_func = interpolate.interp1d(rawinsonde['alt'].values.tolist(),np.log(rawbetamol), kind ='linear' ,fill_value="extrapolate")
-        betamol_interp = np.exp(rawbetamol_func(np.add(altitude,spustation_alt)))
+        altitude = np.arange(len(preprocessedsignalmean))*float(filenameheader[0]['vert_res'])+float(filenameheader[0]['vert_res'])
         
-        rawalphamol_func = interpolate.interp1d(rawinsonde['alt'].values.tolist(),np.log(rawalphamol), kind ='linear' ,fill_value="extrapolate")
-        alphamol_interp = np.exp(rawalphamol_func(np.add(altitude,spustation_alt)))
+        betamol_interp, alphamol_interp = cached_molecular_profile(
+            ('radiosounding', rawinsonde[0], lamb, float(filenameheader[0]['vert_res']), len(altitude), spustation_alt),
+            lambda: _rayleigh_radiosounding(rawinsonde[1], lamb, altitude, spustation_alt))
                 
-        integralmol = []
-        aodmol = []
-        smolsimulated = []
-           
-        for j in range(0,len(preprocessedsignalmean)):
-            integralmol = integrate.cumtrapz(alphamol_interp[0:j+1],altitude[0:j+1],initial=0)   
-        
-        for i in range(0,len(integralmol)):
-            aodmol.append(np.exp(-2*integralmol[i]))
-            smolsimulated.append(betamol_interp[i]*aodmol[i]/altitude[i]**(2))
+        # molecular optical depth, two-way transmission and attenuated backscatter signal
+        integralmol = integrate.cumtrapz(alphamol_interp,altitude,initial=0)
+        aodmol = np.exp(-2*integralmol)
+        smolsimulated = betamol_interp*aodmol/altitude**2
         
         x = smolsimulated[int(ini_molref_alt/float(filenameheader[0]['vert_res'])):int(fin_molref_alt/float(filenameheader[0]['vert_res']))]
-        y = preprocessedsignalmean.values.tolist()[int(ini_molref_alt/float(filenameheader[0]['vert_res'])):int(fin_molref_alt/float(filenameheader[0]['vert_res']))]
+        y = preprocessedsignalmean.to_numpy()[int(ini_molref_alt/float(filenameheader[0]['vert_res'])):int(fin_molref_alt/float(filenameheader[0]['vert_res']))]
         model = np.polyfit(x,y,1)
         predict = np.poly1d(model)
-        predict(smolsimulated)
-        simulatedsignalscaled = np.multiply(smolsimulated,predict[1])
+        simulatedsignalscaled = smolsimulated*predict[1]
         
         lidarmolfit_plots.molfit_graphs(x,y,predict(x),altitude,preprocessedsignalmean,simulatedsignalscaled,lamb,channelmode,atmospheric_flag,filenameheader)
         
@@ -103,43 +222,23 @@ def lidarmolfit(station, atmospheric_flag, filenameheader,preprocessedsignalmean
     elif atmospheric_flag == 'us_std':
         my_atmosphere_std = us_std.Atmosphere() #Here one can set the standard values of t = 288.15, p = 1013.25, alt = 00 to provide tha atmospheric profile
     
-        altitude = []
-        temp = []
-        press = []
-        rawbetamol = []
-        rawalphamol = []
         spustation_alt=766 # altitude station as the sea level
         
-        for i in range(0,len(preprocessedsignalmean)):
-            altitude.append(i*float(filenameheader[0]['vert_res'])+float(filenameheader[0]['vert_res']))
-            temp.append(my_atmosphere_std.temperature(altitude[i]))
-            press.append(my_atmosphere_std.pressure(altitude[i]))
-            rawbetamol.append(rsbucholtz.angular_volume_scattering_coefficient(lamb,press[i],temp[i], np.pi)*1e-3) 
-            rawalphamol.append(rsbucholtz.volume_scattering_coefficient(lamb,press[i],temp[i])*1e-3)
-
-        rawbetamol_func = interpolate.interp1d(altitude,np.log(rawbetamol), kind ='linear' ,fill_value="extrapolate")
-        betamol_interp = np.exp(rawbetamol_func(np.add(altitude,spustation_alt)))
-        
-        rawalphamol_func = interpolate.interp1d(altitude,np.log(rawalphamol), kind ='linear' ,fill_value="extrapolate")
-        alphamol_interp = np.exp(rawalphamol_func(np.add(altitude,spustation_alt)))
+        altitude = np.arange(len(preprocessedsignalmean))*float(filenameheader[0]['vert_res'])+float(filenameheader[0]['vert_res'])
+        betamol_interp, alphamol_interp = cached_molecular_profile(
+            ('us_std', (my_atmosphere_std.T0, my_atmosphere_std.P0), lamb, float(filenameheader[0]['vert_res']), len(altitude), spustation_alt),
+            lambda: _rayleigh_us_std(my_atmosphere_std, lamb, altitude, spustation_alt))
                 
-        integralmol = []
-        aodmol = []
-        smolsimulated = []
-           
-        for j in range(0,len(preprocessedsignalmean)):
-            integralmol = integrate.cumtrapz(alphamol_interp[0:j+1],altitude[0:j+1],initial=0)   
-        
-        for i in range(0,len(integralmol)):
-            aodmol.append(np.exp(-2*integralmol[i]))
-            smolsimulated.append(betamol_interp[i]*aodmol[i]/altitude[i]**(2))
+        # molecular optical depth, two-way transmission and attenuated backscatter signal
+        integralmol = integrate.cumtrapz(alphamol_interp,altitude,initial=0)
+        aodmol = np.exp(-2*integralmol)
+        smolsimulated = betamol_interp*aodmol/altitude**2
         
         x = smolsimulated[int(ini_molref_alt/float(filenameheader[0]['vert_res'])):int(fin_molref_alt/float(filenameheader[0]['vert_res']))]
-        y = preprocessedsignalmean.values.tolist()[int(ini_molref_alt/float(filenameheader[0]['vert_res'])):int(fin_molref_alt/float(filenameheader[0]['vert_res']))]
+        y = preprocessedsignalmean.to_numpy()[int(ini_molref_alt/float(filenameheader[0]['vert_res'])):int(fin_molref_alt/float(filenameheader[0]['vert_res']))]
         model = np.polyfit(x,y,1)
         predict = np.poly1d(model)
-        predict(smolsimulated)
-        simulatedsignalscaled = np.multiply(smolsimulated,predict[1])
+        simulatedsignalscaled = smolsimulated*predict[1]
         
         atmospheric_flag = 'U.S. Standard Atmosphere'
         lidarmolfit_plots.molfit_graphs(x,y,predict(x),altitude,preprocessedsignalmean,simulatedsignalscaled,lamb,channelmode,atmospheric_flag,filenameheader)
@@ -150,76 +249,28 @@ def mol_parameters_raman(station, atmospheric_flag, filenameheader, preprocessed
     
     if atmospheric_flag == 'radiosounding':
     
-        rawinsonde_files = []
-        datestr = []
-                
-        if filenameheader[0]['station'] == 'Sao_Paulo' :
-            rawinsonde_station = '83779_SBMT'
-            rawinsonde_folder0 = rawinsonde_folder
-            # rawinsonde_folder01 = os.path.join(os.getcwd(),rawinsonde_folder0,rawinsonde_station)
-      
-        if datetime.strptime(filenameheader[0]['starttime'],'%d/%m/%Y-%H:%M:%S').hour >= 0 and datetime.strptime(filenameheader[0]['starttime'],'%d/%m/%Y-%H:%M:%S').hour <= 8:
-            datestr = datetime.strftime(datetime.strptime(filenameheader[0]['starttime'],'%d/%m/%Y-%H:%M:%S'),('%Y_%m_%d_'))
-            rawinsonde_files = os.path.join(os.getcwd(),rawinsonde_folder0,rawinsonde_station,''.join([rawinsonde_station,'_',datestr,'00Z.csv']))
-       
-        elif datetime.strptime(filenameheader[0]['starttime'],'%d/%m/%Y-%H:%M:%S').hour >= 9 and datetime.strptime(filenameheader[0]['starttime'],'%d/%m/%Y-%H:%M:%S').hour <= 20:
-            datestr = datetime.strftime(datetime.strptime(filenameheader[0]['starttime'],'%d/%m/%Y-%H:%M:%S'),('%Y_%m_%d_'))
-            rawinsonde_files = os.path.join(os.getcwd(),rawinsonde_folder0,rawinsonde_station,''.join([rawinsonde_station,'_',datestr,'12Z.csv']))
-
-        elif datetime.strptime(filenameheader[0]['starttime'],'%d/%m/%Y-%H:%M:%S').hour >= 21 and datetime.strptime(filenameheader[0]['starttime'],'%d/%m/%Y-%H:%M:%S').hour <= 23:
-            datestr = datetime.strftime(datetime.strptime(filenameheader[0]['starttime'],'%d/%m/%Y-%H:%M:%S')+timedelta(days=1),('%Y_%m_%d_'))
-            rawinsonde_files = os.path.join(os.getcwd(),rawinsonde_folder0,rawinsonde_station,''.join([rawinsonde_station,'_',datestr,'00Z.csv']))
-        
-        if os.path.isfile(rawinsonde_files) == True:
-            rawinsonde = pd.read_table(rawinsonde_files, skiprows = [0, 1, 3, 4, 5], skipfooter = 0, sep = '\s+', engine = 'python')
-        else:
+        rawinsonde = _find_rawinsonde(filenameheader, rawinsonde_folder)
+        if rawinsonde is None:
             return print('There are no radiosounding data - try to use Atmospheric Standard Model \n change atmospheric_flag to us_std')
-            
-        # getting data products from Radisounding - altitude (a.s.l.), pressure (hPa) and Temperature (in C to K)
-        rawinsonde['press'] = rawinsonde['PRES'] # Pressão atmosférica local.
-        rawinsonde['alt'] = (rawinsonde['HGHT'])  # Altitude acima do solo em m.
-        rawinsonde['temp'] = rawinsonde['TEMP'] + 273.15  # Temperatura local em K.
-        
-    # Organizing dataframe and remove negative values
-        rawinsonde = pd.DataFrame(rawinsonde, columns = ['alt', 'press', 'temp'])
-        rawinsonde[(rawinsonde < 0).any(1)] = np.nan
-        rawinsonde = rawinsonde.dropna()
-        
-        press_interpolated = []
-        temp_interpolated = []
         
         spustation_alt=766 # altitude station as the sea level
-        altitude=[]
-        
-        for i in range(0,len(preprocessedsignalmean)):
-            altitude.append(i*float(filenameheader[0]['vert_res'])+float(filenameheader[0]['vert_res']))
+        altitude = np.arange(len(preprocessedsignalmean))*float(filenameheader[0]['vert_res'])+float(filenameheader[0]['vert_res'])
 
-        press_func = interpolate.interp1d(rawinsonde['alt'].values.tolist(),rawinsonde['press'].values.tolist(), kind ='linear' ,fill_value="extrapolate")
-        press_interpolated = press_func(np.add(altitude,spustation_alt))
-        
-        temp_func = interpolate.interp1d(rawinsonde['alt'].values.tolist(),rawinsonde['temp'].values.tolist(), kind ='linear' ,fill_value="extrapolate")
-        temp_interpolated = temp_func(np.add(altitude,spustation_alt))
+        press_interpolated, temp_interpolated = cached_molecular_profile(
+            ('radiosounding', rawinsonde[0], None, float(filenameheader[0]['vert_res']), len(altitude), spustation_alt),
+            lambda: _press_temp_radiosounding(rawinsonde[1], altitude, spustation_alt))
                 
         return press_interpolated, temp_interpolated
     
     elif atmospheric_flag == 'us_std':
         my_atmosphere_std = us_std.Atmosphere() #Here one can set the standard values of t = 288.15, p = 1013.25, alt = 00 to provide tha atmospheric profile
     
-        altitude = []
-        temp = []
-        press = []
         spustation_alt=766 # altitude station as the sea level
         
-        for i in range(0,len(preprocessedsignalmean)):
-            altitude.append(i*float(filenameheader[0]['vert_res'])+float(filenameheader[0]['vert_res']))
-            temp.append(my_atmosphere_std.temperature(altitude[i]))
-            press.append(my_atmosphere_std.pressure(altitude[i]))
-
-        press_func = interpolate.interp1d(altitude,press, kind ='linear' ,fill_value="extrapolate")
-        press_interpolated = press_func(np.add(altitude,spustation_alt))
-        
-        temp_func = interpolate.interp1d(altitude,temp, kind ='linear' ,fill_value="extrapolate")
-        temp_interpolated = temp_func(np.add(altitude,spustation_alt))
+        altitude = np.arange(len(preprocessedsignalmean))*float(filenameheader[0]['vert_res'])+float(filenameheader[0]['vert_res'])
+        press_interpolated, temp_interpolated = cached_molecular_profile(
+            ('us_std', (my_atmosphere_std.T0, my_atmosphere_std.P0), None, float(filenameheader[0]['vert_res']), len(altitude), spustation_alt),
+            lambda: _press_temp_us_std(my_atmosphere_std, altitude, spustation_alt))
                 
         return press_interpolated, temp_interpolated
     
@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+RADIOSOUNDING store
+
+Local archive of radiosounding profiles, one NetCDF file per station (e.g. 83779_SBMT.nc) with
+the launch time as index, so the soundings are looked up by time instead of by file name.
+    -import_csv_files: bulk import of the csv files written by 05-RADIODATA
+    -nearest_sounding: the sounding launched nearest to a given time
+    -WyomingFetcher: download of a sounding from the University of Wyoming server (or any server
+     answering the same request, e.g. a local stand-in), the fetcher used is a parameter
+    -fetch_soundings: concurrent download of many launches, skipping those already downloaded
+"""
+
+import glob
+import os
+import os.path
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from datetime import timedelta
+
+import netCDF4 as netcdf
+import numpy as np
+import pandas as pd
+import urllib3
+from bs4 import BeautifulSoup
+
+time_units = "hours since 1970-01-01 00:00:00"
+
+
+def store_path(store_folder, station):
+    """Path of the sounding store of a station, station as in the csv file names (e.g. 83779_SBMT)."""
+    return os.path.join(store_folder, "".join([station, ".nc"]))
+
+
+def sounding_filename(title):
+    """csv file name of a sounding from its title, e.g. '83779 SBMT Marte Civ Observations at 00Z 20 Jun 2024'
+    gives 83779_SBMT_2024_06_20_00Z.csv"""
+    title = title.split(" ")
+    datename = datetime.strptime(
+        "".join([title[-1], "/", title[-2], "/", title[-3]]), "%Y/%b/%d"
+    )
+    return "".join(
+        [
+            title[0],
+            "_",
+            title[1],
+            "_",
+            datename.strftime("%Y_%m_%d"),
+            "_",
+            title[-4],
+            ".csv",
+        ]
+    )
+
+
+def read_sounding_csv(filepath):
+    """Read a sounding csv file (05-RADIODATA format) as station, launch time and the profile DataFrame."""
+    name = os.path.splitext(os.path.basename(filepath))[0].split("_")
+    station = "_".join(name[:-4])
+    launch_time = datetime.strptime("_".join(name[-4:]), "%Y_%m_%d_%HZ")
+    sounding = pd.read_table(
+        filepath, skiprows=[0, 1, 3, 4, 5], skipfooter=0, sep=r"\s+", engine="python"
+    )
+    return station, launch_time, sounding
+
+
+def write_soundings(filepath, launch_times, soundings):
+    """Add soundings (profile DataFrames) to a station store, replacing those with the same launch time."""
+    mode = "a" if os.path.isfile(filepath) else "w"
+    with netcdf.Dataset(filepath, mode, format="NETCDF4") as f:
+        if mode == "w":
+            f.createDimension("time", None)
+            f.createDimension("level", None)
+            temp_v = f.createVariable("time", "d", ("time",))
+            temp_v.units = time_units
+            f.createVariable("levels", "i4", ("time",))
+
+        # launches compared as integer seconds, not as float hours
+        times = [_launch_seconds(launch) for launch in f.variables["time"][:]]
+        for launch_time, sounding in zip(launch_times, soundings):
+            launch = netcdf.date2num(launch_time, time_units)
+            n = (
+                times.index(_launch_seconds(launch))
+                if _launch_seconds(launch) in times
+                else len(times)
+            )
+            if n == len(times):
+                times.append(_launch_seconds(launch))
+                f.variables["time"][n] = launch
+
+            for column in sounding.columns:
+                if column not in f.variables:
+                    # one chunk per launch, so a sounding is read without decompressing the others
+                    f.createVariable(
+                        column,
+                        "d",
+                        ("time", "level"),
+                        zlib=True,
+                        fill_value=np.nan,
+                        chunksizes=(1, 256),
+                    )
+            for name in f.variables:
+                if f.variables[name].dimensions == ("time", "level"):
+                    values = np.full(
+                        max(len(sounding), f.dimensions["level"].size), np.nan
+                    )
+                    if name in sounding.columns:
+                        values[: len(sounding)] = sounding[name].to_numpy(dtype=float)
+                    f.variables[name][n, : len(values)] = values
+            f.variables["levels"][n] = len(sounding)
+
+
+def import_csv_files(filepaths, store_folder):
+    """Import sounding csv files into the stores of their stations in store_folder.
+
+    Return the number of imported soundings.
+    """
+    stations = {}
+    for filepath in filepaths:
+        station, launch_time, sounding = read_sounding_csv(filepath)
+        stations.setdefault(station, ([], []))
+        stations[station][0].append(launch_time)
+        stations[station][1].append(sounding)
+
+    for station, (launch_times, soundings) in stations.items():
+        write_soundings(store_path(store_folder, station), launch_times, soundings)
+
+    return sum(len(launch_times) for launch_times, soundings in stations.values())
+
+
+def import_csv_folder(csv_folder, store_folder):
+    """Import all the sounding csv files found in csv_folder (and its subfolders)."""
+    filepaths = sorted(
+        os.path.join(dirpath, filename)
+        for dirpath, dirnames, filenames in os.walk(csv_folder)
+        for filename in filenames
+        if filename.endswith(".csv")
+    )
+    return import_csv_files(filepaths, store_folder)
+
+
+def launch_times(filepath):
+    """Launch times stored in a station store, sorted."""
+    with netcdf.Dataset(filepath, "r") as f:
+        times = np.sort(f.variables["time"][:])
+    return [_launch_datetime(launch) for launch in times]
+
+
+def _launch_datetime(launch):
+    # launch in time_units
+    return datetime(1970, 1, 1) + timedelta(hours=float(launch))
+
+
+def _launch_seconds(launch):
+    # launch in time_units as integer seconds
+    return int(round(float(launch) * 3600))
+
+
+def nearest_sounding(filepath, time, max_hours=12):
+    """
+    Sounding launched nearest to time (datetime) in a station store, within max_hours.
+
+    Return the launch time and the profile DataFrame (columns as in the csv files),
+    or None if the store has no sounding close enough.
+    """
+    if not os.path.isfile(filepath):
+        return None
+
+    with netcdf.Dataset(filepath, "r") as f:
+        times = np.asarray(f.variables["time"][:])
+        if len(times) == 0:
+            return None
+        distance = np.abs(
+            np.round(times * 3600).astype(np.int64)
+            - _launch_seconds(netcdf.date2num(time, time_units))
+        )
+        n = int(np.argmin(distance))
+        if distance[n] > max_hours * 3600:
+            return None
+
+        levels = int(f.variables["levels"][n])
+        sounding = pd.DataFrame(
+            {
+                name: np.ma.filled(f.variables[name][n, :levels], np.nan)
+                for name in f.variables
+                if f.variables[name].dimensions == ("time", "level")
+            }
+        )
+
+    return _launch_datetime(times[n]), sounding
+
+
+class WyomingFetcher:
+    """
+    Download soundings from the University of Wyoming server.
+
+    Any object with the same fetch method can be used instead (e.g. reading from a local archive or a
+    stand-in server in tests); url points to the sounding cgi of the server.
+    """
+
+    def __init__(
+        self,
+        url="http://weather.uwyo.edu/cgi-bin/sounding",
+        region="samer",
+        http=None,
+        connections=4,
+        retries=5,
+        backoff_factor=1.0,
+        timeout=60,
+    ):
+        """
+        One connection pool is shared by all the requests (also from several threads), with up to
+        connections connections per host. Failed connections and busy-server answers (429, 5xx) are
+        retried up to retries times, waiting backoff_factor * 2 ** (retry - 1) seconds in between.
+        """
+        self.url = url
+        self.region = region
+        if http is None:
+            http = urllib3.PoolManager(
+                maxsize=connections,
+                block=True,
+                timeout=timeout,
+                retries=urllib3.Retry(
+                    total=retries,
+                    backoff_factor=backoff_factor,
+                    status_forcelist=[429, 500, 502, 503, 504],
+                ),
+            )
+        self.http = http
+
+    def request_url(self, station, launch_time):
+        return "".join(
+            [
+                self.url,
+                "?region=",
+                self.region,
+                "&TYPE=TEXT%3ALIST&YEAR=",
+                str(launch_time.year),
+                "&MONTH=",
+                str(launch_time.month),
+                "&FROM=",
+                str(launch_time.day),
+                launch_time.strftime("%H"),
+                "&TO=",
+                str(launch_time.day),
+                launch_time.strftime("%H"),
+                "&STNM=",
+                station,
+            ]
+        )
+
+    def fetch(self, station, launch_time):
+        """
+        Sounding of station (number, e.g. '83779') launched at launch_time (datetime).
+
+        Return the sounding title and the csv file text (title line followed by the sounding table),
+        or the server message and None when the sounding is not available.
+        """
+        try:
+            response = self.http.request("GET", self.request_url(station, launch_time))
+        except urllib3.exceptions.HTTPError as error:
+            return str(error), None
+        page = BeautifulSoup(response.data, "html.parser")
+
+        if page.find("h2") is None:
+            message = [
+                line
+                for line in (page.body or page).get_text().split("\n")
+                if line.strip()
+            ]
+            return (message[0] if message else "no data"), None
+
+        title = page.find("h2").text.strip()
+        table = page.find("pre").text
+        lines = table[table.find("\n") + 1 : table.rfind("\n")].splitlines()[:-1]
+        return title, "".join(line + "\n" for line in [title] + lines)
+
+
+def fetch_sounding(fetcher, station, launch_time, csv_folder, store_folder=None):
+    """
+    Fetch a sounding, write its csv file in csv_folder/<station>_<ICAO> and import it into the store.
+
+    Return the title and the csv file path, or the server message and None.
+    """
+    title, text = fetcher.fetch(station, launch_time)
+    if text is None:
+        return title, None
+
+    saving_folder = os.path.join(csv_folder, "_".join(title.split(" ")[:2]))
+    os.makedirs(saving_folder, exist_ok=True)
+    filepath = os.path.join(saving_folder, sounding_filename(title))
+    with open(filepath, "wt", encoding="utf-8") as csvfile:
+        csvfile.write(text)
+
+    if store_folder is not None:
+        import_csv_files([filepath], store_folder)
+    return title, filepath
+
+
+def downloaded_sounding(csv_folder, station, launch_time):
+    """csv file of a sounding of station (number) already in csv_folder/<station>_<ICAO>, or None."""
+    filepaths = glob.glob(
+        os.path.join(
+            csv_folder,
+            "".join([station, "_*"]),
+            "".join([station, "_*_", launch_time.strftime("%Y_%m_%d_%HZ"), ".csv"]),
+        )
+    )
+    return filepaths[0] if filepaths else None
+
+
+def fetch_soundings(
+    fetcher,
+    station,
+    launch_times,
+    csv_folder,
+    store_folder=None,
+    workers=4,
+    skip_downloaded=True,
+):
+    """
+    Fetch the soundings of several launches with workers concurrent requests, writing their csv files
+    in csv_folder and importing them into the store at the end. Launches with a csv file already in
+    csv_folder are not downloaded again when skip_downloaded is True.
+
+    Return a list with the title (or the server message, or the error) and the csv file path (None if
+    not available) of each launch.
+    """
+    results = [None] * len(launch_times)
+    pending = []
+    for n, launch_time in enumerate(launch_times):
+        filepath = (
+            downloaded_sounding(csv_folder, station, launch_time)
+            if skip_downloaded
+            else None
+        )
+        if filepath is not None:
+            print("Already downloaded --> " + filepath)
+            results[n] = ("already downloaded", filepath)
+        else:
+            pending.append(n)
+
+    def fetch(n):
+        # a failing launch (bad page, write error, ...) is reported and the others go on
+        try:
+            title, filepath = fetch_sounding(
+                fetcher, station, launch_times[n], csv_folder
+            )
+        except Exception as error:
+            title, filepath = "%s: %s" % (type(error).__name__, error), None
+        print(("Sorry :( --> " if filepath is None else "Downloading --> ") + title)
+        return title, filepath
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for n, result in zip(pending, executor.map(fetch, pending)):
+            results[n] = result
+
+    # the store is only written here, by one thread
+    downloaded = [results[n][1] for n in pending if results[n][1] is not None]
+    if store_folder is not None and downloaded:
+        import_csv_files(downloaded, store_folder)
+    return results
@@ -73,6 +73,12 @@ class Atmosphere:
             my_atmosphere.temperature(10000) # Gives the temperature at 10 km
             my_atmosphere.pressure(10000) # Gives the pressure at 10 km
             my_atmosphere.density(10000) # Gives the density at (in km/m^3) at 10 km
+
+        The altitude can also be an array, and for repeated calls a tabulated
+        (interpolated) profile can be used instead of the layer equations::
+
+            my_atmosphere.tabulate(step=1.0)  # Optional, done on the first tabulated call
+            my_atmosphere.pressure(altitudes, tabulated=True)
         '''
         alt = alt / 1000.0  # Make the calculations in km
 
@@ -154,30 +160,61 @@ class Atmosphere:
         self.P71 = self.PR71 * self.P0
         self.Rho71 = (self.Rho0 * self.PR71) * (self.T0 / self.T71)
 
-    def temperature(self, H):
+        # layer tables (altitudes in km): top and base altitude, base temperature,
+        # lapse rate (0 for the isothermal layers) and base pressure of each layer
+        self.layer_top = np.array([11, 20, 32, 47, 51, 71, 84.852])
+        self.layer_base = np.array([0, 11, 20, 32, 47, 51, 71])
+        self.layer_T = np.array([self.T0, self.T11, self.T20, self.T32, self.T47, self.T51, self.T71])
+        self.layer_L = np.array([self.L0, 0, self.L20, self.L32, 0, self.L51, self.L71])
+        self.layer_P = np.array([self.P0, self.P11, self.P20, self.P32, self.P47, self.P51, self.P71])
+
+        self._table = None
+
+    def temperature(self, H, tabulated=False):
         """Return the standard temperature for the specified altitude. 
-        H in meters
+        H in meters, a number or an array of altitudes
         """
-        H = H / 1000.0  # Make the calculations in km
-
-        if H <= 11:
-            temp = self.T0 + H * self.L0
-        elif H <= 20:
-            temp = self.T11
-        elif H <= 32:
-            temp = self.T20 + (H - 20) * self.L20
-        elif H <= 47:
-            temp = self.T32 + (H - 32) * self.L32
-        elif H <= 51:
-            temp = self.T47
-        elif H <= 71:
-            temp = self.T51 + (H - 51) * self.L51
-        elif H <= 84.852:
-            temp = self.T71 + (H - 71) * self.L71
-        else:
+        if tabulated and self._in_table(H):
+            return self._interp_table(H, self._table[2], self._table[3])[()]
+
+        H = np.asarray(H) / 1000.0  # Make the calculations in km
+        layer = self._layer(H)
+
+        temp = self.layer_T[layer] + (H - self.layer_base[layer]) * self.layer_L[layer]
+
+        return temp[()]
+
+    def _layer(self, H):
+        # index of the layer of each altitude, H in km
+        if np.any(H > self.layer_top[-1]):
             raise ValueError('This function is only implemented for altitudes of 84.852 km and below.')
+        return np.searchsorted(self.layer_top, H)
 
-        return temp
+    def tabulate(self, step=1.0):
+        """
+        Precompute the temperature and the (log) pressure every step meters
+        from 0 to 84.852 km, used by the tabulated=True calls.
+        """
+        altitude = np.arange(int(84852 // step) + 1) * step
+        temp = self.temperature(altitude)
+        log_press = np.log(self.pressure(altitude))
+        # values and slopes per grid interval, the last value is repeated for the top altitude
+        self._table = (step, altitude[-1],
+                       np.append(temp, temp[-1]), np.append(np.diff(temp), 0),
+                       np.append(log_press, log_press[-1]), np.append(np.diff(log_press), 0))
+
+    def _in_table(self, H):
+        # the tabulated profile is only used within its altitude range
+        if self._table is None:
+            self.tabulate()
+        H = np.asarray(H)
+        return np.all(H >= 0) and np.all(H <= self._table[1])
+
+    def _interp_table(self, H, values, slopes):
+        # linear interpolation in the regular altitude grid
+        x = np.asarray(H) / self._table[0]
+        idx = x.astype(int)
+        return values[idx] + (x - idx) * slopes[idx]
 
     def _alt2press_ratio_gradient(self, H, Hb, Pb, Tb, L,):
         # eqn from USAF TPS PEC binder, page PS1-31
@@ -191,31 +228,29 @@ class Atmosphere:
     def _alt2press_ratio(self, H):
         """
         Return the pressure ratio (atmospheric pressure / standard pressure
-        for sea level).   
+        for sea level). H in km, a number or an array.
         """
+        H = np.asarray(H)
+        layer = self._layer(H)
+        Hb, Pb, Tb, L = self.layer_base[layer], self.layer_P[layer], self.layer_T[layer], self.layer_L[layer]
 
-        if H <= 11:
-            return self._alt2press_ratio_gradient(H, 0, self.P0,  self.T0,  self.L0)
-        if H <= 20:
-            return self._alt2press_ratio_isothermal(H, 11,  self.P11,  self.T11)
-        if H <= 32:
-            return self._alt2press_ratio_gradient(H, 20,  self.P20,  self.T20,  self.L20)
-        if H <= 47:
-            return self._alt2press_ratio_gradient(H, 32,  self.P32,  self.T32,  self.L32)
-        if H <= 51:
-            return self._alt2press_ratio_isothermal(H, 47,  self.P47,  self.T47)
-        if H <= 71:
-            return self._alt2press_ratio_gradient(H, 51,  self.P51,  self.T51,  self.L51)
-        if H <= 84.852:
-            return self._alt2press_ratio_gradient(H, 71,  self.P71,  self.T71,  self.L71)
-        else:
-            raise ValueError('This function is only implemented for altitudes of 84.852 km and below.')
+        # Both equations are evaluated, the gradient one divides by zero in the isothermal layers
+        with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            press_ratio = np.where(L != 0,
+                                   self._alt2press_ratio_gradient(H, Hb, Pb, Tb, L),
+                                   self._alt2press_ratio_isothermal(H, Hb, Pb, Tb))
+
+        return press_ratio[()]
 
-    def pressure(self, H):
+    def pressure(self, H, tabulated=False):
         """
         Return the atmospheric pressure for a given altitude.
+        H in meters, a number or an array of altitudes
         """
-        H = H / 1000.0  # Make the calculations in km
+        if tabulated and self._in_table(H):
+            return np.exp(self._interp_table(H, self._table[4], self._table[5]))[()]
+
+        H = np.asarray(H) / 1000.0  # Make the calculations in km
 
         press = self.P0 * self._alt2press_ratio(H)
 
@@ -229,7 +264,7 @@ class Atmosphere:
 
         return self._alt2press_ratio(H) / (self.temperature(H) / self.T0)
 
-    def density(self, H):
+    def density(self, H, tabulated=False):
         """
         Return the density given the pressure altitude. 
         """
@@ -242,7 +277,7 @@ class Atmosphere:
         # are different from what is given online). So density calculation 
         # are substituted with direct calculations.
         
-        p = self.pressure(H) * 100  # in Pascal
-        T = self.temperature(H)  # in K
+        p = self.pressure(H, tabulated) * 100  # in Pascal
+        T = self.temperature(H, tabulated)  # in K
         dens = p / (self.Rd * T)
         return dens
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# the scripts run from the repository root, and atmospheric_lidar imports its modules by name
+rootdir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(rootdir, "atmospheric_lidar"))
+sys.path.insert(0, rootdir)
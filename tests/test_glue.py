@@ -0,0 +1,154 @@
+import numpy as np
+import pytest
+
+from lidar_retrievals import fit_checks, glue
+
+window_length = 100
+# correlation, intercept, gaussian and min/max thresholds, as in LEBEAR
+thresholds = (0.95, 0.5, 0.1, 0.5)
+min_idx, max_idx = 200, 2000
+
+
+def synthetic_pair(n_bins=2000, seed=0):
+    """Analog and photon counting (with dead time) signals of the same profile."""
+    rng = np.random.default_rng(seed)
+    altitude = (np.arange(n_bins) + 1) * 7.5
+    profile = 5e9 * np.exp(-altitude / 8000.0) / altitude**2
+    analog = profile + 0.05 * rng.standard_normal(n_bins)
+    counts = 20 * profile
+    photon = counts / (1 + counts * 1e-5) + 0.5 * rng.standard_normal(n_bins)
+    return analog, photon
+
+
+def per_window_gluing_score(lower_signal, upper_signal):
+    """The gluing score as calculated before the sliding checks, one linregress and Shapiro-Wilk test per window."""
+    window = window_length + window_length % 2
+    correlation_threshold, intercept_threshold, gaussian_threshold, minmax_threshold = (
+        thresholds
+    )
+
+    results = fit_checks._apply_sliding_check(
+        fit_checks.check_linear_fit_intercept_and_correlation,
+        lower_signal,
+        upper_signal,
+        window,
+    )
+    intercept_values = fit_checks._restore_array_length(results[:, 0], window)
+    correlation_values = fit_checks._restore_array_length(results[:, 1], window)
+    gaussian_values = fit_checks._restore_array_length(
+        fit_checks._apply_sliding_check(
+            fit_checks.check_residuals_not_gaussian, lower_signal, upper_signal, window
+        ),
+        window,
+    )
+    minmax_ratio_values = fit_checks._restore_array_length(
+        fit_checks.check_min_max_ratio(
+            fit_checks._rolling_window(lower_signal, window),
+            fit_checks._rolling_window(upper_signal, window),
+        ),
+        window,
+    )
+
+    gluing_possible = (
+        (correlation_values > correlation_threshold)
+        & (intercept_values < intercept_threshold)
+        & ~(gaussian_values < gaussian_threshold)
+        & (minmax_ratio_values > minmax_threshold)
+    )
+
+    intercept_values[intercept_values > 40.0] = 40.0
+    gluing_score = (
+        correlation_values * (1 - intercept_values / 40.0) * minmax_ratio_values
+    )
+    return np.ma.masked_where(~gluing_possible, gluing_score)
+
+
+def test_default_gluing_is_unchanged():
+    analog, photon = synthetic_pair()
+    lower_cut, upper_cut = analog[min_idx:max_idx], photon[min_idx:max_idx]
+
+    expected_score = per_window_gluing_score(lower_cut, upper_cut)
+    gluing_score = glue.get_sliding_gluing_score(
+        lower_cut, upper_cut, window_length, *thresholds
+    )
+    np.testing.assert_array_equal(
+        np.ma.getmaskarray(gluing_score), np.ma.getmaskarray(expected_score)
+    )
+    np.testing.assert_allclose(
+        gluing_score.compressed(), expected_score.compressed(), rtol=1e-8
+    )
+
+    # the same region and calibration constants as the per-window checks
+    expected_idx = np.argmax(expected_score) + min_idx
+    expected_c_lower, expected_c_upper = glue.calculate_gluing_values(
+        analog[expected_idx - window_length // 2 : expected_idx + window_length // 2],
+        photon[expected_idx - window_length // 2 : expected_idx + window_length // 2],
+        True,
+    )
+
+    glued_signal, gluing_center_idx, _, c_lower, c_upper = glue.glue_signals_1d(
+        analog, photon, window_length, *thresholds, min_idx, max_idx
+    )
+
+    assert gluing_center_idx == expected_idx
+    assert c_lower == pytest.approx(expected_c_lower, rel=1e-12)
+    assert c_upper == pytest.approx(expected_c_upper, rel=1e-12)
+    # glue_signals_at_bins returns the glued signal with the calibration constants
+    np.testing.assert_allclose(
+        glued_signal[0],
+        glue.glue_signals_at_bins(
+            analog,
+            photon,
+            expected_idx - window_length // 2,
+            expected_idx + window_length // 2,
+            expected_c_lower,
+            expected_c_upper,
+        )[0],
+        rtol=1e-12,
+    )
+
+
+@pytest.mark.parametrize("normality_test", ["shapiro", "jarque_bera"])
+def test_time_resolved_gluing_matches_1d(normality_test):
+    analog, photon = np.array(
+        [synthetic_pair(seed=seed) for seed in range(3)]
+    ).transpose(1, 0, 2)
+
+    glued_signal, gluing_center_idx, score, c_lower, c_upper, gluing_valid = (
+        glue.glue_signals_time_resolved(
+            analog,
+            photon,
+            window_length,
+            *thresholds,
+            min_idx,
+            max_idx,
+            normality_test=normality_test,
+        )
+    )
+
+    assert gluing_valid.all()
+    for profile in range(len(analog)):
+        glued_1d, center_idx_1d, _, c_lower_1d, c_upper_1d = glue.glue_signals_1d(
+            analog[profile],
+            photon[profile],
+            window_length,
+            *thresholds,
+            min_idx,
+            max_idx,
+            normality_test=normality_test,
+        )
+        score_1d = glue.get_sliding_gluing_score(
+            analog[profile, min_idx:max_idx],
+            photon[profile, min_idx:max_idx],
+            window_length,
+            *thresholds,
+            normality_test=normality_test,
+        )
+
+        assert gluing_center_idx[profile] == center_idx_1d
+        assert score[profile] == pytest.approx(
+            score_1d[center_idx_1d - min_idx], rel=1e-12
+        )
+        assert c_lower[profile] == pytest.approx(c_lower_1d, rel=1e-12)
+        assert c_upper[profile] == pytest.approx(c_upper_1d, rel=1e-12)
+        np.testing.assert_allclose(glued_signal[profile], glued_1d[0], rtol=1e-12)
@@ -0,0 +1,153 @@
+import numpy as np
+import pytest
+
+from lidar_retrievals import kfs
+
+bin_length = 7.5
+index_reference = 1000
+reference_range = 33
+altitude = (np.arange(1600) + 1) * bin_length
+beta_molecular = 1.5e-6 * np.exp(-altitude / 8000.0)
+
+
+def synthetic_rcs(beta_aerosol, lidar_ratio):
+    """Range corrected signal of an aerosol backscatter profile, molecules included."""
+    extinction = lidar_ratio * beta_aerosol + 8.37758041 * beta_molecular
+    optical_depth = np.concatenate(
+        [[0], np.cumsum((extinction[1:] + extinction[:-1]) / 2 * bin_length)]
+    )
+    return 1e12 * (beta_aerosol + beta_molecular) * np.exp(-2 * optical_depth)
+
+
+def test_klett_curtain_matches_profile_loop():
+    rng = np.random.default_rng(0)
+    layer_tops = [3000.0, 4000.0, 5000.0, 6000.0]
+    rcs = np.array(
+        [
+            synthetic_rcs(2e-6 * np.exp(-altitude / 1500.0) * (altitude < top), 50)
+            * (1 + 0.01 * rng.standard_normal(len(altitude)))
+            for top in layer_tops
+        ]
+    )
+
+    curtain = kfs.klett_backscatter_aerosol(
+        rcs, 50, beta_molecular, index_reference, reference_range, 0, bin_length
+    )
+    assert curtain.shape == rcs.shape
+    for profile, rcs_profile in zip(curtain, rcs):
+        expected = kfs.klett_backscatter_aerosol(
+            rcs_profile,
+            50,
+            beta_molecular,
+            index_reference,
+            reference_range,
+            0,
+            bin_length,
+        )
+        np.testing.assert_allclose(profile, expected, rtol=1e-12, atol=0)
+
+    # a lidar ratio per profile
+    lidar_ratios = np.array([[30.0], [45.0], [60.0], [75.0]])
+    curtain = kfs.klett_backscatter_aerosol(
+        rcs,
+        lidar_ratios,
+        beta_molecular,
+        index_reference,
+        reference_range,
+        0,
+        bin_length,
+    )
+    for profile, rcs_profile, lidar_ratio in zip(curtain, rcs, lidar_ratios[:, 0]):
+        expected = kfs.klett_backscatter_aerosol(
+            rcs_profile,
+            lidar_ratio,
+            beta_molecular,
+            index_reference,
+            reference_range,
+            0,
+            bin_length,
+        )
+        np.testing.assert_allclose(profile, expected, rtol=1e-12, atol=0)
+
+
+def synthetic_layer(lidar_ratio):
+    """Signal of an aerosol layer below 5 km and its aerosol optical depth up to the reference height."""
+    beta_aerosol = 2e-6 * np.exp(-altitude / 1500.0) * (altitude < 5000)
+    aod = np.trapz(lidar_ratio * beta_aerosol[: index_reference + 1], dx=bin_length)
+    return synthetic_rcs(beta_aerosol, lidar_ratio), aod
+
+
+def test_lidar_ratio_sweep_matches_single_inversions():
+    rcs, _ = synthetic_layer(55)
+    lidar_ratios = np.arange(10, 121, 5.0)
+
+    beta_aerosol, aod = kfs.klett_lidar_ratio_sweep(
+        rcs,
+        lidar_ratios,
+        beta_molecular,
+        index_reference,
+        reference_range,
+        0,
+        bin_length,
+    )
+
+    assert beta_aerosol.shape == (len(lidar_ratios), len(altitude))
+    for lidar_ratio, profile, profile_aod in zip(lidar_ratios, beta_aerosol, aod):
+        expected = kfs.klett_backscatter_aerosol(
+            rcs,
+            lidar_ratio,
+            beta_molecular,
+            index_reference,
+            reference_range,
+            0,
+            bin_length,
+        )
+        np.testing.assert_allclose(profile, expected, rtol=1e-12, atol=0)
+        assert profile_aod == pytest.approx(
+            np.trapz(lidar_ratio * expected[: index_reference + 1], dx=bin_length),
+            rel=1e-12,
+        )
+
+
+def test_lidar_ratio_from_aod():
+    rcs, aod = synthetic_layer(55)
+    lidar_ratios = np.arange(10, 121, 1.0)
+
+    lidar_ratio = kfs.klett_lidar_ratio_aod(
+        rcs,
+        aod,
+        lidar_ratios,
+        beta_molecular,
+        index_reference,
+        reference_range,
+        0,
+        bin_length,
+    )
+    assert lidar_ratio == pytest.approx(55, abs=0.5)
+
+    # the refined lidar ratio reproduces the AOD, between two candidates
+    _, aod_fit = kfs.klett_lidar_ratio_sweep(
+        rcs,
+        [lidar_ratio],
+        beta_molecular,
+        index_reference,
+        reference_range,
+        0,
+        bin_length,
+    )
+    assert aod_fit[0] == pytest.approx(aod, rel=1e-6)
+
+    # no candidate brackets the AOD: brentq would raise ValueError, NaN is returned
+    for candidates in (np.arange(10, 40, 1.0), np.arange(70, 121, 1.0)):
+        assert np.isnan(
+            kfs.klett_lidar_ratio_aod(
+                rcs,
+                aod,
+                candidates,
+                beta_molecular,
+                index_reference,
+                reference_range,
+                0,
+                bin_length,
+            )
+        )
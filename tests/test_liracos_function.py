@@ -0,0 +1,60 @@
+import locale
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+try:
+    from functions import liracos_function as lrc
+except locale.Error:
+    pytest.skip("en_US.UTF-8 locale not available", allow_module_level=True)
+
+
+def loop_gap_times(times, shotnumber, laser_freq):
+    """The missing profile times, as found by the per-profile loop LIRACOS used before."""
+    time_values_list = []
+    for ix in range(0, len(times) - 1):
+        dif = divmod((times[ix + 1] - times[ix]).total_seconds(), 1)
+        if dif[0] > float(61.0):
+            nfactor = int(
+                dif[0] // int((float(shotnumber[ix]) - 1) / float(laser_freq[ix]))
+            )
+            for jx in range(1, nfactor):
+                time_values_list.append(times[ix] + jx * timedelta(seconds=60))
+    return time_values_list
+
+
+def test_fill_time_gaps():
+    start = pd.Timestamp("2022-01-23 20:00:00")
+    # one minute profiles, with a 5 and a 17 minute gap, and a 2 minute one that is not filled
+    minutes = [0, 1, 2, 7, 8, 25, 26, 27, 29, 30]
+    times = [start + timedelta(minutes=m, seconds=s % 3) for s, m in enumerate(minutes)]
+    shotnumber = [1201] * len(times)
+    laser_freq = [20] * len(times)
+    altitude = [7.5, 15.0, 22.5]
+    values = np.arange(len(altitude) * len(times), dtype=float).reshape(
+        len(altitude), -1
+    )
+    values[1, 4] = np.nan
+    rcslambda = pd.DataFrame(
+        values,
+        index=altitude,
+        columns=[t.strftime("%Y-%m-%d %H:%M:%S") for t in times],
+    )
+
+    filled = lrc.fill_time_gaps(rcslambda, shotnumber, laser_freq)
+
+    missing = loop_gap_times(times, shotnumber, laser_freq)
+    assert len(missing) == 4 + 16
+    assert list(filled.columns) == sorted(times + missing)
+    pd.testing.assert_frame_equal(
+        filled[pd.DatetimeIndex(times)],
+        rcslambda.set_axis(pd.DatetimeIndex(times), axis=1),
+    )
+    assert filled[pd.DatetimeIndex(missing)].isna().all().all()
+
+    filled = lrc.fill_time_gaps(rcslambda, shotnumber, laser_freq, fill_value=0.0)
+    assert (filled[pd.DatetimeIndex(missing)] == 0.0).all().all()
+    # only the inserted profiles are filled
+    assert np.isnan(filled[times[4]].iloc[1])
@@ -0,0 +1,58 @@
+import locale
+import os
+import sqlite3
+
+import pytest
+
+try:
+    from functions import milgrau_function as mf
+except locale.Error:
+    pytest.skip("en_US.UTF-8 locale not available", allow_module_level=True)
+
+
+def write_header(filepath, start, stop, shots):
+    """A Licel file with only its header lines, as readheader_licel reads them."""
+    filepath.write_bytes(
+        (
+            " a2212322.000000\r\n"
+            " SaoPaulo %s %s 0760 -046.7 -023.5 00.0\r\n"
+            " 0003001 0100 %07d 0100 01\r\n"
+            " 1 0 1 04000 1 0000 7.50 00355.o 0 0 00 000 12 003001 0.500 BT0\r\n"
+            "\r\n" % (start, stop, shots)
+        ).encode("utf-8")
+    )
+    return str(filepath)
+
+
+def cataloged_paths(catalog_path):
+    with sqlite3.connect(catalog_path) as con:
+        paths = [row[0] for row in con.execute("SELECT filepath FROM licel_header")]
+    con.close()
+    return sorted(paths)
+
+
+def test_headercatalog(tmp_path):
+    catalog_path = str(tmp_path / "catalog.sqlite")
+    first = write_header(
+        tmp_path / "a1", "23/01/2022 22:00:00", "23/01/2022 22:00:30", 3001
+    )
+    second = write_header(
+        tmp_path / "a2", "23/01/2022 22:01:00", "23/01/2022 22:01:30", 3002
+    )
+
+    df_index = mf.headercatalog([second, first], catalog_path)
+    assert list(df_index["filepath"]) == [second, first]
+    assert list(df_index["nshots"]) == [3002, 3001]
+    assert str(df_index["start_time"][1]) == "2022-01-23 22:00:00"
+
+    # a changed file is read again
+    write_header(tmp_path / "a1", "23/01/2022 22:00:00", "23/01/2022 22:00:30", 12345)
+    os.utime(first, (0, 1e9))  # same size, the modification time tells the change
+    df_index = mf.headercatalog([first, second], catalog_path)
+    assert list(df_index["nshots"]) == [12345, 3002]
+
+    # the rows of removed files are pruned
+    (tmp_path / "a2").unlink()
+    df_index = mf.headercatalog([first], catalog_path)
+    assert list(df_index["filepath"]) == [first]
+    assert cataloged_paths(catalog_path) == [first]
@@ -0,0 +1,97 @@
+import locale
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+try:
+    from functions import product_function as pf
+except locale.Error:
+    pytest.skip("en_US.UTF-8 locale not available", allow_module_level=True)
+
+channels = ["355AN", "355PC", "532AN", "532PC"]
+n_bins = 300
+# raw Licel file names may contain "_" themselves
+rawnames = ["RM_2212322.000000", "RM_2212322.010000", "RM_2212322.020000"]
+
+
+def synthetic_day():
+    rng = np.random.default_rng(0)
+    filenames = [name + "_level1_preprocessed" for name in rawnames]
+    profiles = [
+        pd.DataFrame(rng.uniform(-10, 1000, (n_bins, len(channels))), columns=channels)
+        for _ in filenames
+    ]
+    # 10 header lines, as the csv products are read with skiprows=10
+    headers = [
+        {
+            "station": "SaoPaulo",
+            "altitude": 760,
+            "lat": -23.5,
+            "long": -46.7,
+            "starttime": "2022-01-23T22:%02d:00" % n,
+            "stoptime": "2022-01-23T22:%02d:30" % n,
+            "bins": n_bins,
+            "vert_res": 7.5,
+            "shotnumber": 3001 + n,
+            "laser_freq": 10,
+        }
+        for n in range(len(filenames))
+    ]
+    return filenames, profiles, headers
+
+
+@pytest.mark.parametrize("product_format", pf.product_formats)
+def test_write_and_load_day(tmp_path, product_format):
+    filenames, profiles, headers = synthetic_day()
+
+    filepaths = pf.write_day(
+        product_format, str(tmp_path), "20220123", filenames, profiles, headers
+    )
+    if product_format == "netcdf":
+        assert filepaths == [
+            os.path.join(str(tmp_path), "20220123_level1_preprocessed.nc")
+        ]
+    else:
+        assert filepaths == [os.path.join(str(tmp_path), name) for name in filenames]
+
+    loaded_paths, signal, loaded_channels, dfheaders = pf.load_day(str(tmp_path))
+
+    assert loaded_paths == [os.path.join(str(tmp_path), name) for name in filenames]
+    assert loaded_channels == channels
+    assert signal.shape == (len(filenames), n_bins, len(channels))
+    expected = np.stack([profile.to_numpy() for profile in profiles])
+    if product_format == "netcdf":
+        np.testing.assert_array_equal(signal, expected)
+    else:
+        # the csv files are written with 4 decimals
+        np.testing.assert_allclose(signal, expected, rtol=0, atol=5e-5)
+    pd.testing.assert_frame_equal(
+        dfheaders,
+        pd.DataFrame(
+            [{key: str(value) for key, value in header.items()} for header in headers]
+        ),
+    )
+
+
+def test_export_csv(tmp_path):
+    filenames, profiles, headers = synthetic_day()
+    (tmp_path / "nc").mkdir()
+    (ncfile,) = pf.write_day(
+        "netcdf", str(tmp_path / "nc"), "20220123", filenames, profiles, headers
+    )
+
+    filepaths = pf.export_csv(ncfile, str(tmp_path / "csv"))
+
+    assert filepaths == [
+        os.path.join(str(tmp_path / "csv"), name) for name in filenames
+    ]
+    csv_paths, csv_signal, csv_channels, csv_headers = pf.load_day(
+        str(tmp_path / "csv")
+    )
+    nc_paths, nc_signal, nc_channels, nc_headers = pf.load_day(str(tmp_path / "nc"))
+    assert [os.path.basename(path) for path in csv_paths] == filenames
+    assert csv_channels == nc_channels
+    np.testing.assert_allclose(csv_signal, nc_signal, rtol=0, atol=5e-5)
+    pd.testing.assert_frame_equal(csv_headers, nc_headers)
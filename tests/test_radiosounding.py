@@ -0,0 +1,81 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from molecular import radiosounding as rds
+
+
+def sounding(levels, offset=0.0):
+    return pd.DataFrame(
+        {
+            "PRES": np.linspace(940.0, 10.0, levels) + offset,
+            "HGHT": np.linspace(760.0, 30000.0, levels),
+            "TEMP": np.linspace(25.0, -60.0, levels),
+        }
+    )
+
+
+def test_write_read_round_trip(tmp_path):
+    store = rds.store_path(str(tmp_path), "83779_SBMT")
+    launches = [datetime(2024, 6, 20, 0), datetime(2024, 6, 20, 12)]
+    rds.write_soundings(store, launches, [sounding(50), sounding(80, 1.0)])
+
+    assert rds.launch_times(store) == launches
+    launch, df = rds.nearest_sounding(store, launches[1], 0)
+    assert launch == launches[1]
+    pd.testing.assert_frame_equal(df, sounding(80, 1.0))
+    # the shorter sounding is not padded with the fill values
+    launch, df = rds.nearest_sounding(store, launches[0], 0)
+    pd.testing.assert_frame_equal(df, sounding(50))
+
+
+def test_nearest_sounding(tmp_path):
+    store = rds.store_path(str(tmp_path), "83779_SBMT")
+    assert rds.nearest_sounding(store, datetime(2024, 6, 20, 0)) is None
+
+    launches = [datetime(2024, 6, 20, 0), datetime(2024, 6, 21, 0)]
+    rds.write_soundings(store, launches, [sounding(10), sounding(10, 2.0)])
+
+    assert rds.nearest_sounding(store, datetime(2024, 6, 20, 11))[0] == launches[0]
+    assert rds.nearest_sounding(store, datetime(2024, 6, 20, 13))[0] == launches[1]
+    assert rds.nearest_sounding(store, datetime(2024, 6, 20, 3), max_hours=2) is None
+    assert rds.nearest_sounding(store, datetime(2024, 6, 22, 12)) is None
+
+
+def test_duplicate_launch_replaced(tmp_path):
+    store = rds.store_path(str(tmp_path), "83779_SBMT")
+    launch = datetime(2024, 6, 20, 12)
+    rds.write_soundings(store, [launch], [sounding(60)])
+    rds.write_soundings(store, [launch, launch], [sounding(40, 1.0), sounding(30, 2.0)])
+
+    assert rds.launch_times(store) == [launch]
+    pd.testing.assert_frame_equal(
+        rds.nearest_sounding(store, launch, 0)[1], sounding(30, 2.0)
+    )
+
+
+def test_import_csv_files(tmp_path):
+    text = (
+        "83779 SBMT Marte Civ Observations at 12Z 20 Jun 2024\n"
+        "-----------------------------------------------------------------------------\n"
+        "   PRES   HGHT   TEMP\n"
+        "    hPa     m      C\n"
+        "-----------------------------------------------------------------------------\n"
+        "  940.0    722   22.0\n"
+        "  925.0    860   21.0\n"
+        "  900.0   1090   19.5\n"
+    )
+    filepath = tmp_path / rds.sounding_filename(
+        "83779 SBMT Marte Civ Observations at 12Z 20 Jun 2024"
+    )
+    filepath.write_text(text)
+    assert filepath.name == "83779_SBMT_2024_06_20_12Z.csv"
+
+    assert rds.import_csv_files([str(filepath)], str(tmp_path)) == 1
+    launch, df = rds.nearest_sounding(
+        rds.store_path(str(tmp_path), "83779_SBMT"), datetime(2024, 6, 20, 12), 0
+    )
+    assert launch == datetime(2024, 6, 20, 12)
+    # the first (surface) level is not read, as in the original csv reading
+    assert df["PRES"].tolist() == [925.0, 900.0]
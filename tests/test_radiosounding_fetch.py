@@ -0,0 +1,154 @@
+import http.server
+import threading
+import urllib.parse
+from datetime import datetime
+
+import pytest
+
+from molecular import radiosounding as rds
+
+MONTHS = [
+    "Jan",
+    "Feb",
+    "Mar",
+    "Apr",
+    "May",
+    "Jun",
+    "Jul",
+    "Aug",
+    "Sep",
+    "Oct",
+    "Nov",
+    "Dec",
+]
+ROWS = ["  940.0    722   22.0", "  925.0    860   21.0", "  900.0   1090   19.5"]
+
+
+class SoundingHandler(http.server.BaseHTTPRequestHandler):
+    """Stand-in of the Wyoming sounding server, busy (503) on the first request of each launch."""
+
+    protocol_version = (
+        "HTTP/1.1"  # keep-alive, so the client connections can be counted
+    )
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests.append(self.path)
+            server.clients.add(self.client_address)
+            first = server.requests.count(self.path) == 1
+
+        if first:
+            body = b""
+            self.send_response(503)
+        else:
+            query = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+            title = "83779 SBMT Marte Civ Observations at %sZ %02d %s %s" % (
+                query["FROM"][0][-2:],
+                int(query["FROM"][0][:-2]),
+                MONTHS[int(query["MONTH"][0]) - 1],
+                query["YEAR"][0],
+            )
+            table = (
+                "\n-----\n   PRES   HGHT   TEMP\n    hPa     m      C\n-----\n"
+                + "\n".join(ROWS)
+                + "\n\n"
+            )
+            body = (
+                "<HTML><BODY>\n<H2>%s</H2>\n<PRE>%s</PRE></BODY></HTML>"
+                % (title, table)
+            ).encode()
+            self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), SoundingHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.requests = []
+    server.clients = set()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def fetcher(server, connections=2):
+    return rds.WyomingFetcher(
+        url="http://127.0.0.1:%d/sounding" % server.server_address[1],
+        connections=connections,
+        retries=3,
+        backoff_factor=0,
+    )
+
+
+def test_fetch_soundings_retry_and_store(server, tmp_path):
+    launches = [
+        datetime(2024, 6, day, hour) for day in (20, 21, 22) for hour in (0, 12)
+    ]
+    results = rds.fetch_soundings(
+        fetcher(server), "83779", launches, str(tmp_path), str(tmp_path), workers=4
+    )
+
+    assert [filepath is not None for title, filepath in results] == [True] * len(
+        launches
+    )
+    # every launch answered busy once and then retried
+    assert len(server.requests) == 2 * len(launches)
+    assert rds.launch_times(rds.store_path(str(tmp_path), "83779_SBMT")) == launches
+
+
+def test_fetch_soundings_shared_pool(server, tmp_path):
+    launches = [datetime(2024, 6, day, 0) for day in range(1, 13)]
+    rds.fetch_soundings(
+        fetcher(server, connections=2), "83779", launches, str(tmp_path), workers=6
+    )
+
+    # 24 requests from 6 threads through one pool of at most 2 connections
+    assert len(server.requests) == 2 * len(launches)
+    assert len(server.clients) <= 2
+
+
+def test_fetch_soundings_skip_downloaded(server, tmp_path):
+    launches = [datetime(2024, 6, 20, 0), datetime(2024, 6, 20, 12)]
+    rds.fetch_soundings(fetcher(server), "83779", launches[:1], str(tmp_path))
+    server.requests.clear()
+
+    results = rds.fetch_soundings(fetcher(server), "83779", launches, str(tmp_path))
+
+    assert results[0][0] == "already downloaded"
+    assert results[1][1] is not None
+    assert all("FROM=2012" in request for request in server.requests)
+
+
+def test_fetch_soundings_failure_does_not_stop(tmp_path):
+    class FailingFetcher:
+        def fetch(self, station, launch_time):
+            if launch_time.hour == 12:
+                raise ValueError("bad page")
+            return (
+                "83779 SBMT Marte Civ Observations at 00Z %02d Jun 2024"
+                % launch_time.day,
+                "title\n",
+            )
+
+    launches = [datetime(2024, 6, day, hour) for day in (20, 21) for hour in (0, 12)]
+    results = rds.fetch_soundings(
+        FailingFetcher(), "83779", launches, str(tmp_path), workers=2
+    )
+
+    assert [filepath is not None for title, filepath in results] == [
+        True,
+        False,
+        True,
+        False,
+    ]
+    assert results[1][0] == "ValueError: bad page"
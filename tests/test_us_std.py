@@ -0,0 +1,128 @@
+import numpy as np
+import pytest
+
+from molecular import us_std
+
+# layer boundaries of the table, in m, from the ground to its top
+boundaries = np.array([0.0, 11000, 20000, 32000, 47000, 51000, 71000, 84852])
+
+
+def scalar_temperature(atm, H):
+    """The temperature of one altitude with the per-layer if chain of the original module."""
+    H = H / 1000.0
+    if H <= 11:
+        return atm.T0 + H * atm.L0
+    elif H <= 20:
+        return atm.T11
+    elif H <= 32:
+        return atm.T20 + (H - 20) * atm.L20
+    elif H <= 47:
+        return atm.T32 + (H - 32) * atm.L32
+    elif H <= 51:
+        return atm.T47
+    elif H <= 71:
+        return atm.T51 + (H - 51) * atm.L51
+    elif H <= 84.852:
+        return atm.T71 + (H - 71) * atm.L71
+    raise ValueError
+
+
+def scalar_pressure(atm, H):
+    """The pressure of one altitude with the per-layer if chain of the original module."""
+    H = H / 1000.0
+    if H <= 11:
+        ratio = atm._alt2press_ratio_gradient(H, 0, atm.P0, atm.T0, atm.L0)
+    elif H <= 20:
+        ratio = atm._alt2press_ratio_isothermal(H, 11, atm.P11, atm.T11)
+    elif H <= 32:
+        ratio = atm._alt2press_ratio_gradient(H, 20, atm.P20, atm.T20, atm.L20)
+    elif H <= 47:
+        ratio = atm._alt2press_ratio_gradient(H, 32, atm.P32, atm.T32, atm.L32)
+    elif H <= 51:
+        ratio = atm._alt2press_ratio_isothermal(H, 47, atm.P47, atm.T47)
+    elif H <= 71:
+        ratio = atm._alt2press_ratio_gradient(H, 51, atm.P51, atm.T51, atm.L51)
+    elif H <= 84.852:
+        ratio = atm._alt2press_ratio_gradient(H, 71, atm.P71, atm.T71, atm.L71)
+    else:
+        raise ValueError
+    return atm.P0 * ratio
+
+
+@pytest.mark.parametrize(
+    "t_r, p_r, alt", [(288.15, 1013.25, 0.0), (295.0, 930.0, 760.0)]
+)
+def test_layers_match_scalar_calculation(t_r, p_r, alt):
+    atm = us_std.Atmosphere(t_r, p_r, alt)
+    rng = np.random.default_rng(0)
+    # the boundaries belong to the layer below them, as in the if chain
+    heights = np.concatenate(
+        [
+            boundaries,
+            boundaries[1:] - 1e-6,
+            boundaries[:-1] + 1e-6,
+            [-500.0],
+            rng.uniform(0, boundaries[-1], 200),
+        ]
+    )
+
+    temperature = atm.temperature(heights)
+    pressure = atm.pressure(heights)
+    density = atm.density(heights)
+
+    assert temperature.shape == pressure.shape == heights.shape
+    for n, H in enumerate(heights):
+        expected_temperature = scalar_temperature(atm, H)
+        expected_pressure = scalar_pressure(atm, H)
+        assert temperature[n] == pytest.approx(expected_temperature, rel=1e-13)
+        assert pressure[n] == pytest.approx(expected_pressure, rel=1e-13)
+        assert density[n] == pytest.approx(
+            expected_pressure * 100 / (atm.Rd * expected_temperature), rel=1e-13
+        )
+        # a single altitude gives a number, as before
+        assert np.ndim(atm.temperature(H)) == np.ndim(atm.pressure(H)) == 0
+        assert atm.temperature(H) == temperature[n]
+        assert atm.pressure(H) == pytest.approx(pressure[n], rel=1e-15)
+
+    # above the top of the table
+    for H in (boundaries[-1] + 1e-6, 90000.0, np.array([1000.0, 90000.0])):
+        with pytest.raises(ValueError):
+            atm.temperature(H)
+        with pytest.raises(ValueError):
+            atm.pressure(H)
+
+
+def test_tabulated_profile():
+    atm = us_std.Atmosphere(295.0, 930.0, 760.0)
+    rng = np.random.default_rng(0)
+    heights = np.concatenate([boundaries, rng.uniform(0, boundaries[-1], 10000)])
+
+    # linear temperature within the 1 m grid, the layer boundaries are grid points
+    np.testing.assert_allclose(
+        atm.temperature(heights, tabulated=True), atm.temperature(heights), rtol=1e-12
+    )
+    # log pressure interpolated between grid points
+    np.testing.assert_allclose(
+        atm.pressure(heights, tabulated=True), atm.pressure(heights), rtol=1e-9
+    )
+    np.testing.assert_allclose(
+        atm.density(heights, tabulated=True), atm.density(heights), rtol=1e-9
+    )
+    np.testing.assert_allclose(
+        atm.pressure(boundaries, tabulated=True), atm.pressure(boundaries), rtol=1e-14
+    )
+
+    # outside the table the layer equations are used, for the whole array
+    for H in (-500.0, np.array([-500.0, 1000.0, 5000.5])):
+        assert np.all(atm.temperature(H, tabulated=True) == atm.temperature(H))
+        assert np.all(atm.pressure(H, tabulated=True) == atm.pressure(H))
+    for H in (boundaries[-1] + 1.0, np.array([1000.0, 90000.0])):
+        with pytest.raises(ValueError):
+            atm.temperature(H, tabulated=True)
+        with pytest.raises(ValueError):
+            atm.pressure(H, tabulated=True)
+
+    # a coarser table ends at its last grid point below 84.852 km
+    atm.tabulate(step=7.5)
+    H = np.array([1000.0, boundaries[-1]])
+    assert np.all(atm.pressure(H, tabulated=True) == atm.pressure(H))